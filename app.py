@@ -1,18 +1,43 @@
-from flask import Flask, render_template, request, jsonify, send_file
-from openai import OpenAI
+from flask import Flask, render_template, request, jsonify, send_file, send_from_directory, Response, stream_with_context
+from openai import OpenAI, AsyncOpenAI, RateLimitError, APITimeoutError, APIConnectionError, APIStatusError
 from docx import Document
 from docx.shared import Inches, Pt, RGBColor
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 from docx.oxml.ns import qn
 from docx.oxml import OxmlElement
 import os
+import asyncio
+import atexit
+import threading
+import time
+import traceback
+import weakref
+import contextlib
+import contextvars
+import importlib.util
+import hashlib
+import hmac
+import sqlite3
+import queue
+import random
+import csv
+import io
+import zipfile
+import uuid
+from collections import OrderedDict
+from types import SimpleNamespace
 from datetime import datetime
 import json
 import re
 import unicodedata
+import httpx
+from concurrent.futures import ThreadPoolExecutor
+from string import Template
 from typing import TypedDict, List, Dict, Any, Annotated
 import operator
 from langgraph.graph import StateGraph, END
+from langgraph.types import Send
+from langgraph.errors import GraphRecursionError
 from dotenv import load_dotenv
 
 app = Flask(__name__)
@@ -20,11 +45,877 @@ app = Flask(__name__)
 # Load env explicitly (critical for Gunicorn)
 load_dotenv("/var/www/portfolio_app/.env")
 
-def get_openai_client():
+# Agent progress logging; disable for high-volume batch runs
+AGENT_VERBOSE = os.getenv("AGENT_VERBOSE", "1") == "1"
+
+# Parallel section generation: fan out every section at once instead of one by one
+PARALLEL_SECTIONS = os.getenv("PARALLEL_SECTIONS", "0") == "1"
+MAX_SECTION_CONCURRENCY = int(os.getenv("MAX_SECTION_CONCURRENCY", "4"))
+
+# =============================================================================
+# LLM CLIENT GATEWAY
+# =============================================================================
+
+# Connection pool / timeout settings shared by every OpenAI call in the process
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "10"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "120"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "10"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "300"))
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "1") == "1"
+
+_llm_client_lock = threading.Lock()
+_llm_client = None
+_llm_client_pid = None
+_async_llm_clients = weakref.WeakKeyDictionary()  # event loop -> AsyncOpenAI
+_async_llm_sessions = weakref.WeakKeyDictionary()  # event loop -> reports using its client
+_llm_loop = None  # persistent event loop the async route runs reports on
+_llm_loop_pid = None
+_llm_connection_stats = {'requests': 0, 'new_connections': 0, 'reused_connections': 0, 'handshake_seconds': 0.0}
+_prompt_usage_stats = {}  # prompt version -> token counters, incl. the provider-side prefix cache
+_last_llm_connection = contextvars.ContextVar("last_llm_connection", default=None)
+_variant_usage_meter = contextvars.ContextVar("variant_usage_meter", default=None)  # section attempt under a prompt experiment
+
+class _ConnectionTrace:
+    """httpcore trace hook: records whether a request had to open a new connection"""
+
+    def __init__(self):
+        self.new_connection = False
+        self.handshake_seconds = 0.0
+        self._connect_started = None
+
+    def record(self, event_name):
+        if event_name == "connection.connect_tcp.started":
+            self.new_connection = True
+            self._connect_started = time.perf_counter()
+        elif event_name in ("connection.connect_tcp.complete", "connection.start_tls.complete"):
+            if self._connect_started is not None:
+                self.handshake_seconds = time.perf_counter() - self._connect_started
+
+    def __call__(self, event_name, info):
+        self.record(event_name)
+
+class _AsyncConnectionTrace(_ConnectionTrace):
+    """Async flavour: httpcore awaits the trace hook on async transports"""
+
+    async def __call__(self, event_name, info):
+        self.record(event_name)
+
+def _record_connection_use(response):
+    trace = response.request.extensions.get("trace")
+    if not isinstance(trace, _ConnectionTrace):
+        return
+
+    with _llm_client_lock:
+        _llm_connection_stats['requests'] += 1
+        if trace.new_connection:
+            _llm_connection_stats['new_connections'] += 1
+            _llm_connection_stats['handshake_seconds'] += trace.handshake_seconds
+        else:
+            _llm_connection_stats['reused_connections'] += 1
+
+    _last_llm_connection.set({
+        'reused': not trace.new_connection,
+        'handshake_ms': round(trace.handshake_seconds * 1000, 1),
+        'http_version': response.http_version,
+    })
+
+def _trace_request(request):
+    request.extensions["trace"] = _ConnectionTrace()
+
+def _trace_response(response):
+    _record_connection_use(response)
+
+async def _trace_request_async(request):
+    request.extensions["trace"] = _AsyncConnectionTrace()
+
+async def _trace_response_async(response):
+    _record_connection_use(response)
+
+def _http2_enabled():
+    if not LLM_HTTP2:
+        return False
+    if importlib.util.find_spec("h2") is None:
+        print("[LLM GATEWAY] ⚠ HTTP/2 requested but the 'h2' package is missing, using HTTP/1.1")
+        return False
+    return True
+
+def _llm_http_settings():
+    return {
+        'limits': httpx.Limits(
+            max_connections=LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+        ),
+        'timeout': httpx.Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+        'http2': _http2_enabled(),
+    }
+
+def _get_api_key():
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
         raise RuntimeError("OPENAI_API_KEY is not set")
-    return OpenAI(api_key=api_key)
+    return api_key
+
+def _reset_llm_clients():
+    """Forget clients inherited from a parent process (sockets must not be shared)"""
+    global _llm_client, _llm_client_pid, _async_llm_clients, _async_llm_sessions, _llm_client_lock, _llm_loop, _llm_loop_pid
+    _llm_client_lock = threading.Lock()
+    _llm_client = None
+    _llm_client_pid = None
+    _async_llm_clients = weakref.WeakKeyDictionary()
+    _async_llm_sessions = weakref.WeakKeyDictionary()
+    _llm_loop = None
+    _llm_loop_pid = None
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_llm_clients)
+
+def get_openai_client():
+    """
+    Returns the process-wide OpenAI client. Created lazily on first use and
+    recreated after a fork, so every section reuses the same connection pool.
+    """
+    global _llm_client, _llm_client_pid
+
+    if _llm_client is not None and _llm_client_pid == os.getpid():
+        return _llm_client
+
+    with _llm_client_lock:
+        if _llm_client is None or _llm_client_pid != os.getpid():
+            settings = _llm_http_settings()
+            http_client = httpx.Client(
+                event_hooks={'request': [_trace_request], 'response': [_trace_response]},
+                **settings,
+            )
+            _llm_client = OpenAI(api_key=_get_api_key(), http_client=http_client, max_retries=0)
+            _llm_client_pid = os.getpid()
+            print(f"[LLM GATEWAY] Shared client created (pid {_llm_client_pid}, http2={settings['http2']})")
+
+    return _llm_client
+
+def get_async_openai_client():
+    """
+    Returns the AsyncOpenAI client bound to the running event loop.
+    Async connections cannot outlive their loop, so there is one pool per loop.
+    """
+    loop = asyncio.get_running_loop()
+
+    with _llm_client_lock:
+        client = _async_llm_clients.get(loop)
+        if client is None:
+            http_client = httpx.AsyncClient(
+                event_hooks={'request': [_trace_request_async], 'response': [_trace_response_async]},
+                **_llm_http_settings(),
+            )
+            client = AsyncOpenAI(api_key=_get_api_key(), http_client=http_client, max_retries=0)
+            _async_llm_clients[loop] = client
+
+    return client
+
+@contextlib.asynccontextmanager
+async def async_llm_session():
+    """
+    Scope of one async report. The last session on a throwaway loop (e.g.
+    asyncio.run) closes that loop's client, so its connection pool is not
+    leaked; the persistent LLM loop keeps its client for the next report.
+    """
+    loop = asyncio.get_running_loop()
+    with _llm_client_lock:
+        _async_llm_sessions[loop] = _async_llm_sessions.get(loop, 0) + 1
+    try:
+        yield
+    finally:
+        client = None
+        with _llm_client_lock:
+            _async_llm_sessions[loop] -= 1
+            if not _async_llm_sessions[loop] and loop is not _llm_loop:
+                del _async_llm_sessions[loop]
+                client = _async_llm_clients.pop(loop, None)
+        if client is not None:
+            await client.close()
+
+def get_llm_event_loop():
+    """
+    Process-wide event loop on a daemon thread. Async reports from request
+    threads all run here, so they share one AsyncOpenAI client and pool.
+    """
+    global _llm_loop, _llm_loop_pid
+
+    with _llm_client_lock:
+        if _llm_loop is None or _llm_loop_pid != os.getpid():
+            _llm_loop = asyncio.new_event_loop()
+            _llm_loop_pid = os.getpid()
+            threading.Thread(target=_llm_loop.run_forever, name="llm-event-loop", daemon=True).start()
+        return _llm_loop
+
+def run_on_llm_loop(coro):
+    """Runs a coroutine on the shared LLM loop and blocks the calling thread until it finishes"""
+    return asyncio.run_coroutine_threadsafe(coro, get_llm_event_loop()).result()
+
+def describe_last_llm_connection():
+    """Short description of the connection used by the last call in this context"""
+    info = _last_llm_connection.get()
+    if not info:
+        return "connection: n/a"
+    if info['reused']:
+        return f"connection: reused ({info['http_version']})"
+    return f"connection: new, handshake {info['handshake_ms']} ms ({info['http_version']})"
+
+def get_llm_gateway_stats():
+    """Process-wide connection reuse counters"""
+    with _llm_client_lock:
+        stats = dict(_llm_connection_stats)
+    stats['pid'] = os.getpid()
+    stats['reuse_ratio'] = round(stats['reused_connections'] / stats['requests'], 3) if stats['requests'] else 0.0
+    return stats
+
+def cached_prompt_tokens(usage):
+    """Prompt tokens the provider served from its prefix cache (0 when not reported)"""
+    details = getattr(usage, 'prompt_tokens_details', None)
+    return getattr(details, 'cached_tokens', 0) or 0
+
+def record_prompt_usage(usage):
+    """Adds one completion's token usage to the counters of the live prompt version"""
+    if usage is None:
+        return
+    version = prompt_templates.version
+    with _llm_client_lock:
+        stats = _prompt_usage_stats.setdefault(
+            version, {'requests': 0, 'prompt_tokens': 0, 'cached_tokens': 0, 'completion_tokens': 0})
+        stats['requests'] += 1
+        stats['prompt_tokens'] += getattr(usage, 'prompt_tokens', 0) or 0
+        stats['cached_tokens'] += cached_prompt_tokens(usage)
+        stats['completion_tokens'] += getattr(usage, 'completion_tokens', 0) or 0
+        meter = _variant_usage_meter.get()
+        if meter is not None:
+            meter['prompt_tokens'] += getattr(usage, 'prompt_tokens', 0) or 0
+            meter['completion_tokens'] += getattr(usage, 'completion_tokens', 0) or 0
+
+def in_current_context(fn):
+    """fn bound to a copy of the caller's context vars, for pool threads (which start with an empty context)"""
+    context = contextvars.copy_context()
+    return lambda *args: context.copy().run(fn, *args)
+
+def describe_prompt_cache(usage):
+    if usage is None:
+        return "prompt cache: n/a"
+    return f"prompt cache: {cached_prompt_tokens(usage)}/{getattr(usage, 'prompt_tokens', 0) or 0} tokens"
+
+def get_prompt_usage_stats():
+    """Process-wide token usage per prompt version, with the share served from the prefix cache"""
+    with _llm_client_lock:
+        versions = {version: dict(stats) for version, stats in _prompt_usage_stats.items()}
+    for stats in versions.values():
+        stats['cached_ratio'] = round(stats['cached_tokens'] / stats['prompt_tokens'], 3) if stats['prompt_tokens'] else 0.0
+        stats['avg_prompt_tokens'] = round(stats['prompt_tokens'] / stats['requests'], 1)
+        stats['avg_completion_tokens'] = round(stats['completion_tokens'] / stats['requests'], 1)
+    return {'pid': os.getpid(), 'versions': versions}
+
+def get_provider_prompt_cache_totals():
+    """Prompt tokens served from the provider's prefix cache, summed over every prompt version"""
+    with _llm_client_lock:
+        totals = {key: sum(stats[key] for stats in _prompt_usage_stats.values())
+                  for key in ('requests', 'prompt_tokens', 'cached_tokens')}
+    totals['cached_ratio'] = round(totals['cached_tokens'] / totals['prompt_tokens'], 3) if totals['prompt_tokens'] else 0.0
+    return totals
+
+# =============================================================================
+# LLM RESPONSE CACHE
+# =============================================================================
+
+# Content-addressed cache for section completions: in-process LRU tier in front
+# of a SQLite tier that every gunicorn worker on the host shares
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") == "1"
+LLM_CACHE_DB = os.getenv("LLM_CACHE_DB", os.path.join("cache", "llm_cache.sqlite3"))
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+LLM_CACHE_MEMORY_ITEMS = int(os.getenv("LLM_CACHE_MEMORY_ITEMS", "256"))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+
+# Admin endpoints are only served when a token is configured
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+def canonical_json(value):
+    """Stable JSON encoding used for hashing (sorted keys, no whitespace)"""
+    return json.dumps(value, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+
+def content_hash(value):
+    return hashlib.sha256(canonical_json(value).encode("utf-8")).hexdigest()
+
+class LLMResponseCache:
+    """
+    Two-tier cache: an LRU dict per process and a SQLite table on disk.
+    Entries expire after a TTL; both tiers are bounded in size (the disk
+    tier evicts least recently used rows once it exceeds max_entries).
+    A purge bumps a generation stamp in SQLite; other processes drop their
+    memory tier when they see it change (checked at most once a second).
+    """
+
+    PURGE_CHECK_SECONDS = 1.0
+
+    def __init__(self, db_path, ttl_seconds, memory_items, max_entries):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.memory_items = memory_items
+        self.max_entries = max_entries
+        self._memory = OrderedDict()  # key -> (content, expires_at)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writes_since_prune = 0
+        self._purge_generation = None
+        self._purge_checked_at = 0.0
+        self.counters = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0}
+
+    # -- SQLite tier -----------------------------------------------------------
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " key TEXT PRIMARY KEY, section TEXT, prompt_version TEXT, content TEXT,"
+                " created_at REAL, expires_at REAL, last_access REAL, hits INTEGER DEFAULT 0)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_access ON llm_cache(last_access)")
+            conn.execute("CREATE TABLE IF NOT EXISTS llm_cache_meta (name TEXT PRIMARY KEY, value INTEGER)")
+            conn.commit()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _count(self, counter):
+        with self._lock:
+            self.counters[counter] += 1
+
+    def _remember(self, key, content, expires_at):
+        with self._lock:
+            self._memory[key] = (content, expires_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+                self.counters['evictions'] += 1
+
+    def _read_purge_generation(self, conn):
+        row = conn.execute("SELECT value FROM llm_cache_meta WHERE name = 'purge_generation'").fetchone()
+        return row[0] if row else 0
+
+    def _sync_purges(self, now):
+        """Drops the memory tier once another process has purged the cache"""
+        if now - self._purge_checked_at < self.PURGE_CHECK_SECONDS:
+            return
+        self._purge_checked_at = now
+        generation = self._read_purge_generation(self._connection())
+        with self._lock:
+            if self._purge_generation is not None and generation != self._purge_generation:
+                self._memory.clear()
+            self._purge_generation = generation
+
+    def get(self, key):
+        now = time.time()
+
+        try:
+            self._sync_purges(now)
+        except sqlite3.Error as e:
+            print(f"[LLM CACHE] ⚠ Disk tier unavailable: {str(e)}")
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._memory.move_to_end(key)
+                    self.counters['memory_hits'] += 1
+                    return entry[0]
+                del self._memory[key]
+
+        try:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT content, expires_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and row[1] > now:
+                conn.execute("UPDATE llm_cache SET last_access = ?, hits = hits + 1 WHERE key = ?", (now, key))
+                conn.commit()
+                self._remember(key, row[0], row[1])
+                self._count('disk_hits')
+                return row[0]
+        except sqlite3.Error as e:
+            print(f"[LLM CACHE] ⚠ Disk tier unavailable: {str(e)}")
+
+        self._count('misses')
+        return None
+
+    def contains(self, key):
+        """Whether a live entry exists; unlike get() it leaves counters and recency alone"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[1] > now:
+                return True
+        try:
+            row = self._connection().execute(
+                "SELECT 1 FROM llm_cache WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+            return row is not None
+        except sqlite3.Error as e:
+            print(f"[LLM CACHE] ⚠ Disk tier unavailable: {str(e)}")
+            return False
+
+    def set(self, key, content, section='', prompt_version='', ttl_seconds=None):
+        now = time.time()
+        expires_at = now + (ttl_seconds or self.ttl_seconds)
+        self._remember(key, content, expires_at)
+
+        try:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache"
+                " (key, section, prompt_version, content, created_at, expires_at, last_access, hits)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, 0)",
+                (key, section, prompt_version, content, now, expires_at, now),
+            )
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"[LLM CACHE] ⚠ Disk tier unavailable: {str(e)}")
+            return
+
+        with self._lock:
+            self.counters['writes'] += 1
+            self._writes_since_prune += 1
+            prune_due = self._writes_since_prune >= 50
+            if prune_due:
+                self._writes_since_prune = 0
+        if prune_due:
+            try:
+                self.prune()
+            except sqlite3.Error as e:
+                # A busy database must not fail the section that triggered the prune
+                print(f"[LLM CACHE] ⚠ Prune skipped: {str(e)}")
+
+    def prune(self):
+        """Drops expired rows, then least recently used rows above max_entries"""
+        conn = self._connection()
+        removed = conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (time.time(),)).rowcount
+        overflow = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] - self.max_entries
+        if overflow > 0:
+            removed += conn.execute(
+                "DELETE FROM llm_cache WHERE key IN"
+                " (SELECT key FROM llm_cache ORDER BY last_access ASC LIMIT ?)",
+                (overflow,),
+            ).rowcount
+        conn.commit()
+        with self._lock:
+            self.counters['evictions'] += removed
+        return removed
+
+    # -- Admin helpers ---------------------------------------------------------
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+            memory_entries = len(self._memory)
+        lookups = counters['memory_hits'] + counters['disk_hits'] + counters['misses']
+        counters['hit_rate'] = round((lookups - counters['misses']) / lookups, 3) if lookups else 0.0
+        counters['memory_entries'] = memory_entries
+        counters['disk_entries'] = self._connection().execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        counters['pid'] = os.getpid()
+        return counters
+
+    def entries(self, limit=50, section=None):
+        query = "SELECT key, section, prompt_version, length(content), created_at, expires_at, hits FROM llm_cache"
+        params = []
+        if section:
+            query += " WHERE section = ?"
+            params.append(section)
+        query += " ORDER BY last_access DESC LIMIT ?"
+        params.append(limit)
+
+        return [
+            {
+                'key': row[0], 'section': row[1], 'prompt_version': row[2], 'chars': row[3],
+                'created_at': datetime.fromtimestamp(row[4]).isoformat(timespec='seconds'),
+                'expires_at': datetime.fromtimestamp(row[5]).isoformat(timespec='seconds'),
+                'hits': row[6],
+            }
+            for row in self._connection().execute(query, params).fetchall()
+        ]
+
+    def purge(self, key=None, section=None, expired_only=False):
+        """Deletes matching entries from both tiers; no filter purges everything"""
+        conn = self._connection()
+        if expired_only:
+            removed = conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (time.time(),)).rowcount
+        elif key:
+            removed = conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,)).rowcount
+        elif section:
+            removed = conn.execute("DELETE FROM llm_cache WHERE section = ?", (section,)).rowcount
+        else:
+            removed = conn.execute("DELETE FROM llm_cache").rowcount
+        if not expired_only:
+            # Expired entries also lapse in other processes' memory tiers; anything else must be dropped there
+            conn.execute(
+                "INSERT INTO llm_cache_meta (name, value) VALUES ('purge_generation', 1)"
+                " ON CONFLICT(name) DO UPDATE SET value = value + 1"
+            )
+        generation = self._read_purge_generation(conn)
+        conn.commit()
+
+        with self._lock:
+            if key:
+                self._memory.pop(key, None)
+            else:
+                self._memory.clear()
+            self._purge_generation = generation
+
+        return removed
+
+llm_response_cache = LLMResponseCache(LLM_CACHE_DB, LLM_CACHE_TTL, LLM_CACHE_MEMORY_ITEMS, LLM_CACHE_MAX_ENTRIES)
+
+# =============================================================================
+# LLM RATE LIMITER
+# =============================================================================
+
+# Every completion takes a request token, an estimated-token budget and a
+# concurrency slot from state shared (via SQLite) by all workers on the host
+LLM_RATE_LIMIT_ENABLED = os.getenv("LLM_RATE_LIMIT_ENABLED", "1") == "1"
+LLM_RATE_LIMIT_DB = os.getenv("LLM_RATE_LIMIT_DB", os.path.join("cache", "llm_limiter.sqlite3"))
+LLM_RPM_LIMIT = int(os.getenv("LLM_RPM_LIMIT", "5000"))
+LLM_TPM_LIMIT = int(os.getenv("LLM_TPM_LIMIT", "450000"))
+LLM_MIN_CONCURRENCY = max(1, int(os.getenv("LLM_MIN_CONCURRENCY", "1")))
+LLM_MAX_CONCURRENCY = max(LLM_MIN_CONCURRENCY, int(os.getenv("LLM_MAX_CONCURRENCY", "32")))
+LLM_LATENCY_SPIKE_FACTOR = float(os.getenv("LLM_LATENCY_SPIKE_FACTOR", "2.5"))
+LLM_AIMD_COOLDOWN = float(os.getenv("LLM_AIMD_COOLDOWN", "5"))
+LLM_AIMD_DECREASE = 0.5
+
+def estimate_request_tokens(messages, max_tokens):
+    """What OpenAI charges against TPM up front: ~4 characters per prompt token plus max_tokens"""
+    prompt_chars = sum(len(message.get('content') or '') for message in messages)
+    return prompt_chars // 4 + max_tokens
+
+def _retry_after_seconds(error, default=1.0):
+    """Retry-After (or OpenAI's retry-after-ms) in seconds, default when absent"""
+    response = getattr(error, 'response', None)
+    headers = response.headers if response is not None else {}
+    try:
+        if headers.get('retry-after-ms'):
+            return max(0.0, float(headers['retry-after-ms']) / 1000)
+        if headers.get('retry-after'):
+            return max(0.0, float(headers['retry-after']))
+    except ValueError:
+        pass
+    return default
+
+class LLMRateLimiter:
+    """
+    Token buckets for requests and tokens per minute plus an AIMD concurrency
+    window. Leases expire on their own, so a crashed worker cannot hold slots.
+    The window grows by 1/window per success and halves (at most once per
+    cooldown) on a 429, a timeout or a latency spike.
+    """
+
+    # A full concurrency window has no known free time: poll, backing off
+    POLL_SECONDS = 0.05
+    MAX_POLL_SECONDS = 0.5
+
+    def __init__(self, db_path, rpm, tpm, min_concurrency, max_concurrency, lease_seconds):
+        self.db_path = db_path
+        self.rpm = rpm
+        self.tpm = tpm
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.lease_seconds = lease_seconds
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.counters = {'acquired': 0, 'waits': 0, 'wait_seconds': 0.0, 'rate_limited': 0, 'decreases': 0}
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS llm_limiter (name TEXT PRIMARY KEY, value REAL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS llm_leases (id TEXT PRIMARY KEY, pid INTEGER, expires_at REAL)")
+            conn.executemany(
+                "INSERT OR IGNORE INTO llm_limiter (name, value) VALUES (?, ?)",
+                [
+                    ('requests', self.rpm), ('tokens', self.tpm), ('refilled_at', time.time()),
+                    ('concurrency', max(self.min_concurrency, self.max_concurrency // 2)),
+                    ('blocked_until', 0.0), ('last_decrease', 0.0), ('latency_ewma', 0.0), ('samples', 0),
+                ],
+            )
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _count(self, counter, amount=1):
+        with self._lock:
+            self.counters[counter] += amount
+
+    def _try_acquire(self, cost):
+        """One transaction: refill buckets, then take a lease or return how long to wait (0 when unknown)"""
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            state = dict(conn.execute("SELECT name, value FROM llm_limiter"))
+            elapsed = max(0.0, now - state['refilled_at'])
+            requests = min(self.rpm, state['requests'] + elapsed * self.rpm / 60)
+            tokens = min(self.tpm, state['tokens'] + elapsed * self.tpm / 60)
+            cost = min(cost, self.tpm)  # a request larger than the whole budget waits for a full bucket
+
+            conn.execute("DELETE FROM llm_leases WHERE expires_at <= ?", (now,))
+            in_flight = conn.execute("SELECT COUNT(*) FROM llm_leases").fetchone()[0]
+
+            lease_id, wait = None, 0.0
+            if state['blocked_until'] > now:
+                wait = state['blocked_until'] - now
+            elif in_flight >= int(state['concurrency']):
+                wait = 0.0  # frees up when a lease is released
+            elif requests < 1:
+                wait = (1 - requests) * 60 / self.rpm
+            elif tokens < cost:
+                wait = (cost - tokens) * 60 / self.tpm
+            else:
+                requests -= 1
+                tokens -= cost
+                lease_id = uuid.uuid4().hex
+                conn.execute(
+                    "INSERT INTO llm_leases (id, pid, expires_at) VALUES (?, ?, ?)",
+                    (lease_id, os.getpid(), now + self.lease_seconds),
+                )
+
+            conn.executemany(
+                "UPDATE llm_limiter SET value = ? WHERE name = ?",
+                [(requests, 'requests'), (tokens, 'tokens'), (now, 'refilled_at')],
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return lease_id, min(wait, 1.0)
+
+    def acquire(self, cost):
+        """Blocks until the call may start; returns a lease id for release()"""
+        if not LLM_RATE_LIMIT_ENABLED:
+            return None
+        started = time.monotonic()
+        poll = self.POLL_SECONDS
+        while True:
+            lease_id, wait = self._try_acquire(cost)
+            if lease_id:
+                break
+            time.sleep(wait or poll)
+            poll = min(poll * 2, self.MAX_POLL_SECONDS)
+        self._record_acquire(time.monotonic() - started)
+        return lease_id
+
+    async def acquire_async(self, cost):
+        """acquire() for the event loop: the SQLite transaction runs in a thread, waits are awaited"""
+        if not LLM_RATE_LIMIT_ENABLED:
+            return None
+        started = time.monotonic()
+        poll = self.POLL_SECONDS
+        while True:
+            lease_id, wait = await asyncio.to_thread(self._try_acquire, cost)
+            if lease_id:
+                break
+            await asyncio.sleep(wait or poll)
+            poll = min(poll * 2, self.MAX_POLL_SECONDS)
+        self._record_acquire(time.monotonic() - started)
+        return lease_id
+
+    def _record_acquire(self, waited):
+        self._count('acquired')
+        if waited > 0.01:
+            self._count('waits')
+            self._count('wait_seconds', waited)
+
+    def release(self, lease_id, latency=None, usage=None, error=None):
+        """Frees the slot and feeds the outcome into the AIMD window"""
+        if lease_id is None:
+            return
+
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM llm_leases WHERE id = ?", (lease_id,))
+            state = dict(conn.execute("SELECT name, value FROM llm_limiter"))
+            updates = {}
+            reason = None
+
+            if isinstance(error, RateLimitError):
+                self._count('rate_limited')
+                reason = "429 from OpenAI"
+                updates['blocked_until'] = max(state['blocked_until'], now + _retry_after_seconds(error))
+            elif isinstance(error, APITimeoutError):
+                reason = "request timed out"
+            elif error is None and latency is not None:
+                # Seconds per completion token (floored so short answers don't look slow)
+                completion_tokens = getattr(usage, 'completion_tokens', 0) or 0
+                per_token = latency / max(completion_tokens, 50)
+                ewma = state['latency_ewma']
+                if state['samples'] >= 5 and per_token > LLM_LATENCY_SPIKE_FACTOR * ewma:
+                    reason = f"latency spike ({latency:.1f}s, {per_token / ewma:.1f}x normal)"
+                updates['latency_ewma'] = per_token if not state['samples'] else 0.8 * ewma + 0.2 * per_token
+                updates['samples'] = state['samples'] + 1
+
+            concurrency = state['concurrency']
+            if reason and now - state['last_decrease'] >= LLM_AIMD_COOLDOWN:
+                updates['concurrency'] = max(self.min_concurrency, concurrency * LLM_AIMD_DECREASE)
+                updates['last_decrease'] = now
+                self._count('decreases')
+                print(f"[LLM LIMITER] ⚠ {reason}: concurrency {concurrency:.1f} → {updates['concurrency']:.1f}")
+            elif not reason and error is None:
+                updates['concurrency'] = min(self.max_concurrency, concurrency + 1 / concurrency)
+
+            conn.executemany(
+                "UPDATE llm_limiter SET value = ? WHERE name = ?",
+                [(value, name) for name, value in updates.items()],
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def stats(self):
+        conn = self._connection()
+        state = dict(conn.execute("SELECT name, value FROM llm_limiter"))
+        in_flight = conn.execute("SELECT COUNT(*) FROM llm_leases WHERE expires_at > ?", (time.time(),)).fetchone()[0]
+        with self._lock:
+            counters = dict(self.counters)
+        counters['wait_seconds'] = round(counters['wait_seconds'], 2)
+        return {
+            'enabled': LLM_RATE_LIMIT_ENABLED,
+            'rpm_limit': self.rpm,
+            'tpm_limit': self.tpm,
+            'requests_available': round(state['requests'], 1),
+            'tokens_available': round(state['tokens']),
+            'concurrency_window': round(state['concurrency'], 2),
+            'in_flight': in_flight,
+            'blocked_for_seconds': round(max(0.0, state['blocked_until'] - time.time()), 2),
+            'latency_seconds_per_token': round(state['latency_ewma'], 4),
+            'process': counters,
+        }
+
+llm_rate_limiter = LLMRateLimiter(
+    LLM_RATE_LIMIT_DB, LLM_RPM_LIMIT, LLM_TPM_LIMIT, LLM_MIN_CONCURRENCY, LLM_MAX_CONCURRENCY,
+    lease_seconds=LLM_CONNECT_TIMEOUT + LLM_READ_TIMEOUT + 30,
+)
+
+# =============================================================================
+# LLM RETRY POLICY
+# =============================================================================
+
+# The SDK's own retries are disabled (max_retries=0) so that every attempt
+# passes through the rate limiter and this policy
+LLM_MAX_ATTEMPTS = max(1, int(os.getenv("LLM_MAX_ATTEMPTS", "4")))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1.0"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "30.0"))
+
+class NonRetryableLLMError(Exception):
+    """OpenAI rejected the request itself (auth, bad request, ...); retrying cannot help"""
+
+class LLMRetriesExhausted(Exception):
+    """A transient failure persisted through every attempt"""
+
+def classify_llm_error(error):
+    """
+    'rate_limit', 'timeout', 'connection' and 'server' are transient; 'fatal'
+    is an OpenAI 4xx that will fail the same way again; 'unknown' is anything
+    that did not come from the API client.
+    """
+    if isinstance(error, RateLimitError):
+        return 'rate_limit'
+    if isinstance(error, APITimeoutError):
+        return 'timeout'
+    if isinstance(error, APIConnectionError):
+        return 'connection'
+    if isinstance(error, APIStatusError):
+        if error.status_code in (408, 409) or error.status_code >= 500:
+            return 'server'
+        return 'fatal'
+    return 'unknown'
+
+def backoff_delay(attempt, error):
+    """Full-jitter exponential backoff; a Retry-After header is a lower bound"""
+    delay = random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** (attempt - 1)))
+    retry_after = _retry_after_seconds(error, default=None)
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, LLM_BACKOFF_MAX) + random.uniform(0, LLM_BACKOFF_BASE))
+    return delay
+
+def _retry_decision(error, attempt):
+    """Delay before the next attempt, or raises when the error should reach the caller"""
+    kind = classify_llm_error(error)
+    if kind == 'fatal':
+        raise NonRetryableLLMError(f"OpenAI rejected the request ({error.status_code}): {str(error)}") from error
+    if kind == 'unknown':
+        raise error
+    if attempt >= LLM_MAX_ATTEMPTS:
+        raise LLMRetriesExhausted(f"{kind} persisted after {attempt} attempts: {str(error)}") from error
+
+    delay = backoff_delay(attempt, error)
+    print(f"[LLM RETRY] ⚠ {kind} on attempt {attempt}/{LLM_MAX_ATTEMPTS}, retrying in {delay:.1f}s")
+    return delay
+
+def agent_log(message=""):
+    """Prints agent progress unless AGENT_VERBOSE is turned off"""
+    if AGENT_VERBOSE:
+        print(message)
+
+# =============================================================================
+# PROGRESS EVENTS
+# =============================================================================
+
+# run_id -> callable(event, data); lets a streaming endpoint observe a running workflow
+_progress_listeners = {}
+_progress_lock = threading.Lock()
+
+def register_progress_listener(run_id, listener):
+    _progress_listeners[run_id] = listener
+
+def unregister_progress_listener(run_id):
+    with _progress_lock:
+        _progress_listeners.pop(run_id, None)
+        _cancelled_runs.discard(run_id)
+
+def has_progress_listener(state):
+    return bool(state.get('run_id')) and state['run_id'] in _progress_listeners
+
+def emit_progress(state, event, **data):
+    """Forwards a workflow event to the listener registered for this run, if any"""
+    listener = _progress_listeners.get(state.get('run_id') or '')
+    if listener is None:
+        return
+    try:
+        listener(event, data)
+    except Exception as e:
+        print(f"[PROGRESS] ⚠ Listener failed on '{event}': {str(e)}")
+
+# Runs whose streaming client went away: their next section step or streamed
+# token raises ReportCancelled, so nobody pays for output that cannot be read.
+# Only a run that is still listening can be cancelled; unregistering forgets it.
+_cancelled_runs = set()
+
+class ReportCancelled(Exception):
+    """The client of a streaming run disconnected"""
+
+def cancel_run(run_id):
+    with _progress_lock:
+        if run_id in _progress_listeners:
+            _cancelled_runs.add(run_id)
+
+def raise_if_cancelled(state):
+    if state.get('run_id') and state['run_id'] in _cancelled_runs:
+        raise ReportCancelled(f"Run {state['run_id']} cancelled: the client disconnected")
 
 def sanitize_filename(text):
     return re.sub(r'[^a-zA-Z0-9_-]', '_', text)
@@ -97,18 +988,45 @@ def index():
 
 class ReportState(TypedDict):
     """Shared state across all agents in the workflow"""
+    run_id: str  # unique per report: keys progress listeners and the retry budget
     report_type: str
     inputs: Dict[str, Any]
     sections_to_generate: List[str]
+    prompt_plan: Dict[str, str]  # section heading -> compiled prompt
+    prompt_build_ms: float
     current_section_index: int
     generated_sections: List[Dict[str, str]]  # ✅ REMOVED operator.add
     current_section_name: str
     current_section_content: str
     validation_result: Dict[str, Any]
-    retry_count: int
+    retry_count: int  # retries of the current section
+    retries_used: int  # retries this state has taken from the report's budget
+    retry_decision: str  # "retry" or "accept", written by retry_controller for the router
+    pending_cache_writes: List[Dict[str, Any]]  # validated-only writes to the response cache
+    batched_sections: Dict[str, str]  # later sections already produced by a batched completion
+    prompt_variants: Dict[str, str]  # section heading -> blueprint variant, for sections under a prompt experiment
+    variant_meter: Dict[str, Any]  # tokens, time and validations of the current section's attempts
     final_report: str
     error: str
 
+class ParallelReportState(ReportState):
+    """State for the fan-out workflow: workers append results concurrently"""
+    section_results: Annotated[List[Dict[str, Any]], operator.add]
+    schedule: Dict[str, Any]
+
+class SectionTaskState(TypedDict):
+    """Payload handed to one section worker in the fan-out workflow"""
+    run_id: str
+    report_type: str
+    inputs: Dict[str, Any]
+    sections_to_generate: List[str]
+    prompt_plan: Dict[str, str]
+    section_index: int
+    batch_indices: List[int]  # sections of the same batch group this worker also handles
+    dispatch_order: int
+    predicted_seconds: List[float]  # per handled section
+    prompt_variants: Dict[str, str]
+
 # =============================================================================
 # AGENT 1: SUPERVISOR AGENT
 # =============================================================================
@@ -118,41 +1036,46 @@ def supervisor_agent(state: ReportState) -> ReportState:
     Supervisor Agent: Orchestrates the entire multi-agent workflow.
     Determines which sections need to be generated based on report type.
     """
-    print(f"\n{'='*70}")
-    print(f"[SUPERVISOR AGENT] Initializing {state['report_type'].upper()} Report Generation")
-    print(f"{'='*70}\n")
+    agent_log(f"\n{'='*70}")
+    agent_log(f"[SUPERVISOR AGENT] Initializing {state['report_type'].upper()} Report Generation")
+    agent_log(f"{'='*70}\n")
     
     # Determine sections based on report type
-    if state['report_type'] == 'career':
-        sections = [
-            "1. Detailed Career Role Breakdown",
-            "2. Industry Specific Requirements",
-            "3. Emerging Trends and Future Job Prospects",
-            "4. Recommended Internships",
-            "5. Professional Networking and Industry Associations",
-            "6. Guidelines for Progress Monitoring & Support",
-        ]
-    else:  # development
-        sections = [
-            "1. Academic Interventions",
-            "2. Non-Academic Interventions",
-            "3. Habit Reengineering",
-            "4. Physical Grooming",
-            "5. Psychological Grooming",
-            "6. Suggested Reading",
-            "7. Health Discipline",
-        ]
+    sections = get_report_sections(state['report_type'])
+    
+    # Draw blueprint variants for sections under a prompt experiment (role fragments always use the base)
+    state['prompt_variants'] = assign_prompt_variants(
+        [s for s in sections if not uses_role_fragments(state, s)], state['run_id'])
+    
+    # Compile every section prompt once for the whole run
+    prompt_plan, prompt_build_ms = build_prompt_plan(state['report_type'], state['inputs'], variants=state['prompt_variants'])
     
     state['sections_to_generate'] = sections
+    state['prompt_plan'] = prompt_plan
+    state['prompt_build_ms'] = prompt_build_ms
     state['current_section_index'] = 0
     state['generated_sections'] = []  # ✅ Initialize as empty list
     state['retry_count'] = 0
     state['error'] = ''
     
-    print(f"[SUPERVISOR] Workflow Plan: {len(sections)} sections identified")
+    agent_log(f"[SUPERVISOR] Workflow Plan: {len(sections)} sections identified")
     for idx, section in enumerate(sections, 1):
-        print(f"  {idx}. {section}")
-    print()
+        agent_log(f"  {idx}. {section}")
+    agent_log(f"[SUPERVISOR] Prompt plan compiled: {len(prompt_plan)} prompts in {prompt_build_ms:.2f} ms "
+              f"(prompt version {prompt_templates.version})")
+    if any(section in YEAR_PLAN_COLUMNS for section in sections):
+        periods = plan_periods(state['inputs'])
+        agent_log(f"[SUPERVISOR] Plan granularity: {plan_granularity(state['inputs'])} "
+                  f"({len(periods)} rows per year, {len(PLAN_YEARS) * len(periods)} per plan section)")
+    if PROMPT_PRUNING_ENABLED:
+        agent_log(f"[SUPERVISOR] Prompt guidance: board={classify_board(state['inputs'].get('board')) or 'all'}, "
+                  f"level={classify_level(state['inputs'].get('standard')) or 'all'}")
+    if state['prompt_variants']:
+        agent_log("[SUPERVISOR] Prompt variants: " + ", ".join(
+            f"{section} = {variant}" for section, variant in state['prompt_variants'].items()))
+    agent_log()
+    
+    emit_progress(state, 'plan', report_type=state['report_type'], sections=sections)
     
     return state
 
@@ -160,6 +1083,10 @@ def supervisor_agent(state: ReportState) -> ReportState:
 # AGENT 2: SECTION GENERATOR AGENT
 # =============================================================================
 
+SECTION_MODEL = "gpt-4o"
+SECTION_TEMPERATURE = 0.7
+SECTION_MAX_TOKENS = 5500
+
 def section_generator_agent(state: ReportState) -> ReportState:
     """
     Section Generator Agent: Generates content for a specific section.
@@ -168,93 +1095,463 @@ def section_generator_agent(state: ReportState) -> ReportState:
     current_idx = state['current_section_index']
     section_name = state['sections_to_generate'][current_idx]
     
-    print(f"[GENERATOR AGENT] Processing Section {current_idx + 1}/{len(state['sections_to_generate'])}: {section_name}")
+    agent_log(f"[GENERATOR AGENT] Processing Section {current_idx + 1}/{len(state['sections_to_generate'])}: {section_name}")
+    raise_if_cancelled(state)
+    emit_progress(state, 'section_started', section=section_name, index=current_idx, attempt=state['retry_count'] + 1)
     
-    # Build the base prompt with student data
-    skill_guidance = build_skill_action_guidance(
-        state['inputs'].get("highest_skills", []),
-        state['inputs'].get("skillpercentages", {})
-    )
+    # Role-level sections are assembled from per-role fragments shared across students
+    if uses_role_fragments(state, section_name):
+        try:
+            generate_role_fragment_section(state, section_name)
+        except (NonRetryableLLMError, ReportCancelled):
+            raise
+        except Exception as e:
+            store_generation_failure(state, section_name, e)
+        return state
     
-    base_prompt = (
-        "Based on the following student profile information, you will write ONLY ONE "
-        "of the requested sections of the report each time. "
-        "Do not repeat the input data in the output.\n\n"
-        "INPUT DATA:\n"
-        f"- Highest Skills with Percentages: {format_skills_with_percentages(state['inputs'].get('highest_skills', []), state['inputs'].get('skillpercentages', {}))}\n"
-        f"- Thinking Pattern: {state['inputs'].get('thinking_pattern', 'NA')}\n"
-        f"- Achievement Style with Percentages: {format_skills_with_percentages(state['inputs'].get('achievement_style', []), state['inputs'].get('achievementpercentages', {}))}\n"
-        f"- Learning Communication Style with Percentages: {format_skills_with_percentages(state['inputs'].get('learning_communication_style', []), state['inputs'].get('learningpercentages', {}))}\n"
-        f"- Quotients with Percentages: {format_skills_with_percentages(state['inputs'].get('quotients', []), state['inputs'].get('quotientpercentages', {}))}\n"
-        f"- Personality Type: {state['inputs'].get('personality_type', 'NA')}\n"
-        f"- Suggested Career Roles: {state['inputs'].get('career_roles', 'NA')}\n\n"
-        "CRITICAL INSTRUCTION - CAREER ROLE FOCUS:\n"
-        f"YOU MUST USE THE EXACT CAREER ROLES ENTERED BY THE STUDENT: {state['inputs'].get('career_roles', 'NA')}\n"
-        "DO NOT CHANGE OR SUGGEST DIFFERENT ROLES.\n"
-        "The ENTIRE report must be centered around THESE EXACT ROLES ONLY.\n"
-        "If multiple roles are mentioned (e.g., Software Engineer, Data Scientist, Event Manager), you MUST:\n"
-        "  - Address ALL roles mentioned by the student\n"
-        "  - Create separate subsections for each role where appropriate\n"
-        "Every recommendation must be DIRECTLY relevant to the entered roles.\n"
-        "Do NOT provide generic career advice. Do NOT suggest alternative roles.\n\n"
-        f"{skill_guidance}\n\n"
-        "NON-NEGOTIABLE OUTPUT RULES:\n"
-        "- BE CONCISE AND DIRECT. NO lengthy explanations or verbose paragraphs.\n"
-        "- Use BULLET POINTS for all lists and action items.\n"
-        "- Each bullet should be 1-2 lines maximum.\n"
-        "- NO introductory or concluding paragraphs.\n"
-        "- Get straight to the actionable information.\n"
-        "- TOTAL section length: 200-350 words maximum (not 500-700).\n"
-        "- Do NOT use emojis or decorative symbols like * or #.\n"
-        "- Format with clear subheadings for each role if multiple roles exist.\n\n"
-        "FORMAT REQUIREMENTS:\n"
-        "- First line must be the exact section heading.\n"
-        "- Organize content with concise subheadings.\n"
-        "- Use bullet points starting with '- ' for all lists.\n"
-        "- Keep explanations minimal - focus on facts and action items.\n\n"
-    )
+    # Look up the prompt compiled by the supervisor
+    messages = build_section_messages(state['prompt_plan'][section_name])
     
-    # Get section-specific prompt
-    section_prompts = generate_section_prompts(state['report_type'], state['inputs'])
-    section_prompt = section_prompts[current_idx]
+    cache_key, cached_content = lookup_section_cache(state, section_name, messages)
+    if cached_content is not None:
+        store_cached_section(state, section_name, cached_content)
+        return state
+    
+    begin_variant_attempt(state, section_name)
+    if take_batched_section(state, section_name, cache_key):
+        return state
     
     try:
-        # Call OpenAI API
-        client = get_openai_client()
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        "You are academic and career expert having more than 35 years of experience "
-                        "with deep knowledge in psychology, career development, and "
-                        "personalized education planning. "
-                        "You MUST strictly follow the career roles provided by the student. "
-                        "Do NOT suggest different roles. Do NOT talk about generic or unspecified roles. "
-                        "You must not use emojis or decorative symbols like * or # in the content."
-                    ),
-                },
-                {"role": "user", "content": section_prompt},
-            ],
-            temperature=0.7,
-            max_tokens=5500,
-        )
-        
-        section_content = response.choices[0].message.content.strip()
-        
-        state['current_section_name'] = section_name
-        state['current_section_content'] = section_content
+        repair = plan_section_repair(state, section_name)
+        batch = plan_section_batch(state, section_name)
+        if repair:
+            # Retry of a structurally incomplete section: ask only for the missing pieces
+            response = request_completion(repair['messages'], repair['max_tokens'])
+            response = continue_truncated_section(state, section_name, repair['messages'], response, years=())
+            store_repaired_section(state, section_name, repair, response, cache_key)
+        elif batch:
+            # Short sections share one completion (and one copy of the base prompt)
+            generate_section_batch(state, batch, cache_key)
+        elif uses_year_split(state, section_name):
+            # One concurrent request per year instead of one 36-month completion
+            generate_year_split_section(state, section_name, cache_key)
+        else:
+            generate_single_section(state, section_name, messages, cache_key)
         
-        print(f"[GENERATOR AGENT] ✓ Content generated successfully ({len(section_content)} chars)")
+    except (NonRetryableLLMError, ReportCancelled):
+        raise  # e.g. an invalid API key: fail the report instead of retrying the section
+    except Exception as e:
+        store_generation_failure(state, section_name, e)
+    
+    return state
+
+async def section_generator_agent_async(state: ReportState) -> ReportState:
+    """
+    Async Section Generator Agent: Same contract as section_generator_agent,
+    but awaits AsyncOpenAI so the event loop can serve other reports meanwhile.
+    """
+    current_idx = state['current_section_index']
+    section_name = state['sections_to_generate'][current_idx]
+    
+    agent_log(f"[GENERATOR AGENT] Processing Section {current_idx + 1}/{len(state['sections_to_generate'])} (async): {section_name}")
+    raise_if_cancelled(state)
+    emit_progress(state, 'section_started', section=section_name, index=current_idx, attempt=state['retry_count'] + 1)
+    
+    if uses_role_fragments(state, section_name):
+        try:
+            await generate_role_fragment_section_async(state, section_name)
+        except (NonRetryableLLMError, ReportCancelled):
+            raise
+        except Exception as e:
+            store_generation_failure(state, section_name, e)
+        return state
+    
+    messages = build_section_messages(state['prompt_plan'][section_name])
+    
+    cache_key, cached_content = lookup_section_cache(state, section_name, messages)
+    if cached_content is not None:
+        store_cached_section(state, section_name, cached_content)
+        return state
+    
+    begin_variant_attempt(state, section_name)
+    if take_batched_section(state, section_name, cache_key):
+        return state
+    
+    try:
+        repair = plan_section_repair(state, section_name)
+        batch = plan_section_batch(state, section_name)
+        if repair:
+            response = await request_completion_async(repair['messages'], repair['max_tokens'])
+            response = await continue_truncated_section_async(state, section_name, repair['messages'], response, years=())
+            store_repaired_section(state, section_name, repair, response, cache_key)
+        elif batch:
+            await generate_section_batch_async(state, batch, cache_key)
+        elif uses_year_split(state, section_name):
+            await generate_year_split_section_async(state, section_name, cache_key)
+        else:
+            await generate_single_section_async(state, section_name, messages, cache_key)
         
+    except (NonRetryableLLMError, ReportCancelled):
+        raise  # e.g. an invalid API key: fail the report instead of retrying the section
     except Exception as e:
-        print(f"[GENERATOR AGENT] ✗ Error: {str(e)}")
-        state['error'] = f"Generation failed for {section_name}: {str(e)}"
-        state['current_section_content'] = f"{section_name}\n\nContent generation failed."
+        store_generation_failure(state, section_name, e)
     
     return state
 
+def generate_single_section(state, section_name, messages, cache_key=None):
+    """One completion for one section: schema-constrained JSON when it has a schema, free text otherwise or as the fallback"""
+    response = request_structured_completion(messages, [section_name], periods=plan_periods(state['inputs']))
+    if response is None:
+        on_delta = section_delta_listener(state, section_name)
+        response = request_completion(messages, on_delta=on_delta)
+        response = continue_truncated_section(state, section_name, messages, response, on_delta)
+    store_generated_section(state, section_name, response, cache_key)
+
+async def generate_single_section_async(state, section_name, messages, cache_key=None):
+    """Async variant of generate_single_section"""
+    response = await request_structured_completion_async(messages, [section_name], periods=plan_periods(state['inputs']))
+    if response is None:
+        on_delta = section_delta_listener(state, section_name)
+        response = await request_completion_async(messages, on_delta=on_delta)
+        response = await continue_truncated_section_async(state, section_name, messages, response, on_delta)
+    store_generated_section(state, section_name, response, cache_key)
+
+class _StreamCollector:
+    """Accumulates streamed chunks into a response shaped like a non-streamed one"""
+
+    def __init__(self, on_delta):
+        self.on_delta = on_delta
+        self.parts = []
+        self.finish_reason = None
+        self.usage = None
+
+    def add(self, chunk):
+        if getattr(chunk, 'usage', None):
+            self.usage = chunk.usage
+        if not chunk.choices:
+            return
+        choice = chunk.choices[0]
+        if choice.finish_reason:
+            self.finish_reason = choice.finish_reason
+        delta = choice.delta.content if choice.delta else None
+        if delta:
+            self.parts.append(delta)
+            self.on_delta(delta)
+
+    def response(self):
+        message = SimpleNamespace(content="".join(self.parts))
+        choice = SimpleNamespace(message=message, finish_reason=self.finish_reason)
+        return SimpleNamespace(choices=[choice], usage=self.usage)
+
+def request_completion(messages, max_tokens=SECTION_MAX_TOKENS, on_delta=None, response_format=None):
+    """
+    Chat completion on the shared client, admitted by the rate limiter and
+    retried with backoff on transient errors. With on_delta the completion is
+    streamed and every content delta is passed to it as it arrives.
+    Raises NonRetryableLLMError or LLMRetriesExhausted.
+    """
+    attempt = 1
+    while True:
+        try:
+            return _limited_completion(messages, max_tokens, on_delta, response_format)
+        except Exception as e:
+            time.sleep(_retry_decision(e, attempt))
+            attempt += 1
+
+def _limited_completion(messages, max_tokens, on_delta, response_format=None):
+    lease = llm_rate_limiter.acquire(estimate_request_tokens(messages, max_tokens))
+    started = time.monotonic()
+    try:
+        response = _create_completion(get_openai_client(), messages, max_tokens, on_delta, response_format)
+    except Exception as e:
+        llm_rate_limiter.release(lease, error=e)
+        raise
+    llm_rate_limiter.release(lease, latency=time.monotonic() - started, usage=response.usage)
+    record_prompt_usage(response.usage)
+    return response
+
+def _create_completion(client, messages, max_tokens, on_delta, response_format=None):
+    params = dict(model=SECTION_MODEL, messages=messages, temperature=SECTION_TEMPERATURE, max_tokens=max_tokens)
+    if response_format:
+        params['response_format'] = response_format
+    
+    if on_delta is None:
+        return client.chat.completions.create(**params)
+    
+    collector = _StreamCollector(on_delta)
+    for chunk in client.chat.completions.create(stream=True, stream_options={"include_usage": True}, **params):
+        collector.add(chunk)
+    return collector.response()
+
+async def request_completion_async(messages, max_tokens=SECTION_MAX_TOKENS, on_delta=None, response_format=None):
+    """Async request_completion: same limiter, retry policy and streaming behaviour"""
+    attempt = 1
+    while True:
+        try:
+            return await _limited_completion_async(messages, max_tokens, on_delta, response_format)
+        except Exception as e:
+            await asyncio.sleep(_retry_decision(e, attempt))
+            attempt += 1
+
+async def _limited_completion_async(messages, max_tokens, on_delta, response_format=None):
+    lease = await llm_rate_limiter.acquire_async(estimate_request_tokens(messages, max_tokens))
+    started = time.monotonic()
+    try:
+        response = await _create_completion_async(get_async_openai_client(), messages, max_tokens, on_delta, response_format)
+    except Exception as e:
+        await asyncio.to_thread(llm_rate_limiter.release, lease, error=e)
+        raise
+    await asyncio.to_thread(llm_rate_limiter.release, lease, latency=time.monotonic() - started, usage=response.usage)
+    record_prompt_usage(response.usage)
+    return response
+
+async def _create_completion_async(client, messages, max_tokens, on_delta, response_format=None):
+    params = dict(model=SECTION_MODEL, messages=messages, temperature=SECTION_TEMPERATURE, max_tokens=max_tokens)
+    if response_format:
+        params['response_format'] = response_format
+    
+    if on_delta is None:
+        return await client.chat.completions.create(**params)
+    
+    collector = _StreamCollector(on_delta)
+    async for chunk in await client.chat.completions.create(stream=True, stream_options={"include_usage": True}, **params):
+        collector.add(chunk)
+    return collector.response()
+
+def section_delta_listener(state, section_name, part=None):
+    """
+    Token callback for streaming runs, None when nobody is listening. part
+    labels deltas of one concurrent piece of the section (a year of a split plan).
+    """
+    if not has_progress_listener(state):
+        return None
+    labels = {'part': part} if part else {}
+
+    def on_delta(delta):
+        raise_if_cancelled(state)  # aborts the stream mid-completion
+        emit_progress(state, 'token', section=section_name, delta=delta, **labels)
+    return on_delta
+
+def build_section_messages(section_prompt):
+    """Chat messages for one section request: shared system role + section prompt"""
+    return [
+        {"role": "system", "content": prompt_templates.current().system},
+        {"role": "user", "content": section_prompt},
+    ]
+
+def section_cache_key(state, section_name, messages):
+    """Content address of one section request: normalized inputs + exact prompt + prompt version"""
+    return content_hash({
+        'prompt_version': prompt_templates.version,
+        'model': SECTION_MODEL,
+        'temperature': SECTION_TEMPERATURE,
+        'max_tokens': SECTION_MAX_TOKENS,
+        'report_type': state['report_type'],
+        'section': section_name,
+        'inputs': {k: v for k, v in state['inputs'].items() if k in PROMPT_INPUT_FIELDS},
+        'messages': messages,
+    })
+
+def lookup_section_cache(state, section_name, messages):
+    """
+    Returns (cache_key, cached_content). Retries skip the lookup, since the
+    cached text is exactly what a retry is trying to replace.
+    """
+    if not LLM_CACHE_ENABLED:
+        return None, None
+    
+    cache_key = section_cache_key(state, section_name, messages)
+    if state['retry_count'] > 0:
+        return cache_key, None
+    
+    return cache_key, llm_response_cache.get(cache_key)
+
+def is_section_cached(state, section_name, messages):
+    """lookup_section_cache without the read: batch planning peeks at siblings without counting a miss"""
+    if not LLM_CACHE_ENABLED or state['retry_count'] > 0:
+        return False
+    return llm_response_cache.contains(section_cache_key(state, section_name, messages))
+
+def store_cached_section(state, section_name, section_content):
+    """Writes a cache hit into the state (nothing to write back later)"""
+    state['current_section_name'] = section_name
+    state['current_section_content'] = section_content
+    state['pending_cache_writes'] = []
+    
+    agent_log(f"[GENERATOR AGENT] ✓ Cache hit ({len(section_content)} chars)")
+
+def store_generated_section(state, section_name, response, cache_key=None):
+    """Writes a successful completion into the state"""
+    section_content = expand_compact_plan(section_name, response.choices[0].message.content.strip())
+    
+    state['current_section_name'] = section_name
+    state['current_section_content'] = section_content
+    # Only cached once the validator accepts it (see commit_section_cache)
+    state['pending_cache_writes'] = [{'key': cache_key, 'section': section_name, 'content': section_content}] if cache_key else []
+    
+    agent_log(f"[GENERATOR AGENT] ✓ Content generated successfully ({len(section_content)} chars, "
+              f"{describe_last_llm_connection()}, {describe_prompt_cache(response.usage)})")
+
+def store_generation_failure(state, section_name, error):
+    """Writes a placeholder for a failed completion so the validator can trigger a retry"""
+    agent_log(f"[GENERATOR AGENT] ✗ Error: {str(error)}")
+    state['error'] = f"Generation failed for {section_name}: {str(error)}"
+    state['pending_cache_writes'] = []
+    state['current_section_name'] = section_name
+    state['current_section_content'] = f"{section_name}\n\nContent generation failed."
+
+# =============================================================================
+# ROLE FRAGMENT CACHE
+# =============================================================================
+
+# Career sections whose content depends on the role, not on the student's
+# fingerprint profile: generated once per normalized role and shared
+ROLE_FRAGMENT_SECTIONS = {
+    "2. Industry Specific Requirements": "For {role}:",
+    "3. Emerging Trends and Future Job Prospects": "{role}",
+    "5. Professional Networking and Industry Associations": "For {role}:",
+}
+ROLE_FRAGMENT_CACHE_ENABLED = os.getenv("ROLE_FRAGMENT_CACHE", "1") == "1"
+ROLE_FRAGMENT_TTL = int(os.getenv("ROLE_FRAGMENT_TTL", str(30 * 24 * 3600)))
+ROLE_FRAGMENT_MAX_TOKENS = 2000
+
+def normalize_role(role):
+    """Cache identity of a role: case-insensitive, punctuation and spacing collapsed"""
+    return " ".join(re.sub(r'[^\w+#&/ ]', ' ', role.casefold()).split())
+
+def split_career_roles(career_roles):
+    """Splits the free-text career roles field into distinct roles, keeping entry order"""
+    roles = []
+    seen = set()
+    for part in re.split(r'[,;\n|]+', career_roles or ''):
+        role = " ".join(part.split())
+        key = normalize_role(role)
+        if key and key not in ('na', 'n a') and key not in seen:
+            seen.add(key)
+            roles.append(role)
+    return roles
+
+def uses_role_fragments(state, section_name):
+    return (
+        ROLE_FRAGMENT_CACHE_ENABLED
+        and state['report_type'] == 'career'
+        and section_name in ROLE_FRAGMENT_SECTIONS
+        and bool(split_career_roles(state['inputs'].get('career_roles', '')))
+    )
+
+def build_role_fragment_prompt(section_name, role):
+    """Student-independent prompt for one role's part of a role-level section"""
+    role_heading = ROLE_FRAGMENT_SECTIONS[section_name].format(role=role)
+    blueprint = prompt_templates.blueprint(section_name)
+
+    # Invariant text first and the role last, so every role of a section shares the cached prefix
+    return (
+        "NON-NEGOTIABLE OUTPUT RULES:\n"
+        "- BE CONCISE AND DIRECT. NO lengthy explanations or verbose paragraphs.\n"
+        "- Use BULLET POINTS for all lists and action items.\n"
+        "- Each bullet should be 1-2 lines maximum.\n"
+        "- NO introductory or concluding paragraphs.\n"
+        "- Do NOT use emojis or decorative symbols like * or #.\n\n"
+        f"{blueprint}\n"
+        f"You are writing ONE ROLE'S PART of the report section \"{section_name}\": the career role given below.\n"
+        "Write ONLY about that exact role. Do NOT mention or suggest any other role.\n"
+        "Do NOT write the section heading.\n"
+        "Your first line must be exactly the role heading below, followed by the content for this role only.\n\n"
+        f"CAREER ROLE: {role}\n"
+        f"{role_heading}\n"
+    )
+
+def role_fragment_cache_key(section_name, role):
+    return content_hash({
+        'kind': 'role_fragment',
+        'prompt_version': prompt_templates.version,
+        'model': SECTION_MODEL,
+        'temperature': SECTION_TEMPERATURE,
+        'section': section_name,
+        'role': normalize_role(role),
+    })
+
+def _plan_role_fragments(state, section_name):
+    """One entry per role: cache key, prompt messages and cached content (None on a miss)"""
+    fragments = []
+    for role in split_career_roles(state['inputs'].get('career_roles', '')):
+        key = role_fragment_cache_key(section_name, role)
+        # Retries regenerate every fragment instead of reusing what just failed validation
+        cached = llm_response_cache.get(key) if LLM_CACHE_ENABLED and state['retry_count'] == 0 else None
+        fragments.append({
+            'role': role,
+            'key': key,
+            'messages': build_section_messages(build_role_fragment_prompt(section_name, role)),
+            'content': cached,
+        })
+    return fragments
+
+def _clean_fragment(section_name, content):
+    """Drops a repeated section heading if the model wrote one anyway"""
+    lines = content.strip().split('\n')
+    if lines and lines[0].strip() == section_name:
+        lines = lines[1:]
+    return '\n'.join(lines).strip()
+
+def _store_role_fragments(state, section_name, fragments, generated):
+    section_content = f"{section_name}\n\n" + "\n\n".join(f['content'] for f in fragments)
+
+    state['current_section_name'] = section_name
+    state['current_section_content'] = section_content
+    state['pending_cache_writes'] = [
+        {'key': f['key'], 'section': section_name, 'content': f['content'], 'ttl': ROLE_FRAGMENT_TTL}
+        for f in generated
+    ] if LLM_CACHE_ENABLED else []
+
+    agent_log(f"[GENERATOR AGENT] ✓ Assembled from {len(fragments)} role fragment(s): "
+              f"{len(fragments) - len(generated)} cached, {len(generated)} generated ({len(section_content)} chars)")
+
+def generate_role_fragment_section(state, section_name):
+    """Builds a role-level section from cached role fragments, generating only the missing ones"""
+    fragments = _plan_role_fragments(state, section_name)
+    missing = [f for f in fragments if f['content'] is None]
+
+    def generate(fragment):
+        response = request_structured_completion(fragment['messages'], [section_name], ROLE_FRAGMENT_MAX_TOKENS)
+        if response is None:
+            response = request_completion(fragment['messages'], ROLE_FRAGMENT_MAX_TOKENS)
+            response = continue_truncated_section(state, section_name, fragment['messages'], response)
+        return response
+
+    if missing:
+        with section_part_workers(state, len(missing)) as workers, ThreadPoolExecutor(max_workers=workers) as pool:
+            responses = list(pool.map(in_current_context(generate), missing))
+        for fragment, response in zip(missing, responses):
+            fragment['content'] = _clean_fragment(section_name, response.choices[0].message.content)
+
+    _store_role_fragments(state, section_name, fragments, missing)
+
+async def generate_role_fragment_section_async(state, section_name):
+    """Async variant of generate_role_fragment_section"""
+    fragments = _plan_role_fragments(state, section_name)
+    missing = [f for f in fragments if f['content'] is None]
+
+    async def generate(fragment):
+        response = await request_structured_completion_async(fragment['messages'], [section_name], ROLE_FRAGMENT_MAX_TOKENS)
+        if response is None:
+            response = await request_completion_async(fragment['messages'], ROLE_FRAGMENT_MAX_TOKENS)
+            response = await continue_truncated_section_async(state, section_name, fragment['messages'], response)
+        return response
+
+    if missing:
+        with section_part_workers(state, len(missing)) as workers:
+            semaphore = asyncio.Semaphore(workers)
+
+            async def generate_limited(fragment):
+                async with semaphore:
+                    return await generate(fragment)
+
+            responses = await asyncio.gather(*[generate_limited(f) for f in missing])
+        for fragment, response in zip(missing, responses):
+            fragment['content'] = _clean_fragment(section_name, response.choices[0].message.content)
+
+    _store_role_fragments(state, section_name, fragments, missing)
+
 # =============================================================================
 # AGENT 3: VALIDATOR AGENT
 # =============================================================================
@@ -266,7 +1563,7 @@ def validator_agent(state: ReportState) -> ReportState:
     section_name = state['current_section_name']
     section_content = state['current_section_content']
     
-    print(f"[VALIDATOR AGENT] Analyzing: {section_name}")
+    agent_log(f"[VALIDATOR AGENT] Analyzing: {section_name}")
     
     validation_result = {
         'is_valid': True,
@@ -276,10 +1573,9 @@ def validator_agent(state: ReportState) -> ReportState:
     
     # Special validation for Health Discipline
     if section_name == "7. Health Discipline":
-        required_categories = ["Food", "Sleeping Discipline", "Hydration", "Lifestyle"]
         missing_categories = []
         
-        for category in required_categories:
+        for category in HEALTH_CATEGORIES:
             if category.lower() not in section_content.lower():
                 missing_categories.append(category)
         
@@ -287,50 +1583,1142 @@ def validator_agent(state: ReportState) -> ReportState:
             validation_result['is_valid'] = False
             validation_result['issues'].append(f"Missing required categories: {', '.join(missing_categories)}")
             validation_result['requires_retry'] = True
-            print(f"[VALIDATOR] ✗ FAILED: Missing categories - {missing_categories}")
+            agent_log(f"[VALIDATOR] ✗ FAILED: Missing categories - {missing_categories}")
         else:
-            print(f"[VALIDATOR] ✓ All 4 categories present (Food, Sleep, Hydration, Lifestyle)")
+            agent_log("[VALIDATOR] ✓ All 4 categories present (Food, Sleep, Hydration, Lifestyle)")
     
     # General validation: Content length
     if len(section_content.strip()) < 100:
         validation_result['is_valid'] = False
         validation_result['issues'].append("Content too short (< 100 chars)")
         validation_result['requires_retry'] = True
-        print(f"[VALIDATOR] ✗ Content too short")
+        agent_log("[VALIDATOR] ✗ Content too short")
     else:
-        print(f"[VALIDATOR] ✓ Content length adequate")
+        agent_log("[VALIDATOR] ✓ Content length adequate")
+    
+    # Structural validation: the fields and records the Word table parsers expect
+    gap_report = find_section_gaps(section_name, section_content, state['inputs'])
+    if gap_report and gap_report['gaps']:
+        validation_result['is_valid'] = False
+        validation_result['issues'].append(f"Structure incomplete: {describe_section_gaps(gap_report)}")
+        validation_result['requires_retry'] = True
+        validation_result['gaps'] = gap_report
+        agent_log(f"[VALIDATOR] ✗ {len(gap_report['gaps'])} structural gaps")
+    elif gap_report:
+        agent_log("[VALIDATOR] ✓ Structure complete")
     
     state['validation_result'] = validation_result
+    end_variant_attempt(state, validation_result['is_valid'])
     
     if validation_result['is_valid']:
-        print(f"[VALIDATOR] ✓✓ VALIDATION PASSED\n")
+        agent_log("[VALIDATOR] ✓✓ VALIDATION PASSED\n")
     else:
-        print(f"[VALIDATOR] ✗✗ VALIDATION FAILED: {validation_result['issues']}\n")
+        agent_log(f"[VALIDATOR] ✗✗ VALIDATION FAILED: {validation_result['issues']}\n")
+    
+    emit_progress(state, 'validation', section=section_name,
+                  is_valid=validation_result['is_valid'], issues=validation_result['issues'])
     
     return state
 
+# =============================================================================
+# SECTION SCHEMAS & PATCH REPAIR
+# =============================================================================
+
+# Structural contracts mirroring what the create_*_table parsers read. When a
+# section breaks one, the retry asks only for the missing pieces and merges
+# them in instead of regenerating the whole section.
+
+PLAN_YEARS = ["Year 1", "Year 2", "Year 3"]
+PLAN_MONTHS = ["January", "February", "March", "April", "May", "June",
+               "July", "August", "September", "October", "November", "December"]
+
+# plan_granularity input -> months per plan row. Coarser plans label each row
+# with its month range ("- Month: January-March") and have 12 / step rows a year.
+PLAN_GRANULARITIES = {'monthly': 1, 'bi-monthly': 2, 'quarterly': 3}
+DEFAULT_PLAN_GRANULARITY = 'monthly'
+
+# Month-by-month sections: fields every month needs, in table column order (after Month)
+YEAR_PLAN_COLUMNS = {
+    "1. Academic Interventions": ["Activity", "Technical Skills", "Soft Skills", "Learning Material", "Objective"],
+    "2. Non-Academic Interventions": ["Activity", "Technical Skills", "Soft Skills", "Learning Outcome", "Objective"],
+    "3. Habit Reengineering": ["Activity", "Action Plan", "Objective", "Habits to Develop", "Soft Skills", "Learning Outcomes"],
+    "4. Physical Grooming": ["Activity", "Objective", "Physical & Mental Skills Developed", "Soft Skills", "Learning Outcomes"],
+    "5. Psychological Grooming": ["Activity", "Objective", "Psychological Skills Developed", "Soft Skills", "Learning Outcomes"],
+}
+
+HEALTH_CATEGORIES = ["Food", "Sleeping Discipline", "Hydration", "Lifestyle"]
+
+# Block-per-record sections: line that opens a record, fields each record needs
+# (optional_fields are asked for but not enforced), and which records must exist
+# (a fixed list, the student's career roles, or a minimum count)
+RECORD_SCHEMAS = {
+    "1. Detailed Career Role Breakdown": {
+        'marker': "Career Role:",
+        'fields': ["Technical Skills", "Soft Skills", "Undergraduate Education", "Postgraduate Education",
+                   "Micro-degrees", "Certifications", "Career Progression", "Salary Range",
+                   "Day-to-Day Responsibilities"],
+        'required': 'career_roles',
+    },
+    "6. Suggested Reading": {
+        'marker': "- Book Name:",
+        'fields': ["Author", "Publication", "Why Should This Book Be Read?"],
+        'optional_fields': ["Availability in India"],
+        'min_records': 15,
+    },
+    "7. Health Discipline": {
+        'marker': "- Category:",
+        'fields': ["Recommendation", "Benefits for Mental Health", "Benefits for Physical Health"],
+        'required': HEALTH_CATEGORIES,
+    },
+}
+
+# Past this share of missing pieces a full regeneration is requested instead of a patch
+REPAIR_MAX_GAP_RATIO = 0.5
+REPAIR_TOKENS_PER_GAP = 160
+
+# Full month names or three-letter abbreviations as whole words ("Marketing" is not March)
+_MONTH_NAME = re.compile(r'\b(' + '|'.join(m.lower() for m in PLAN_MONTHS) + r'|jan|feb|mar|apr|jun|jul|aug|sept?|oct|nov|dec)\b', re.I)
+# A range only when the label opens with one: "Jan-Mar", "January to March 2025"
+_MONTH_RANGE = re.compile(rf'^\s*{_MONTH_NAME.pattern}\.?\s*(?:-|–|—|to)\s*{_MONTH_NAME.pattern}', re.I)
+
+def plan_granularity(inputs):
+    """Normalized plan_granularity input ("Bi Monthly" -> "bi-monthly"), monthly when missing or unknown"""
+    value = re.sub(r'[\s_]+', '-', str((inputs or {}).get('plan_granularity') or '').strip().lower())
+    value = 'bi-monthly' if value == 'bimonthly' else value
+    return value if value in PLAN_GRANULARITIES else DEFAULT_PLAN_GRANULARITY
+
+def plan_periods(inputs):
+    """Row labels of one plan year: the 12 months, or month ranges for coarser granularities"""
+    step = PLAN_GRANULARITIES[plan_granularity(inputs)]
+    if step == 1:
+        return PLAN_MONTHS
+    return [f"{PLAN_MONTHS[i]}-{PLAN_MONTHS[i + step - 1]}" for i in range(0, len(PLAN_MONTHS), step)]
+
+def _canonical_month(name):
+    return next(m for m in PLAN_MONTHS if m.lower().startswith(name.lower()))
+
+def _plan_month(value):
+    """
+    Canonical period in a "- Month:" value ("March 2025" -> "March", "Jan to Mar"
+    -> "January-March"). Other months later in the label are notes, not a range:
+    "January (review December)" -> "January".
+    """
+    match = _MONTH_RANGE.match(value)
+    if match:
+        first, last = _canonical_month(match.group(1)), _canonical_month(match.group(2))
+        return first if first == last else f"{first}-{last}"
+    match = _MONTH_NAME.search(value)
+    return _canonical_month(match.group(1)) if match else value.strip()
+
+def _period_order(period):
+    start = period.split("-")[0]
+    return PLAN_MONTHS.index(start) if start in PLAN_MONTHS else len(PLAN_MONTHS)
+
+def parse_year_plan(content):
+    """(preamble lines, {year: {month: {field: value}}}) as _parse_year_block sees it"""
+    lines = content.split("\n")
+    first_year = next((i for i, line in enumerate(lines)
+                       if line.strip().startswith("Year ") and line.strip().endswith(":")), len(lines))
+    plan = {}
+    for year, rows in _parse_year_block(lines[first_year:]).items():
+        months = plan.setdefault(year, {})
+        for row in rows:
+            fields = {k: v for k, v in row.items() if k != "Month"}
+            months.setdefault(_plan_month(row.get("Month", "")), {}).update(fields)
+    return [line for line in lines[:first_year] if line.strip()], plan
+
+def render_year_plan(section_name, preamble, plan):
+    """Canonical text for a year plan (the layout the section prompt asks for)"""
+    fields = YEAR_PLAN_COLUMNS[section_name]
+    lines = list(preamble)
+    for year in PLAN_YEARS + [y for y in plan if y not in PLAN_YEARS]:
+        if year not in plan:
+            continue
+        lines += ["", f"{year}:"]
+        months = plan[year]
+        for month in sorted(months, key=_period_order):
+            lines.append(f"- Month: {month}")
+            values = months[month]
+            lines += [f" {field}: {values[field]}" for field in fields if values.get(field)]
+            lines += [f" {field}: {value}" for field, value in values.items() if field not in fields and value]
+            lines.append("")
+    return "\n".join(lines).strip()
+
+def parse_record_blocks(content, marker):
+    """Records as {'key', 'fields', 'start', 'end'} (line span [start, end) of the block)"""
+    lines = content.split("\n")
+    blocks = []
+    for i, line in enumerate(lines):
+        stripped = line.strip()
+        if stripped.startswith(marker):
+            if blocks:
+                blocks[-1]['end'] = i
+            blocks.append({'key': stripped[len(marker):].strip(), 'fields': {}, 'start': i, 'end': len(lines)})
+        elif blocks and ":" in stripped:
+            key, value = stripped.split(":", 1)
+            if value.strip():
+                blocks[-1]['fields'][key.strip().lstrip("-").strip()] = value.strip()
+    # A block ends at its last field line, so trailing prose stays where it is
+    for block in blocks:
+        end = block['start'] + 1
+        for i in range(block['start'] + 1, block['end']):
+            if ":" in lines[i]:
+                end = i + 1
+        block['end'] = end
+    return lines, blocks
+
+def find_section_gaps(section_name, content, inputs):
+    """
+    Structural gaps in a section, or None when the section has no schema:
+    {'kind', 'expected', 'gaps': [...]} where each gap names what is missing.
+    """
+    if section_name in YEAR_PLAN_COLUMNS:
+        fields = YEAR_PLAN_COLUMNS[section_name]
+        _, plan = parse_year_plan(content)
+        periods = plan_periods(inputs)
+        gaps = []
+        for year in PLAN_YEARS:
+            for month in periods:
+                values = plan.get(year, {}).get(month)
+                missing = [f for f in fields if not (values or {}).get(f)]
+                if missing:
+                    gaps.append({'year': year, 'month': month, 'fields': missing, 'whole': values is None})
+        return {'kind': 'year_plan', 'expected': len(PLAN_YEARS) * len(periods), 'gaps': gaps}
+    
+    schema = RECORD_SCHEMAS.get(section_name)
+    if schema is None:
+        return None
+    
+    _, blocks = parse_record_blocks(content, schema['marker'])
+    gaps = []
+    for index, block in enumerate(blocks):
+        missing = [f for f in schema['fields'] if not block['fields'].get(f)]
+        if missing:
+            gaps.append({'index': index, 'key': block['key'], 'fields': missing})
+    
+    required = schema.get('required')
+    if required == 'career_roles':
+        required = split_career_roles(inputs.get('career_roles', ''))
+    present = {normalize_role(block['key']) for block in blocks}
+    for key in required or []:
+        if normalize_role(key) not in present:
+            gaps.append({'key': key, 'record': True})
+    
+    shortfall = schema.get('min_records', 0) - len(blocks)
+    if shortfall > 0:
+        gaps.append({'more': shortfall, 'existing': [block['key'] for block in blocks]})
+    
+    expected = max(len(blocks), schema.get('min_records', 0), len(required or []), 1)
+    return {'kind': 'records', 'expected': expected, 'gaps': gaps}
+
+def describe_section_gaps(report):
+    """One-line summary for validation issues"""
+    gaps = report['gaps']
+    if report['kind'] == 'year_plan':
+        whole = sum(gap['whole'] for gap in gaps)
+        sample = ", ".join(f"{g['year']} {g['month']}" for g in gaps[:3])
+        return f"{whole} months missing, {len(gaps) - whole} incomplete (e.g. {sample})"
+    parts = []
+    incomplete = [g for g in gaps if 'fields' in g]
+    if incomplete:
+        parts.append(f"{len(incomplete)} incomplete records")
+    missing = [g['key'] for g in gaps if g.get('record')]
+    if missing:
+        parts.append(f"missing: {', '.join(missing)}")
+    for gap in gaps:
+        if 'more' in gap:
+            parts.append(f"{gap['more']} records short of the minimum")
+    return "; ".join(parts)
+
+def _repair_request_lines(section_name, report):
+    if report['kind'] == 'year_plan':
+        fields = ", ".join(YEAR_PLAN_COLUMNS[section_name])
+        lines = [f"Output complete month blocks (with ALL fields: {fields}) for ONLY these months, "
+                 f"each under its 'Year N:' header:"]
+        for year in PLAN_YEARS:
+            months = [g['month'] for g in report['gaps'] if g['year'] == year]
+            if months:
+                lines.append(f"{year}: {', '.join(months)}")
+        return lines
+    
+    schema = RECORD_SCHEMAS[section_name]
+    fields = ", ".join(schema['fields'])
+    lines = [f"Output ONLY the following records, each starting with '{schema['marker']}' and "
+             f"containing ALL fields ({fields}):"]
+    for gap in report['gaps']:
+        if 'fields' in gap:
+            lines.append(f"- Complete record '{gap['key']}' (record #{gap['index'] + 1}; it lacks {', '.join(gap['fields'])})")
+        elif gap.get('record'):
+            lines.append(f"- New record(s) for '{gap['key']}'")
+        else:
+            lines.append(f"- {gap['more']} new records, none of which repeat: {'; '.join(gap['existing'])}")
+    return lines
+
+def plan_section_repair(state, section_name):
+    """
+    Repair request for the previous attempt of this section, or None when the
+    retry should regenerate it (first attempt, no schema, or too much missing).
+    """
+    validation = state.get('validation_result') or {}
+    report = validation.get('gaps')
+    if (state['retry_count'] == 0 or state['current_section_name'] != section_name
+            or not report or not report['gaps']
+            or len(report['gaps']) > REPAIR_MAX_GAP_RATIO * report['expected']):
+        return None
+    
+    request = "\n".join(_repair_request_lines(section_name, report))
+    messages = build_section_messages(
+        f"{state['prompt_plan'][section_name]}\n\n"
+        f"REPAIR REQUEST: an earlier answer for this section is missing the pieces listed below.\n"
+        f"{request}\n"
+        f"Use exactly the output format specified above. Do not repeat the section heading, "
+        f"any other month or record, or add commentary."
+    )
+    return {
+        'report': report,
+        'messages': messages,
+        'max_tokens': min(SECTION_MAX_TOKENS, 300 + REPAIR_TOKENS_PER_GAP * len(report['gaps'])),
+    }
+
+def merge_section_repair(section_name, content, patch, report):
+    """Merges the repair answer into the previous section text"""
+    if report['kind'] == 'year_plan':
+        preamble, plan = parse_year_plan(content)
+        _, patch_plan = parse_year_plan(patch)
+        for year, months in patch_plan.items():
+            for month, values in months.items():
+                target = plan.setdefault(year, {}).setdefault(month, {})
+                for field, value in values.items():
+                    if not target.get(field):
+                        target[field] = value
+        return render_year_plan(section_name, preamble, plan)
+    
+    schema = RECORD_SCHEMAS[section_name]
+    lines, blocks = parse_record_blocks(content, schema['marker'])
+    patch_lines, patch_blocks = parse_record_blocks(patch, schema['marker'])
+    incomplete = [blocks[g['index']] for g in report['gaps'] if 'fields' in g]
+    
+    replacements, additions = [], []
+    for patch_block in patch_blocks:
+        block_lines = patch_lines[patch_block['start']:patch_block['end']]
+        match = next((b for b in incomplete if normalize_role(b['key']) == normalize_role(patch_block['key'])), None)
+        if match is not None:
+            incomplete.remove(match)
+            replacements.append((match, block_lines))
+        else:
+            additions += [""] + block_lines
+    
+    for block, block_lines in sorted(replacements, key=lambda r: r[0]['start'], reverse=True):
+        lines[block['start']:block['end']] = block_lines
+    insert_at = max((b['end'] for b in blocks), default=len(lines))
+    if replacements:
+        insert_at += sum(len(new) - (b['end'] - b['start']) for b, new in replacements if b['start'] < insert_at)
+    lines[insert_at:insert_at] = additions
+    return "\n".join(lines).strip()
+
+def store_repaired_section(state, section_name, repair, response, cache_key=None):
+    """Writes the merged section into the state; the merged text is what gets cached"""
+    patch = expand_compact_plan(section_name, response.choices[0].message.content.strip())
+    section_content = merge_section_repair(section_name, state['current_section_content'], patch, repair['report'])
+    
+    state['current_section_name'] = section_name
+    state['current_section_content'] = section_content
+    state['pending_cache_writes'] = [{'key': cache_key, 'section': section_name, 'content': section_content}] if cache_key else []
+    
+    agent_log(f"[GENERATOR AGENT] ✓ Patched {len(repair['report']['gaps'])} gaps "
+              f"({len(patch)} chars instead of a full regeneration)")
+
+# =============================================================================
+# COMPACT PLAN FORMAT
+# =============================================================================
+
+# Month-by-month sections are mostly repeated labels ("- Month: January",
+# "Technical Skills:", ...). The model writes one delimited row per month
+# instead ("Jan | ... | ..."), in column order, and the rows are expanded
+# locally into the "- Month:" blocks the validators and Word tables read.
+# Opt-in: it changes the output format the blueprints were written for.
+COMPACT_PLAN_ENABLED = os.getenv("COMPACT_PLAN_FORMAT", "0") == "1"
+COMPACT_FIELD_SEPARATOR = " | "
+
+_COMPACT_ROW = re.compile(r'^\s*(?:-\s*)?([A-Za-z]{3,9}\.?(?:\s*[-–]\s*[A-Za-z]{3,9}\.?)?)\s*\|(.*)$')
+
+def _compact_period(code):
+    """Row code -> plan period ("Jan" -> "January", "Jan-Mar" -> "January-March"), None for other lines"""
+    period = _plan_month(code)
+    return period if period.split("-")[0] in PLAN_MONTHS else None
+
+def _compact_code(period):
+    return "-".join(month[:3] for month in period.split("-"))
+
+def uses_compact_plan(section_name):
+    # Structured JSON output, when on, replaces the text layout altogether
+    return COMPACT_PLAN_ENABLED and not STRUCTURED_OUTPUT_ENABLED and section_name in YEAR_PLAN_COLUMNS
+
+# Blueprint rules about the labelled layout, which compact rows replace
+_COMPACT_DROPPED_RULE = re.compile(r'use only the labels|exact field names|indentation', re.I)
+_COMPACT_PIPE_RULE = re.compile(r'(,\s*)?\b(no|do not use)\s+pipes\b\s*\|?', re.I)
+
+def compact_blueprint(blueprint):
+    """Blueprint without the layout rules (no pipes, exact labels, indentation) that compact rows break"""
+    lines = []
+    for line in blueprint.split("\n"):
+        if _COMPACT_DROPPED_RULE.search(line):
+            continue
+        line = re.sub(r'\s*DO NOT change labels[^.]*\.', '', _COMPACT_PIPE_RULE.sub('', line))
+        if line.strip() and re.fullmatch(r'[-\s.]*', line):
+            continue
+        lines.append(line)
+    return "\n".join(lines)
+
+def compact_plan_instruction(section_name, periods=PLAN_MONTHS):
+    """Prompt text that swaps the month blocks of the blueprint for compact rows"""
+    columns = YEAR_PLAN_COLUMNS[section_name]
+    codes = [_compact_code(period) for period in periods]
+    unit = "month" if periods == PLAN_MONTHS else "period"
+    return (
+        "COMPACT OUTPUT FORMAT (replaces the '- Month:' block layout shown above; the content rules still apply):\n"
+        f"Under each 'Year N:' header write exactly one line per {unit}, with no field labels:\n"
+        f"{codes[0]}{COMPACT_FIELD_SEPARATOR}" + COMPACT_FIELD_SEPARATOR.join(f"<{c}>" for c in columns) + "\n"
+        f"Use the {'three-letter month' if unit == 'month' else 'period code'} ({', '.join(codes)}), "
+        "the fields in exactly this order, and never a '|' inside a value.\n"
+    )
+
+def expand_compact_plan(section_name, text):
+    """Compact month rows rewritten as "- Month:" blocks; every other line is kept as is"""
+    if not uses_compact_plan(section_name):
+        return text
+    columns = YEAR_PLAN_COLUMNS[section_name]
+    lines, rows = [], 0
+    for line in text.split("\n"):
+        match = _COMPACT_ROW.match(line)
+        month = _compact_period(match.group(1)) if match else None
+        if month is None:
+            lines.append(line)
+            continue
+        values = [value.strip() for value in match.group(2).split("|")]
+        # Stray extra separators belong to the last field rather than shifting columns
+        values = values[:len(columns) - 1] + [" / ".join(v for v in values[len(columns) - 1:] if v)]
+        lines.append(f"- Month: {month}")
+        lines += [f" {column}: {value}" for column, value in zip(columns, values) if value]
+        lines.append("")
+        rows += 1
+    if not rows:
+        return text
+    expanded = "\n".join(lines).strip()
+    agent_log(f"[GENERATOR AGENT] ✓ Expanded {rows} compact month rows: {len(text)} → {len(expanded)} chars "
+              f"(~{(len(expanded) - len(text)) // 4} output tokens saved)")
+    return expanded
+
+def encode_compact_plan(section_name, text):
+    """Inverse of expand_compact_plan (used to replay kept text to a continuation in the same format)"""
+    preamble, plan = parse_year_plan(text)
+    columns = YEAR_PLAN_COLUMNS[section_name]
+    lines = list(preamble)
+    for year, months in plan.items():
+        lines += ["", f"{year}:"]
+        for month, values in months.items():
+            lines.append(COMPACT_FIELD_SEPARATOR.join(
+                [_compact_code(month)] + [(values.get(c) or "").replace("|", "/") for c in columns]))
+    return "\n".join(lines).strip()
+
+# =============================================================================
+# TRUNCATION CONTINUATION
+# =============================================================================
+
+# A completion cut off by max_tokens is resumed from its last complete block
+# instead of being regenerated; the pieces are stitched into one section.
+SECTION_MAX_CONTINUATIONS = int(os.getenv("SECTION_MAX_CONTINUATIONS", "2"))
+
+def _block_marker(section_name):
+    if section_name in YEAR_PLAN_COLUMNS:
+        return "- Month:"
+    return RECORD_SCHEMAS.get(section_name, {}).get('marker')
+
+def trim_to_complete_block(section_name, text):
+    """Truncated text up to its last complete month/record (or line), the cut-off tail dropped"""
+    lines = text.rstrip().split("\n")
+    marker = _block_marker(section_name)
+    starts = [i for i, line in enumerate(lines) if marker and line.strip().startswith(marker)]
+    if starts:
+        lines = lines[:starts[-1]]
+        # A year header with no month under it is rewritten by the continuation
+        while lines and (not lines[-1].strip() or re.fullmatch(r'Year \d+:', lines[-1].strip())):
+            lines.pop()
+    elif len(lines) > 1:
+        lines = lines[:-1]
+    return "\n".join(lines).rstrip()
+
+def continuation_hint(section_name, kept, years=PLAN_YEARS, periods=PLAN_MONTHS):
+    """
+    Where the continuation has to pick up (years: the ones this completion was
+    asked for; none for a repair, whose months are not contiguous)
+    """
+    if section_name in YEAR_PLAN_COLUMNS:
+        _, plan = parse_year_plan(kept)
+        for year in years:
+            for month in periods:
+                if month not in plan.get(year, {}):
+                    return (f"Resume with the '- Month: {month}' block of {year} (write the '{year}:' header "
+                            f"first if {year} has not started yet) and continue in order through "
+                            f"{years[-1]} {periods[-1]}.")
+    marker = _block_marker(section_name)
+    if marker:
+        return f"Resume with the next '{marker}' record."
+    return "Resume exactly where the text stops."
+
+def build_continuation_messages(section_name, messages, kept, years=PLAN_YEARS, periods=PLAN_MONTHS):
+    replay = encode_compact_plan(section_name, kept) if uses_compact_plan(section_name) else kept
+    return messages + [
+        {"role": "assistant", "content": replay},
+        {"role": "user", "content": (
+            f"Your answer was cut off by the length limit. {continuation_hint(section_name, kept, years, periods)} "
+            f"Keep exactly the same format and do not repeat anything already written."
+        )},
+    ]
+
+def _stitched_response(content, response):
+    message = SimpleNamespace(content=content)
+    choice = SimpleNamespace(message=message, finish_reason=response.choices[0].finish_reason)
+    return SimpleNamespace(choices=[choice], usage=response.usage)
+
+def _truncated(response):
+    return response.choices[0].finish_reason == "length"
+
+def _start_continuation(state, section_name, text, attempt, streamed, part=None):
+    kept = trim_to_complete_block(section_name, expand_compact_plan(section_name, text))
+    agent_log(f"[GENERATOR AGENT] ⚠ Output truncated at {len(text)} chars - continuing from the last "
+              f"complete block ({attempt}/{SECTION_MAX_CONTINUATIONS})")
+    if streamed:
+        # Streaming clients drop the cut-off tail they already rendered
+        emit_progress(state, 'continuation', section=section_name, content=kept, **({'part': part} if part else {}))
+    return kept
+
+def continue_truncated_section(state, section_name, messages, response, on_delta=None, years=PLAN_YEARS, part=None):
+    """
+    Resumes a length-truncated completion; returns a response carrying the stitched text.
+    part is the streaming label of a year-split request.
+    """
+    text = response.choices[0].message.content
+    attempt = 0
+    while _truncated(response) and attempt < SECTION_MAX_CONTINUATIONS:
+        attempt += 1
+        kept = _start_continuation(state, section_name, text, attempt, on_delta is not None, part)
+        messages_next = build_continuation_messages(section_name, messages, kept, years, plan_periods(state['inputs']))
+        response = request_completion(messages_next, on_delta=on_delta)
+        text = f"{kept}\n{response.choices[0].message.content.strip()}"
+    return _stitched_response(text, response) if attempt else response
+
+async def continue_truncated_section_async(state, section_name, messages, response, on_delta=None, years=PLAN_YEARS, part=None):
+    """Async continue_truncated_section"""
+    text = response.choices[0].message.content
+    attempt = 0
+    while _truncated(response) and attempt < SECTION_MAX_CONTINUATIONS:
+        attempt += 1
+        kept = _start_continuation(state, section_name, text, attempt, on_delta is not None, part)
+        messages_next = build_continuation_messages(section_name, messages, kept, years, plan_periods(state['inputs']))
+        response = await request_completion_async(messages_next, on_delta=on_delta)
+        text = f"{kept}\n{response.choices[0].message.content.strip()}"
+    return _stitched_response(text, response) if attempt else response
+
+# =============================================================================
+# YEAR SPLIT GENERATION
+# =============================================================================
+
+# Year-plan sections are the longest completions of a report. They are written
+# as one request per year, run concurrently, against a fixed shared outline so
+# the months still progress from year to year.
+YEAR_SPLIT_ENABLED = os.getenv("YEAR_SPLIT_ENABLED", "1") == "1"
+YEAR_PART_MAX_TOKENS = int(os.getenv("YEAR_PART_MAX_TOKENS", "2500"))
+
+YEAR_PLAN_OUTLINE = {
+    "Year 1": "Foundation - close gaps in fundamentals, build routines and self-awareness, first exposure",
+    "Year 2": "Strengthening - apply and deepen Year 1 skills, take on responsibility, projects and harder practice",
+    "Year 3": "Mastery and readiness - specialise, lead, and prepare for the next academic or career step",
+}
+
+def uses_year_split(state, section_name):
+    return YEAR_SPLIT_ENABLED and section_name in YEAR_PLAN_COLUMNS
+
+def build_year_part_prompt(section_prompt, year, periods=PLAN_MONTHS):
+    """Section prompt narrowed to one year of the plan"""
+    outline = "\n".join(f"- {y}: {focus}" for y, focus in YEAR_PLAN_OUTLINE.items())
+    if periods == PLAN_MONTHS:
+        rows, unit = "all 12 months (January to December)", "Months"
+    else:
+        rows, unit = f"all {len(periods)} periods ({', '.join(periods)})", "Periods"
+    return (
+        f"{section_prompt}\n"
+        "YEAR SPLIT: this section is written one year at a time, following this shared 3-year outline:\n"
+        f"{outline}\n\n"
+        f"Write ONLY the '{year}:' block: the '{year}:' header followed by {rows} "
+        "in the exact month structure above.\n"
+        f"{unit} must progress through the {year} focus and build on the years before it.\n"
+        "Do NOT write the section heading, any other year, or closing notes.\n"
+    )
+
+def _plan_year_parts(section_name, section_prompt, periods=PLAN_MONTHS):
+    return [
+        {'year': year, 'messages': build_section_messages(build_year_part_prompt(section_prompt, year, periods))}
+        for year in PLAN_YEARS
+    ]
+
+def _clean_year_part(section_name, year, content):
+    """Drops a repeated section heading and makes sure the part opens its year block"""
+    content = expand_compact_plan(section_name, content.strip())
+    lines = [line for line in content.split('\n') if line.strip() != section_name]
+    if not any(line.strip() == f"{year}:" for line in lines):
+        lines.insert(0, f"{year}:")
+    return '\n'.join(lines).strip()
+
+def _store_year_parts(state, section_name, parts, cache_key, started):
+    section_content = f"{section_name}\n\n" + "\n\n".join(p['content'] for p in parts)
+
+    state['current_section_name'] = section_name
+    state['current_section_content'] = section_content
+    state['pending_cache_writes'] = [{'key': cache_key, 'section': section_name, 'content': section_content}] if cache_key else []
+
+    agent_log(f"[GENERATOR AGENT] ✓ Merged {len(parts)} year parts in {time.perf_counter() - started:.1f}s "
+              f"({len(section_content)} chars)")
+
+def generate_year_split_section(state, section_name, cache_key=None):
+    """Generates a year-plan section as concurrent per-year requests and merges them"""
+    started = time.perf_counter()
+    periods = plan_periods(state['inputs'])
+    parts = _plan_year_parts(section_name, state['prompt_plan'][section_name], periods)
+
+    def generate(part):
+        response = request_structured_completion(part['messages'], [section_name], YEAR_PART_MAX_TOKENS, periods)
+        if response is None:
+            on_delta = section_delta_listener(state, section_name, part['year'])
+            response = request_completion(part['messages'], YEAR_PART_MAX_TOKENS, on_delta=on_delta)
+            response = continue_truncated_section(state, section_name, part['messages'], response, on_delta,
+                                                  years=[part['year']], part=part['year'])
+        return _clean_year_part(section_name, part['year'], response.choices[0].message.content)
+
+    with section_part_workers(state, len(parts)) as workers, ThreadPoolExecutor(max_workers=workers) as pool:
+        for part, content in zip(parts, pool.map(in_current_context(generate), parts)):
+            part['content'] = content
+
+    _store_year_parts(state, section_name, parts, cache_key, started)
+
+async def generate_year_split_section_async(state, section_name, cache_key=None):
+    """Async variant of generate_year_split_section"""
+    started = time.perf_counter()
+    periods = plan_periods(state['inputs'])
+    parts = _plan_year_parts(section_name, state['prompt_plan'][section_name], periods)
+
+    async def generate(part):
+        response = await request_structured_completion_async(part['messages'], [section_name], YEAR_PART_MAX_TOKENS, periods)
+        if response is None:
+            on_delta = section_delta_listener(state, section_name, part['year'])
+            response = await request_completion_async(part['messages'], YEAR_PART_MAX_TOKENS, on_delta=on_delta)
+            response = await continue_truncated_section_async(state, section_name, part['messages'], response, on_delta,
+                                                              years=[part['year']], part=part['year'])
+        return _clean_year_part(section_name, part['year'], response.choices[0].message.content)
+
+    with section_part_workers(state, len(parts)) as workers:
+        semaphore = asyncio.Semaphore(workers)
+
+        async def generate_limited(part):
+            async with semaphore:
+                return await generate(part)
+
+        for part, content in zip(parts, await asyncio.gather(*[generate_limited(part) for part in parts])):
+            part['content'] = content
+
+    _store_year_parts(state, section_name, parts, cache_key, started)
+
+# =============================================================================
+# SECTION BATCHING
+# =============================================================================
+
+# Short sections spend more input tokens on the shared base prompt than they
+# produce. Compatible ones are requested in one completion, separated by
+# delimiter lines, and split back so each is still validated on its own.
+SECTION_BATCHING_ENABLED = os.getenv("SECTION_BATCHING_ENABLED", "1") == "1"
+SECTION_BATCH_MAX_TOKENS = SECTION_MAX_TOKENS
+
+SECTION_BATCHES = {
+    "development": [["6. Suggested Reading", "7. Health Discipline"]],
+}
+SECTION_BATCH_DELIMITER = "=== SECTION: {section} ==="
+
+def section_batch_group(report_type, section_name):
+    """The batch a section belongs to, or None"""
+    return next((group for group in SECTION_BATCHES.get(report_type, []) if section_name in group), None)
+
+def plan_section_batch(state, section_name):
+    """
+    Sections to request together with this one (this one first), or None.
+    Only the first pending member of a group starts a batch, and members that
+    are already generated, cached or waiting in batched_sections are left out.
+    """
+    group = section_batch_group(state['report_type'], section_name)
+    if not SECTION_BATCHING_ENABLED or not group or state['retry_count'] > 0:
+        return None
+    
+    done = {s['name'] for s in state['generated_sections']} | set(state.get('batched_sections') or {})
+    members = [section_name]
+    for member in group:
+        if member == section_name or member in done or member not in state['sections_to_generate']:
+            continue
+        if state['sections_to_generate'].index(member) < state['sections_to_generate'].index(section_name):
+            continue
+        if not is_section_cached(state, member, build_section_messages(state['prompt_plan'][member])):
+            members.append(member)
+    return members if len(members) > 1 else None
+
+def build_batch_prompt(student_profile, sections, variants=None):
+    """One prompt for several sections: shared rules, each blueprint under its delimiter, then the profile"""
+    variants = variants or {}
+    parts = [prompt_templates.current().rules, f"WRITE THE FOLLOWING {len(sections)} SECTIONS IN ONE ANSWER.\n"]
+    for section in sections:
+        parts.append(
+            f"{SECTION_BATCH_DELIMITER.format(section=section)}\n"
+            f"{prompt_templates.blueprint(section, variants.get(section))}\n"
+        )
+    parts.append(
+        "OUTPUT RULES FOR THIS ANSWER:\n"
+        "- Start every section with its delimiter line exactly as shown above, on its own line.\n"
+        "- The line after the delimiter must be the exact section heading.\n"
+        "- Write the sections in the order given, each complete, and nothing outside them.\n"
+    )
+    parts.append(student_profile)
+    return "\n".join(parts)
+
+def split_batch_response(text, sections):
+    """{section: content} for every section whose delimiter appears in the answer"""
+    pattern = "|".join(re.escape(SECTION_BATCH_DELIMITER.format(section=s)) for s in sections)
+    pieces = re.split(rf"^\s*({pattern})\s*$", text, flags=re.M)
+    
+    contents = {}
+    for delimiter, body in zip(pieces[1::2], pieces[2::2]):
+        section = next(s for s in sections if SECTION_BATCH_DELIMITER.format(section=s) == delimiter.strip())
+        body = body.strip()
+        if not body:
+            continue
+        if body.split("\n", 1)[0].strip() != section:
+            body = f"{section}\n{body}"
+        contents[section] = body
+    return contents
+
+class BatchDeltaRouter:
+    """
+    Token callback for a batched completion: each line goes to the section
+    whose delimiter came before it, so the sections stream into their own
+    places. Deltas are forwarded a line at a time; flush() sends the last one.
+    """
+
+    def __init__(self, state, sections):
+        self.state = state
+        self.delimiters = {SECTION_BATCH_DELIMITER.format(section=section): section for section in sections}
+        self.section = None
+        self.pending = ""
+
+    def __call__(self, delta):
+        raise_if_cancelled(self.state)
+        self.pending += delta
+        while "\n" in self.pending:
+            line, self.pending = self.pending.split("\n", 1)
+            self._route(line + "\n")
+
+    def _route(self, text):
+        section = self.delimiters.get(text.strip())
+        if section is not None:
+            self.section = section
+        elif self.section is not None:
+            emit_progress(self.state, 'token', section=self.section, delta=text)
+
+    def flush(self):
+        if self.pending:
+            self._route(self.pending)
+            self.pending = ""
+
+def batch_delta_listener(state, sections):
+    """BatchDeltaRouter for streaming runs, None when nobody is listening"""
+    return BatchDeltaRouter(state, sections) if has_progress_listener(state) else None
+
+def _request_batch_completion(state, sections, messages):
+    """Free-text batch completion, streamed section by section when a client listens"""
+    router = batch_delta_listener(state, sections)
+    response = request_completion(messages, SECTION_BATCH_MAX_TOKENS, on_delta=router)
+    if router:
+        router.flush()
+    return response
+
+async def _request_batch_completion_async(state, sections, messages):
+    router = batch_delta_listener(state, sections)
+    response = await request_completion_async(messages, SECTION_BATCH_MAX_TOKENS, on_delta=router)
+    if router:
+        router.flush()
+    return response
+
+def _store_section_batch(state, sections, response, cache_key):
+    """Stores the leader and parks its completed siblings; False when the answer has no complete leader part"""
+    contents = split_batch_response(response.choices[0].message.content, sections)
+    if response.choices[0].finish_reason == "length" and contents:
+        # The last section in the answer was cut off; it is generated on its own later
+        contents.pop(list(contents)[-1])
+    
+    leader = sections[0]
+    state['batched_sections'] = {**(state.get('batched_sections') or {}),
+                                 **{s: c for s, c in contents.items() if s != leader}}
+    if leader not in contents:
+        agent_log(f"[GENERATOR AGENT] ⚠ Batched answer has no complete '{leader}' part - keeping "
+                  f"{len(contents)} completed sibling(s) and generating it on its own")
+        return False
+    
+    store_generated_section(state, leader, _stitched_response(contents[leader], response), cache_key)
+    agent_log(f"[GENERATOR AGENT] ✓ Batched {len(contents)}/{len(sections)} sections in one completion: {', '.join(contents)}")
+    return True
+
+def generate_section_batch(state, sections, cache_key=None):
+    """Generates several short sections in one completion; the first is stored now, the rest wait in batched_sections"""
+    messages = build_section_messages(build_batch_prompt(build_student_profile(state['inputs']), sections,
+                                                         state.get('prompt_variants')))
+    response = (request_structured_completion(messages, sections, SECTION_BATCH_MAX_TOKENS)
+                or _request_batch_completion(state, sections, messages))
+    if not _store_section_batch(state, sections, response, cache_key):
+        generate_single_section(state, sections[0], build_section_messages(state['prompt_plan'][sections[0]]), cache_key)
+
+async def generate_section_batch_async(state, sections, cache_key=None):
+    """Async variant of generate_section_batch"""
+    messages = build_section_messages(build_batch_prompt(build_student_profile(state['inputs']), sections,
+                                                         state.get('prompt_variants')))
+    response = (await request_structured_completion_async(messages, sections, SECTION_BATCH_MAX_TOKENS)
+                or await _request_batch_completion_async(state, sections, messages))
+    if not _store_section_batch(state, sections, response, cache_key):
+        await generate_single_section_async(state, sections[0], build_section_messages(state['prompt_plan'][sections[0]]),
+                                            cache_key)
+
+def take_batched_section(state, section_name, cache_key=None):
+    """Stores content produced earlier by a batch; False when there is none (or this is a retry)"""
+    batched = state.get('batched_sections') or {}
+    if state['retry_count'] > 0 or section_name not in batched:
+        return False
+    
+    section_content = batched.pop(section_name)
+    state['current_section_name'] = section_name
+    state['current_section_content'] = section_content
+    state['pending_cache_writes'] = [{'key': cache_key, 'section': section_name, 'content': section_content}] if cache_key else []
+    
+    agent_log(f"[GENERATOR AGENT] ✓ Taken from batched completion ({len(section_content)} chars)")
+    return True
+
+# =============================================================================
+# STRUCTURED OUTPUT
+# =============================================================================
+
+# Sections with a table schema can be requested as schema-constrained JSON
+# (OpenAI structured outputs). The answer is checked against the schema and
+# rendered into the canonical text layout the create_*_table parsers read, so
+# cache, streaming events, validation and the Word export stay unchanged.
+# JSON that is cut off or does not match falls back to a free-text request.
+# JSON spends more tokens than the text layout (quotes, braces, a key per
+# value), so a structured request gets STRUCTURED_OUTPUT_TOKEN_FACTOR times the
+# text budget. A request whose scaled budget would exceed
+# STRUCTURED_OUTPUT_MAX_TOKENS (the model's output cap) is sent as free text
+# straight away rather than risking a truncated answer plus a second call.
+STRUCTURED_OUTPUT_ENABLED = os.getenv("STRUCTURED_OUTPUT_ENABLED", "0") == "1"
+STRUCTURED_OUTPUT_TOKEN_FACTOR = float(os.getenv("STRUCTURED_OUTPUT_TOKEN_FACTOR", "2"))
+STRUCTURED_OUTPUT_MAX_TOKENS = int(os.getenv("STRUCTURED_OUTPUT_MAX_TOKENS", "16000"))
+
+STRUCTURED_OUTPUT_INSTRUCTION = (
+    "OUTPUT AS JSON: answer with one JSON object matching the response schema instead of the text layout "
+    "described above. Follow every content rule above; write each value as plain text without its field label, "
+    "bullets, asterisks or pipes."
+)
+
+TREND_COLUMNS = ["Past Trend (Previous 3 Years)", "Present Trend (Current Year)", "Future Prediction (Next 3 Years)"]
+INTERNSHIP_COLUMNS = ["Internship Type", "Industries", "Expected Outcomes"]
+INTERNSHIP_SCALES = ["Small", "Medium", "Large"]
+
+class StructuredOutputError(ValueError):
+    """A JSON answer that cannot be rendered: cut off, malformed or off-schema"""
+
+def json_field_key(label):
+    """Schema property for a field label: "Physical & Mental Skills Developed" -> "physical_mental_skills_developed" """
+    return re.sub(r'[^a-z0-9]+', '_', label.lower()).strip('_')
+
+def _json_string(enum=None):
+    return {"type": "string", "enum": list(enum)} if enum else {"type": "string"}
+
+def _json_array(items):
+    return {"type": "array", "items": items}
+
+def _json_object(properties):
+    # Strict structured outputs require every property and no extras
+    return {"type": "object", "properties": properties, "required": list(properties), "additionalProperties": False}
+
+def section_json_schema(section_name, periods=PLAN_MONTHS):
+    """JSON schema of a section's answer, or None when the section is free text only"""
+    if section_name in YEAR_PLAN_COLUMNS:
+        month = _json_object({"month": _json_string(periods),
+                              **{json_field_key(f): _json_string() for f in YEAR_PLAN_COLUMNS[section_name]}})
+        year = _json_object({"year": _json_string(PLAN_YEARS), "months": _json_array(month)})
+        return _json_object({"years": _json_array(year)})
+    
+    if section_name in RECORD_SCHEMAS:
+        schema = RECORD_SCHEMAS[section_name]
+        required = schema.get('required')
+        fields = schema['fields'] + schema.get('optional_fields', [])
+        record = _json_object({json_field_key(schema['marker']): _json_string(required if isinstance(required, list) else None),
+                               **{json_field_key(f): _json_string() for f in fields}})
+        return _json_object({"records": _json_array(record)})
+    
+    if section_name == "3. Emerging Trends and Future Job Prospects":
+        row = _json_object({"aspect": _json_string(), **{json_field_key(c): _json_string() for c in TREND_COLUMNS}})
+        return _json_object({"roles": _json_array(_json_object({"role": _json_string(), "rows": _json_array(row)}))})
+    
+    if section_name == "4. Recommended Internships":
+        internship = _json_object({"internship_type": _json_string(),
+                                   **{json_field_key(s): _json_string() for s in INTERNSHIP_SCALES},
+                                   "expected_outcomes": _json_string()})
+        role = _json_object({"role": _json_string(), "internships": _json_array(internship)})
+        return _json_object({"roles": _json_array(role), "application_pipeline": _json_array(_json_string())})
+    
+    return None
+
+def section_response_format(sections, periods=PLAN_MONTHS):
+    """
+    response_format for a request covering these sections (one property per
+    section for a batch), or None when structured output is off or any section has no schema.
+    """
+    if not STRUCTURED_OUTPUT_ENABLED:
+        return None
+    schemas = {section: section_json_schema(section, periods) for section in sections}
+    if not all(schemas.values()):
+        return None
+    if len(sections) == 1:
+        schema = schemas[sections[0]]
+    else:
+        schema = _json_object({prompt_template_slug(section): schemas[section] for section in sections})
+    name = "_".join(prompt_template_slug(section) for section in sections)[:64]
+    return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}
+
+def check_json_schema(schema, value, path="$"):
+    """Raises StructuredOutputError where value departs from the (strict-mode subset) schema"""
+    kind = schema["type"]
+    if kind == "object":
+        if not isinstance(value, dict):
+            raise StructuredOutputError(f"{path}: expected an object")
+        missing = [key for key in schema["required"] if key not in value]
+        if missing:
+            raise StructuredOutputError(f"{path}: missing {', '.join(missing)}")
+        for key, sub_schema in schema["properties"].items():
+            check_json_schema(sub_schema, value[key], f"{path}.{key}")
+    elif kind == "array":
+        if not isinstance(value, list):
+            raise StructuredOutputError(f"{path}: expected an array")
+        for idx, item in enumerate(value):
+            check_json_schema(schema["items"], item, f"{path}[{idx}]")
+    elif not isinstance(value, str):
+        raise StructuredOutputError(f"{path}: expected a string")
+    elif "enum" in schema and value not in schema["enum"]:
+        raise StructuredOutputError(f"{path}: '{value}' is not one of {schema['enum']}")
+
+def _plain(value):
+    """One table cell / field value: single line, no pipes"""
+    return " ".join(value.replace("|", "/").split())
+
+def render_structured_section(section_name, data):
+    """Canonical section text for a schema-checked JSON answer"""
+    if section_name in YEAR_PLAN_COLUMNS:
+        plan = {}
+        for year in data["years"]:
+            months = plan.setdefault(year["year"], {})
+            for month in year["months"]:
+                months[month["month"]] = {f: _plain(month[json_field_key(f)]) for f in YEAR_PLAN_COLUMNS[section_name]}
+        return render_year_plan(section_name, [section_name], plan)
+    
+    lines = [section_name, ""]
+    if section_name in RECORD_SCHEMAS:
+        schema = RECORD_SCHEMAS[section_name]
+        indent = "  " if schema['marker'].startswith("- ") else ""
+        for record in data["records"]:
+            lines.append(f"{schema['marker']} {_plain(record[json_field_key(schema['marker'])])}")
+            lines += [f"{indent}{f}: {_plain(record[json_field_key(f)])}"
+                      for f in schema['fields'] + schema.get('optional_fields', []) if record[json_field_key(f)].strip()]
+            lines.append("")
+    elif section_name == "3. Emerging Trends and Future Job Prospects":
+        for role in data["roles"]:
+            lines += [_plain(role["role"]), "| Aspect | " + " | ".join(TREND_COLUMNS) + " |",
+                      "|---" * (len(TREND_COLUMNS) + 1) + "|"]
+            lines += ["| " + " | ".join(_plain(row[k]) for k in ["aspect"] + [json_field_key(c) for c in TREND_COLUMNS]) + " |"
+                      for row in role["rows"]]
+            lines.append("")
+    elif section_name == "4. Recommended Internships":
+        for role in data["roles"]:
+            lines += [f"For {_plain(role['role'])}:", "| " + " | ".join(INTERNSHIP_COLUMNS) + " |",
+                      "|---" * len(INTERNSHIP_COLUMNS) + "|"]
+            for internship in role["internships"]:
+                industries = " ".join(f"{scale}: {_plain(internship[json_field_key(scale)])}" for scale in INTERNSHIP_SCALES)
+                lines.append(f"| {_plain(internship['internship_type'])} | {industries} | {_plain(internship['expected_outcomes'])} |")
+            lines.append("")
+        if data["application_pipeline"]:
+            lines += ["Application Pipeline Advice:"] + [f"- {_plain(item)}" for item in data["application_pipeline"]]
+    return "\n".join(lines).strip()
+
+def render_structured_answer(sections, response, periods=PLAN_MONTHS):
+    """
+    Rendered text of a structured answer: the section text, or for a batch the
+    sections under their delimiters (the layout split_batch_response reads).
+    """
+    if response.choices[0].finish_reason == "length":
+        raise StructuredOutputError("JSON answer was cut off by max_tokens")
+    try:
+        data = json.loads(response.choices[0].message.content or "")
+    except json.JSONDecodeError as e:
+        raise StructuredOutputError(f"invalid JSON: {e}")
+    
+    format_schema = section_response_format(sections, periods)["json_schema"]["schema"]
+    check_json_schema(format_schema, data)
+    if len(sections) == 1:
+        return render_structured_section(sections[0], data)
+    return "\n\n".join(
+        f"{SECTION_BATCH_DELIMITER.format(section=section)}\n"
+        f"{render_structured_section(section, data[prompt_template_slug(section)])}"
+        for section in sections
+    )
+
+def _structured_messages(messages):
+    return messages[:-1] + [{**messages[-1], "content": f"{messages[-1]['content']}\n{STRUCTURED_OUTPUT_INSTRUCTION}\n"}]
+
+def _rendered_response(sections, response, started, periods=PLAN_MONTHS):
+    try:
+        text = render_structured_answer(sections, response, periods)
+    except StructuredOutputError as e:
+        agent_log(f"[GENERATOR AGENT] ⚠ Structured answer for {', '.join(sections)} unusable ({e}) - falling back to free text")
+        return None
+    agent_log(f"[GENERATOR AGENT] ✓ Structured answer checked and rendered in {(time.perf_counter() - started) * 1e6:.0f} µs")
+    return _stitched_response(text, response)
+
+def structured_max_tokens(sections, max_tokens):
+    """
+    Completion budget for a JSON answer that would take max_tokens as text, or
+    None when it does not fit under STRUCTURED_OUTPUT_MAX_TOKENS.
+    """
+    json_tokens = int(max_tokens * STRUCTURED_OUTPUT_TOKEN_FACTOR)
+    if json_tokens > STRUCTURED_OUTPUT_MAX_TOKENS:
+        agent_log(f"[GENERATOR AGENT] ⚠ JSON for {', '.join(sections)} needs ~{json_tokens} tokens "
+                  f"(cap {STRUCTURED_OUTPUT_MAX_TOKENS}) - requesting free text")
+        return None
+    return json_tokens
+
+def request_structured_completion(messages, sections, max_tokens=SECTION_MAX_TOKENS, periods=PLAN_MONTHS):
+    """
+    Completion for these sections as schema-constrained JSON, returned as a
+    response whose content is the rendered text. None when the sections have no
+    schema (or the mode is off), the JSON would not fit the output cap or the
+    answer is unusable: the caller then requests free text.
+    max_tokens is the free-text budget; periods are the plan row labels of a month-by-month section.
+    """
+    response_format = section_response_format(sections, periods)
+    if response_format is None:
+        return None
+    json_tokens = structured_max_tokens(sections, max_tokens)
+    if json_tokens is None:
+        return None
+    response = request_completion(_structured_messages(messages), json_tokens, response_format=response_format)
+    return _rendered_response(sections, response, time.perf_counter(), periods)
+
+async def request_structured_completion_async(messages, sections, max_tokens=SECTION_MAX_TOKENS, periods=PLAN_MONTHS):
+    """Async variant of request_structured_completion"""
+    response_format = section_response_format(sections, periods)
+    if response_format is None:
+        return None
+    json_tokens = structured_max_tokens(sections, max_tokens)
+    if json_tokens is None:
+        return None
+    response = await request_completion_async(_structured_messages(messages), json_tokens, response_format=response_format)
+    return _rendered_response(sections, response, time.perf_counter(), periods)
+
 # =============================================================================
 # WORKFLOW CONTROL NODES
 # =============================================================================
 
-def should_retry_section(state: ReportState) -> str:
-    """Decision node: Determine if section needs regeneration"""
+# Per-section retry cap and per-report retry budget (shared by all sections,
+# including parallel workers, so a bad run cannot multiply its token spend)
+SECTION_MAX_RETRIES = 2
+REPORT_RETRY_BUDGET = int(os.getenv("REPORT_RETRY_BUDGET", "6"))
+
+_retry_budgets = {}  # run_id -> retries left for that report
+_retry_budgets_lock = threading.Lock()
+
+def open_retry_budget(run_id):
+    with _retry_budgets_lock:
+        _retry_budgets[run_id] = REPORT_RETRY_BUDGET
+
+def close_retry_budget(run_id):
+    with _retry_budgets_lock:
+        _retry_budgets.pop(run_id, None)
+
+def take_retry_budget(run_id):
+    """Spends one retry from the report's budget; False once it is used up"""
+    with _retry_budgets_lock:
+        remaining = _retry_budgets.get(run_id)
+        if remaining is None:
+            return True  # run without a budget (e.g. a workflow invoked directly): per-section cap only
+        if remaining <= 0:
+            return False
+        _retry_budgets[run_id] = remaining - 1
+        return True
+
+def retry_controller(state: ReportState) -> ReportState:
+    """
+    Retry Controller: Decides whether the section is regenerated and records
+    the decision and retry counters in state. Routers run on a read-only view
+    of the state, so this bookkeeping has to live in a node.
+    """
     validation = state['validation_result']
-    max_retries = 2
     
-    if validation['requires_retry'] and state['retry_count'] < max_retries:
-        state['retry_count'] += 1
-        print(f"[DECISION NODE] Retry triggered (Attempt {state['retry_count']}/{max_retries})\n")
-        return "retry"
+    if not validation['requires_retry']:
+        state['retry_decision'] = "accept"
+        agent_log("[DECISION NODE] Section accepted\n")
+    elif state['retry_count'] >= SECTION_MAX_RETRIES:
+        state['retry_decision'] = "accept"
+        agent_log("[DECISION NODE] ⚠ Max retries reached - accepting current version\n")
+    elif not take_retry_budget(state['run_id']):
+        state['retry_decision'] = "accept"
+        agent_log(f"[DECISION NODE] ⚠ Report retry budget ({REPORT_RETRY_BUDGET}) used up - accepting current version\n")
     else:
-        if state['retry_count'] >= max_retries and not validation['is_valid']:
-            print(f"[DECISION NODE] ⚠ Max retries reached - accepting current version\n")
-        else:
-            print(f"[DECISION NODE] Section accepted\n")
-        return "accept"
+        state['retry_count'] += 1
+        state['retries_used'] += 1
+        state['retry_decision'] = "retry"
+        agent_log(f"[DECISION NODE] Retry triggered (Attempt {state['retry_count']}/{SECTION_MAX_RETRIES})\n")
+        emit_progress(state, 'retry', section=state['current_section_name'],
+                      attempt=state['retry_count'], max_retries=SECTION_MAX_RETRIES)
+    
+    return state
+
+def should_retry_section(state: ReportState) -> str:
+    """Decision node: Routes on the decision retry_controller recorded"""
+    return state['retry_decision']
+
+def commit_section_cache(state: ReportState):
+    """Writes freshly generated content to the response cache once it passed validation"""
+    writes = state.get('pending_cache_writes') or []
+    state['pending_cache_writes'] = []
+    
+    if not LLM_CACHE_ENABLED or not writes or not state['validation_result'].get('is_valid'):
+        return
+    
+    for entry in writes:
+        llm_response_cache.set(entry['key'], entry['content'], entry['section'], prompt_templates.version, entry.get('ttl'))
+    agent_log(f"[WORKFLOW] ✓ Cached {len(writes)} validated response(s) for {state['current_section_name']}")
+
+def emit_section_saved(state: ReportState):
+    """Streams a finished section so the UI can render it before the report completes"""
+    name = state['current_section_name']
+    emit_progress(state, 'section_saved', section=name,
+                  index=state['sections_to_generate'].index(name) if name in state['sections_to_generate'] else -1,
+                  content=state['current_section_content'])
 
 def save_section_and_continue(state: ReportState) -> ReportState:
     """Saves validated section and prepares for next section"""
+    commit_section_cache(state)
+    record_variant_section(state)
+    
     # ✅ CRITICAL FIX: Check if section already exists before appending
     section_already_exists = any(
         s['name'] == state['current_section_name'] 
@@ -342,11 +2730,12 @@ def save_section_and_continue(state: ReportState) -> ReportState:
             'name': state['current_section_name'],
             'content': state['current_section_content']
         })
-        print(f"[WORKFLOW] ✓ Section stored: {state['current_section_name']}")
+        agent_log(f"[WORKFLOW] ✓ Section stored: {state['current_section_name']}")
+        emit_section_saved(state)
     else:
-        print(f"[WORKFLOW] ⚠ Section '{state['current_section_name']}' already exists, skipping duplicate")
+        agent_log(f"[WORKFLOW] ⚠ Section '{state['current_section_name']}' already exists, skipping duplicate")
     
-    print(f"[WORKFLOW] Progress: {len(state['generated_sections'])}/{len(state['sections_to_generate'])} sections saved\n")
+    agent_log(f"[WORKFLOW] Progress: {len(state['generated_sections'])}/{len(state['sections_to_generate'])} sections saved\n")
     
     # Move to next section
     state['current_section_index'] = state['current_section_index'] + 1
@@ -358,53 +2747,452 @@ def has_more_sections(state: ReportState) -> str:
     """Decision node: Check if workflow should continue or finalize"""
     # ✅ SAFETY CHECK: Use generated_sections count as source of truth
     if len(state['generated_sections']) >= len(state['sections_to_generate']):
-        print(f"[WORKFLOW] ✓ All {len(state['sections_to_generate'])} sections complete\n")
+        agent_log(f"[WORKFLOW] ✓ All {len(state['sections_to_generate'])} sections complete\n")
         return "finalize"
     
     if state['current_section_index'] < len(state['sections_to_generate']):
         next_section = state['sections_to_generate'][state['current_section_index']]
-        print(f"[WORKFLOW] → Moving to next section: {next_section}\n")
+        agent_log(f"[WORKFLOW] → Moving to next section: {next_section}\n")
         return "continue"
     else:
-        print(f"[WORKFLOW] → All sections completed, finalizing report\n")
+        agent_log("[WORKFLOW] → All sections completed, finalizing report\n")
         return "finalize"
 
 def finalize_report(state: ReportState) -> ReportState:
     """Final assembly: Combines all generated sections into complete report"""
-    print(f"{'='*70}")
-    print(f"[FINALIZER AGENT] Assembling final report")
-    print(f"{'='*70}\n")
+    agent_log(f"{'='*70}")
+    agent_log("[FINALIZER AGENT] Assembling final report")
+    agent_log(f"{'='*70}\n")
     
     all_content = []
     for idx, section in enumerate(state['generated_sections'], 1):
         all_content.append(section['content'])
-        print(f"  ✓ Section {idx}: {section['name']}")
+        agent_log(f"  ✓ Section {idx}: {section['name']}")
     
     state['final_report'] = "\n\n".join(all_content)
     
-    print(f"\n[FINALIZER] ✓ Report assembly complete")
-    print(f"[FINALIZER] Total length: {len(state['final_report'])} characters")
-    print(f"[FINALIZER] Total sections: {len(state['generated_sections'])}")
-    print(f"\n{'='*70}")
-    print(f"[MULTI-AGENT WORKFLOW] Successfully Completed")
-    print(f"{'='*70}\n")
+    agent_log("\n[FINALIZER] ✓ Report assembly complete")
+    agent_log(f"[FINALIZER] Total length: {len(state['final_report'])} characters")
+    agent_log(f"[FINALIZER] Total sections: {len(state['generated_sections'])}")
+    agent_log(f"\n{'='*70}")
+    agent_log("[MULTI-AGENT WORKFLOW] Successfully Completed")
+    agent_log(f"{'='*70}\n")
     
     return state
 
-# =============================================================================
-# LANGGRAPH WORKFLOW BUILDER
-# =============================================================================
+# =============================================================================
+# SECTION SCHEDULER
+# =============================================================================
+
+# Parallel runs dispatch sections longest-first, so the 36-month plans start
+# before the short lists and the concurrency cap stays busy until the end.
+# Predictions come from per-heading moving averages of past worker runs.
+SCHEDULER_DB = os.getenv("SCHEDULER_DB", os.path.join("cache", "section_history.sqlite3"))
+SCHEDULER_HISTORY_WEIGHT = float(os.getenv("SCHEDULER_HISTORY_WEIGHT", "0.3"))
+SCHEDULER_TOKENS_PER_SECOND = float(os.getenv("SCHEDULER_TOKENS_PER_SECOND", "50"))
+
+def prior_output_tokens(section_name):
+    """Output size assumed for a heading with no history yet"""
+    if section_name in YEAR_PLAN_COLUMNS:
+        return 4500
+    if section_name in RECORD_SCHEMAS:
+        return 1500
+    return 800
+
+class SectionHistory:
+    """Moving averages of output tokens and worker seconds per (report type, heading) in SQLite"""
+
+    def __init__(self, db_path, weight):
+        self.db_path = db_path
+        self.weight = weight
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS section_history ("
+                " report_type TEXT, section TEXT, samples INTEGER, output_tokens REAL, seconds REAL,"
+                " updated_at REAL, PRIMARY KEY (report_type, section))"
+            )
+            conn.commit()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def estimates(self, report_type, sections):
+        """{section: {'tokens', 'seconds', 'samples'}}, falling back to priors without history"""
+        rows = {
+            row['section']: row for row in self._connection().execute(
+                "SELECT section, samples, output_tokens, seconds FROM section_history WHERE report_type = ?",
+                (report_type,))
+        }
+        estimates = {}
+        for section in sections:
+            row = rows.get(section)
+            if row:
+                estimates[section] = {'tokens': row['output_tokens'], 'seconds': row['seconds'], 'samples': row['samples']}
+            else:
+                tokens = prior_output_tokens(section)
+                estimates[section] = {'tokens': tokens, 'seconds': tokens / SCHEDULER_TOKENS_PER_SECOND, 'samples': 0}
+        return estimates
+
+    def record(self, report_type, section, output_tokens, seconds):
+        conn = self._connection()
+        conn.execute(
+            "INSERT INTO section_history (report_type, section, samples, output_tokens, seconds, updated_at)"
+            " VALUES (?, ?, 1, ?, ?, ?)"
+            " ON CONFLICT (report_type, section) DO UPDATE SET"
+            " samples = samples + 1,"
+            " output_tokens = output_tokens + ? * (excluded.output_tokens - output_tokens),"
+            " seconds = seconds + ? * (excluded.seconds - seconds),"
+            " updated_at = excluded.updated_at",
+            (report_type, section, output_tokens, seconds, time.time(), self.weight, self.weight)
+        )
+        conn.commit()
+
+    def stats(self):
+        rows = self._connection().execute(
+            "SELECT report_type, section, samples, output_tokens, seconds, updated_at FROM section_history"
+            " ORDER BY report_type, seconds DESC"
+        )
+        return [dict(row) for row in rows]
+
+section_history = SectionHistory(SCHEDULER_DB, SCHEDULER_HISTORY_WEIGHT)
+
+def plan_section_schedule(report_type, sections):
+    """
+    [(section_indices, estimates)] longest predicted time first. A batch group
+    is one unit (run by one worker), predicted as the sum of its sections.
+    """
+    estimates = section_history.estimates(report_type, sections)
+    units = []
+    grouped = set()
+    for idx, name in enumerate(sections):
+        if idx in grouped:
+            continue
+        indices = [idx]
+        group = section_batch_group(report_type, name) if SECTION_BATCHING_ENABLED else None
+        if group:
+            indices += [i for i, other in enumerate(sections) if i > idx and other in group]
+            grouped.update(indices)
+        units.append((indices, [estimates[sections[i]] for i in indices]))
+    return sorted(units, key=lambda unit: (-sum(e['seconds'] for e in unit[1]), -sum(e['tokens'] for e in unit[1])))
+
+def simulate_schedule(durations, slots):
+    """Finish time of each duration when started in order on the first free of `slots` slots"""
+    free_at = [0.0] * max(1, slots)
+    finishes = []
+    for duration in durations:
+        slot = free_at.index(min(free_at))
+        free_at[slot] += duration
+        finishes.append(free_at[slot])
+    return finishes
+
+def record_section_run(state, started):
+    """Feeds one finished worker into the history (only validated content counts)"""
+    if not state['validation_result'].get('is_valid'):
+        return
+    try:
+        # chars / 4, the same approximation the rate limiter uses
+        section_history.record(state['report_type'], state['current_section_name'],
+                               len(state['current_section_content']) // 4, time.time() - started)
+    except sqlite3.Error as e:
+        agent_log(f"[SCHEDULER] ⚠ Could not record section history: {e}")
+
+def summarize_schedule(results):
+    """Predicted vs actual makespan and critical section of a fan-out run"""
+    dispatched = sorted(results, key=lambda r: r['timing']['dispatch_order'])
+    units = {}
+    for r in dispatched:
+        units.setdefault(r['timing']['dispatch_order'], []).append(r)
+    units = list(units.values())
+    predicted = simulate_schedule([sum(r['timing']['predicted_seconds'] for r in unit) for unit in units],
+                                  MAX_SECTION_CONCURRENCY)
+    predicted_critical = units[predicted.index(max(predicted))][-1]
+    
+    origin = min(r['timing']['started'] for r in results)
+    actual_critical = max(results, key=lambda r: r['timing']['finished'])
+    return {
+        'order': [r['name'] for r in dispatched],
+        'predicted_makespan': round(max(predicted), 2),
+        'predicted_critical_section': predicted_critical['name'],
+        'actual_makespan': round(actual_critical['timing']['finished'] - origin, 2),
+        'actual_critical_section': actual_critical['name'],
+        'sections': {
+            r['name']: {
+                'predicted_seconds': round(r['timing']['predicted_seconds'], 2),
+                'actual_seconds': round(r['timing']['finished'] - r['timing']['started'], 2),
+            }
+            for r in dispatched
+        },
+    }
+
+# =============================================================================
+# PARALLEL FAN-OUT NODES
+# =============================================================================
+
+# Sections split into concurrent parts (year plans, role fragments) must not
+# push a fan-out run past MAX_SECTION_CONCURRENCY completions. Every section
+# that has not finished yet holds a slot; a split section may borrow only the
+# slots left over, so the total stays bounded as waiting sections start.
+_section_slots = {}  # run_id -> {'outstanding': unfinished section workers, 'borrowed': extra part slots}
+_section_slots_lock = threading.Lock()
+
+def open_section_slots(run_id, workers):
+    with _section_slots_lock:
+        _section_slots[run_id] = {'outstanding': workers, 'borrowed': 0}
+
+def close_section_slots(run_id):
+    with _section_slots_lock:
+        _section_slots.pop(run_id, None)
+
+def finish_section_slot(run_id):
+    with _section_slots_lock:
+        if run_id in _section_slots:
+            _section_slots[run_id]['outstanding'] -= 1
+
+def borrow_section_slots(run_id, wanted):
+    """Extra slots (0..wanted) for a section's parts, without waiting"""
+    with _section_slots_lock:
+        slots = _section_slots.get(run_id)
+        if slots is None:
+            return max(0, min(wanted, MAX_SECTION_CONCURRENCY - 1))  # one section at a time
+        granted = max(0, min(wanted, MAX_SECTION_CONCURRENCY - slots['outstanding'] - slots['borrowed']))
+        slots['borrowed'] += granted
+        return granted
+
+def return_section_slots(run_id, count):
+    with _section_slots_lock:
+        if count and run_id in _section_slots:
+            _section_slots[run_id]['borrowed'] -= count
+
+@contextlib.contextmanager
+def section_part_workers(state, parts):
+    """How many of a section's parts may run at once: its own slot plus what the run can spare"""
+    extra = borrow_section_slots(state.get('run_id'), parts - 1)
+    if extra < parts - 1:
+        agent_log(f"[GENERATOR AGENT] {1 + extra}/{parts} parts at a time (other sections hold the remaining slots)")
+    try:
+        yield 1 + extra
+    finally:
+        return_section_slots(state.get('run_id'), extra)
+
+def fan_out_sections(state: ParallelReportState) -> List[Send]:
+    """Decision node: Dispatch one section worker per planned section, longest predicted first"""
+    schedule = plan_section_schedule(state['report_type'], state['sections_to_generate'])
+    agent_log(f"[SUPERVISOR] Fanning out {len(state['sections_to_generate'])} sections "
+          f"(max concurrency: {MAX_SECTION_CONCURRENCY})")
+    agent_log("[SCHEDULER] Longest first: " + ", ".join(
+        " + ".join(state['sections_to_generate'][idx] for idx in indices)
+        + f" (~{sum(e['seconds'] for e in estimates):.1f}s)" for indices, estimates in schedule) + "\n")
+
+    open_section_slots(state.get('run_id', ''), len(schedule))
+    return [
+        Send("section_worker", {
+            'run_id': state.get('run_id', ''),
+            'report_type': state['report_type'],
+            'inputs': state['inputs'],
+            'sections_to_generate': state['sections_to_generate'],
+            'prompt_plan': state['prompt_plan'],
+            'prompt_variants': state.get('prompt_variants') or {},
+            'section_index': indices[0],
+            'batch_indices': indices[1:],
+            'dispatch_order': order,
+            'predicted_seconds': [e['seconds'] for e in estimates],
+        })
+        for order, (indices, estimates) in enumerate(schedule)
+    ]
+
+def section_worker(task: SectionTaskState) -> Dict[str, Any]:
+    """
+    Section Worker: Runs the generate → validate → retry loop for ONE section
+    (or one batch group, section by section).
+    Reuses the sequential agents on a private state so workers never share data.
+    """
+    section_state = _new_section_state(task)
+    results = []
+
+    try:
+        for position, idx in enumerate(_worker_section_indices(task)):
+            started = time.time()
+            _start_worker_section(section_state, idx)
+            while True:
+                section_state = section_generator_agent(section_state)
+                section_state = validator_agent(section_state)
+                section_state = retry_controller(section_state)
+                if should_retry_section(section_state) == "accept":
+                    break
+
+            commit_section_cache(section_state)
+            results.append(_section_worker_result(section_state, task, position, started))
+    finally:
+        finish_section_slot(task['run_id'])
+
+    return {'section_results': results}
+
+async def section_worker_async(task: SectionTaskState) -> Dict[str, Any]:
+    """Async Section Worker: Same loop as section_worker, awaiting the LLM call"""
+    section_state = _new_section_state(task)
+    results = []
+
+    try:
+        for position, idx in enumerate(_worker_section_indices(task)):
+            started = time.time()
+            _start_worker_section(section_state, idx)
+            while True:
+                section_state = await section_generator_agent_async(section_state)
+                section_state = validator_agent(section_state)
+                section_state = retry_controller(section_state)
+                if should_retry_section(section_state) == "accept":
+                    break
+
+            commit_section_cache(section_state)
+            results.append(_section_worker_result(section_state, task, position, started))
+    finally:
+        finish_section_slot(task['run_id'])
+
+    return {'section_results': results}
+
+def _worker_section_indices(task: SectionTaskState) -> List[int]:
+    return [task['section_index']] + list(task.get('batch_indices') or [])
+
+def _start_worker_section(section_state: ReportState, idx: int):
+    """Points the worker's private state at its next section"""
+    if section_state['current_section_name']:
+        # Earlier sections of the batch count as generated, so they are not batched again
+        section_state['generated_sections'].append({
+            'name': section_state['current_section_name'],
+            'content': section_state['current_section_content'],
+        })
+    section_state['current_section_index'] = idx
+    section_state['retry_count'] = 0
+    section_state['validation_result'] = {}
+
+def _new_section_state(task: SectionTaskState) -> ReportState:
+    """Private per-section state used inside a section worker"""
+    return {
+        'run_id': task.get('run_id', ''),
+        'report_type': task['report_type'],
+        'inputs': task['inputs'],
+        'sections_to_generate': task['sections_to_generate'],
+        'prompt_plan': task['prompt_plan'],
+        'prompt_variants': task.get('prompt_variants') or {},
+        'variant_meter': {},
+        'prompt_build_ms': 0.0,
+        'current_section_index': task['section_index'],
+        'generated_sections': [],
+        'current_section_name': '',
+        'current_section_content': '',
+        'validation_result': {},
+        'retry_count': 0,
+        'retries_used': 0,
+        'retry_decision': '',
+        'pending_cache_writes': [],
+        'batched_sections': {},
+        'final_report': '',
+        'error': ''
+    }
+
+def _section_worker_result(section_state: ReportState, task: SectionTaskState, position: int, started: float) -> Dict[str, Any]:
+    """One entry of the worker output appended to section_results by the fan-out reducer"""
+    agent_log(f"[WORKFLOW] ✓ Section finished: {section_state['current_section_name']}")
+    emit_section_saved(section_state)
+    record_section_run(section_state, started)
+    record_variant_section(section_state)
+
+    predicted = task.get('predicted_seconds') or []
+    return {
+        'name': section_state['current_section_name'],
+        'content': section_state['current_section_content'],
+        'timing': {
+            'dispatch_order': task.get('dispatch_order', task['section_index']),
+            'predicted_seconds': predicted[position] if position < len(predicted) else 0.0,
+            'started': started,
+            'finished': time.time(),
+        },
+    }
+
+def merge_section_results(state: ParallelReportState) -> ParallelReportState:
+    """Merges worker results back into heading order before finalization"""
+    order = {name: idx for idx, name in enumerate(state['sections_to_generate'])}
+
+    merged = []
+    for result in sorted(state['section_results'], key=lambda r: order.get(r['name'], len(order))):
+        if any(s['name'] == result['name'] for s in merged):
+            agent_log(f"[WORKFLOW] ⚠ Section '{result['name']}' already exists, skipping duplicate")
+            continue
+        merged.append({'name': result['name'], 'content': result['content']})
+
+    state['generated_sections'] = merged
+    state['current_section_index'] = len(merged)
+
+    agent_log(f"[WORKFLOW] ✓ Merged {len(merged)}/{len(state['sections_to_generate'])} sections in heading order")
+
+    timed = [r for r in state['section_results'] if 'timing' in r]
+    if timed:
+        state['schedule'] = summarize_schedule(timed)
+        agent_log(f"[SCHEDULER] Makespan predicted {state['schedule']['predicted_makespan']}s "
+                  f"(critical: {state['schedule']['predicted_critical_section']}) | "
+                  f"actual {state['schedule']['actual_makespan']}s "
+                  f"(critical: {state['schedule']['actual_critical_section']})\n")
+
+    return state
+
+# Nodes after the fan-out return only the keys they change: handing back the
+# whole state would feed section_results through its append reducer again.
+def merge_sections_node(state: ParallelReportState) -> Dict[str, Any]:
+    """Graph node for merge_section_results"""
+    merged = merge_section_results(dict(state))
+    return {key: merged[key] for key in ('generated_sections', 'current_section_index', 'schedule') if key in merged}
+
+def parallel_finalizer_node(state: ParallelReportState) -> Dict[str, Any]:
+    """Graph node for finalize_report in the fan-out workflow"""
+    return {'final_report': finalize_report(dict(state))['final_report']}
+
+# =============================================================================
+# LANGGRAPH WORKFLOW BUILDER
+# =============================================================================
+
+def create_parallel_workflow(use_async: bool = False):
+    """
+    Builds the fan-out variant of the workflow: every section is generated
+    concurrently by its own worker and merged back in heading order.
+    """
+    workflow = StateGraph(ParallelReportState)
+
+    workflow.add_node("supervisor", supervisor_agent)
+    workflow.add_node("section_worker", section_worker_async if use_async else section_worker)
+    workflow.add_node("merge_sections", merge_sections_node)
+    workflow.add_node("finalizer", parallel_finalizer_node)
+
+    workflow.set_entry_point("supervisor")
+
+    workflow.add_conditional_edges("supervisor", fan_out_sections, ["section_worker"])
+    workflow.add_edge("section_worker", "merge_sections")
+    workflow.add_edge("merge_sections", "finalizer")
+    workflow.add_edge("finalizer", END)
 
-def create_multi_agent_workflow():
+    return workflow.compile()
+
+def create_multi_agent_workflow(use_async: bool = False):
     """
     Builds the complete multi-agent workflow using LangGraph.
+    With use_async the generator awaits AsyncOpenAI (run it with ainvoke).
     """
     workflow = StateGraph(ReportState)
     
     # Register all agent nodes
     workflow.add_node("supervisor", supervisor_agent)
-    workflow.add_node("generator", section_generator_agent)
+    workflow.add_node("generator", section_generator_agent_async if use_async else section_generator_agent)
     workflow.add_node("validator", validator_agent)
+    workflow.add_node("retry_controller", retry_controller)
     workflow.add_node("save_and_continue", save_section_and_continue)
     workflow.add_node("finalizer", finalize_report)
     
@@ -413,9 +3201,10 @@ def create_multi_agent_workflow():
     
     workflow.add_edge("supervisor", "generator")
     workflow.add_edge("generator", "validator")
+    workflow.add_edge("validator", "retry_controller")
     
     workflow.add_conditional_edges(
-        "validator",
+        "retry_controller",
         should_retry_section,
         {
             "retry": "generator",
@@ -436,638 +3225,1278 @@ def create_multi_agent_workflow():
     
     return workflow.compile()
 
+# =============================================================================
+# COMPILED WORKFLOW CACHE & DIRECT EXECUTOR
+# =============================================================================
+
+REPORT_TYPES = ('career', 'development')
+
+# "graph" runs the compiled LangGraph workflow, "direct" calls the same agents in-process
+REPORT_EXECUTORS = ('graph', 'direct')
+REPORT_EXECUTOR = os.getenv("REPORT_EXECUTOR", "graph")
+
+def resolve_executor(executor=None):
+    """executor, or REPORT_EXECUTOR when unset; ValueError for an unknown name"""
+    executor = executor or REPORT_EXECUTOR
+    if executor not in REPORT_EXECUTORS:
+        raise ValueError(f"executor must be one of {list(REPORT_EXECUTORS)}, got '{executor}'")
+    return executor
+
+_compiled_workflows = {}
+_compiled_workflows_lock = threading.Lock()
+
+def get_compiled_workflow(report_type: str, parallel: bool = False, use_async: bool = False):
+    """Returns the compiled workflow for a report type, compiling it only once"""
+    key = (report_type, parallel, use_async)
+    workflow = _compiled_workflows.get(key)
+    if workflow is None:
+        with _compiled_workflows_lock:
+            workflow = _compiled_workflows.get(key)
+            if workflow is None:
+                workflow = create_parallel_workflow(use_async) if parallel else create_multi_agent_workflow(use_async)
+                _compiled_workflows[key] = workflow
+    return workflow
+
+def warm_workflow_cache():
+    """Compiles every workflow variant up front so requests never pay for it"""
+    for report_type in REPORT_TYPES:
+        for parallel in (False, True):
+            for use_async in (False, True):
+                get_compiled_workflow(report_type, parallel, use_async)
+
+def run_workflow_direct(state: ReportState, parallel: bool = False) -> ReportState:
+    """
+    Direct Executor: Runs the supervisor/generator/validator/finalizer agents
+    in-process, following the same edges as the LangGraph workflow but without
+    the graph runtime (no channel copies, no superstep bookkeeping).
+    """
+    state = supervisor_agent(state)
+
+    if parallel:
+        tasks = [send.arg for send in fan_out_sections(state)]
+        with ThreadPoolExecutor(max_workers=MAX_SECTION_CONCURRENCY) as pool:
+            results = list(pool.map(section_worker, tasks))
+        state['section_results'] = [r for result in results for r in result['section_results']]
+        state = merge_section_results(state)
+        return finalize_report(state)
+
+    while True:
+        state = section_generator_agent(state)
+        state = validator_agent(state)
+        state = retry_controller(state)
+        if should_retry_section(state) == "retry":
+            continue
+        state = save_section_and_continue(state)
+        if has_more_sections(state) == "finalize":
+            break
+
+    return finalize_report(state)
+
+async def run_workflow_direct_async(state: ReportState, parallel: bool = False) -> ReportState:
+    """Async Direct Executor: run_workflow_direct with awaited LLM calls"""
+    state = supervisor_agent(state)
+
+    if parallel:
+        semaphore = asyncio.Semaphore(MAX_SECTION_CONCURRENCY)
+
+        async def run_limited(task):
+            async with semaphore:
+                return await section_worker_async(task)
+
+        results = await asyncio.gather(*[run_limited(send.arg) for send in fan_out_sections(state)])
+        state['section_results'] = [r for result in results for r in result['section_results']]
+        state = merge_section_results(state)
+        return finalize_report(state)
+
+    while True:
+        state = await section_generator_agent_async(state)
+        state = validator_agent(state)
+        state = retry_controller(state)
+        if should_retry_section(state) == "retry":
+            continue
+        state = save_section_and_continue(state)
+        if has_more_sections(state) == "finalize":
+            break
+
+    return finalize_report(state)
+
 # =============================================================================
 # MAIN ENTRY POINT FOR MULTI-AGENT REPORT GENERATION
 # =============================================================================
 
-def generate_report_with_agents(report_type: str, inputs: Dict[str, Any]) -> str:
+def generate_report_with_agents(report_type: str, inputs: Dict[str, Any], parallel: bool = None, executor: str = None, run_id: str = '') -> str:
     """
     Main function to generate report using multi-agent system.
+    When parallel is set (defaults to PARALLEL_SECTIONS), all sections are
+    generated concurrently, capped at MAX_SECTION_CONCURRENCY.
+    executor picks the compiled graph ("graph") or the direct executor ("direct");
+    any other value raises ValueError.
+    run_id routes progress events to a listener registered for that id.
+    """
+    if parallel is None:
+        parallel = PARALLEL_SECTIONS
+    executor = resolve_executor(executor)
+
+    initial_state = _build_initial_state(report_type, inputs, parallel, run_id)
+    
+    open_retry_budget(initial_state['run_id'])
+    try:
+        if executor == "direct":
+            final_state = run_workflow_direct(initial_state, parallel)
+        else:
+            workflow = get_compiled_workflow(report_type, parallel)
+            final_state = initial_state
+            try:
+                for final_state in workflow.stream(initial_state, config=_workflow_config(report_type, parallel),
+                                                   stream_mode="values"):
+                    pass
+            except GraphRecursionError:
+                final_state = finalize_partial_report(final_state)
+    finally:
+        close_retry_budget(initial_state['run_id'])
+        close_section_slots(initial_state['run_id'])
+    
+    return final_state['final_report']
+
+async def generate_report_with_agents_async(report_type: str, inputs: Dict[str, Any], parallel: bool = None, executor: str = None, run_id: str = '') -> str:
+    """
+    Async variant of generate_report_with_agents. LLM calls are awaited, so one
+    event loop can keep many reports in flight while waiting on OpenAI.
     """
-    workflow = create_multi_agent_workflow()
+    if parallel is None:
+        parallel = PARALLEL_SECTIONS
+    executor = resolve_executor(executor)
+
+    initial_state = _build_initial_state(report_type, inputs, parallel, run_id)
+    
+    open_retry_budget(initial_state['run_id'])
+    try:
+        async with async_llm_session():
+            if executor == "direct":
+                final_state = await run_workflow_direct_async(initial_state, parallel)
+            else:
+                workflow = get_compiled_workflow(report_type, parallel, use_async=True)
+                final_state = initial_state
+                try:
+                    async for final_state in workflow.astream(initial_state, config=_workflow_config(report_type, parallel),
+                                                              stream_mode="values"):
+                        pass
+                except GraphRecursionError:
+                    final_state = finalize_partial_report(final_state)
+    finally:
+        close_retry_budget(initial_state['run_id'])
+        close_section_slots(initial_state['run_id'])
     
+    return final_state['final_report']
+
+def _build_initial_state(report_type: str, inputs: Dict[str, Any], parallel: bool, run_id: str = '') -> Dict[str, Any]:
     initial_state = {
+        'run_id': run_id or uuid.uuid4().hex,
         'report_type': report_type,
-        'inputs': inputs,
+        'inputs': normalize_inputs(inputs),
         'sections_to_generate': [],
+        'prompt_plan': {},
+        'prompt_variants': {},
+        'variant_meter': {},
+        'prompt_build_ms': 0.0,
         'current_section_index': 0,
         'generated_sections': [], 
         'current_section_name': '',
         'current_section_content': '',
         'validation_result': {},
         'retry_count': 0,
+        'retries_used': 0,
+        'retry_decision': '',
+        'pending_cache_writes': [],
+        'batched_sections': {},
         'final_report': '',
         'error': ''
     }
     
-    final_state = workflow.invoke(initial_state)
+    if parallel:
+        initial_state['section_results'] = []
+        initial_state['schedule'] = {}
     
-    return final_state['final_report']
+    return initial_state
 
-def generate_section_prompts(report_type, inputs):
-    skill_guidance = build_skill_action_guidance(
-        inputs.get("highest_skills", []), 
-        inputs.get("skillpercentages", {})
+def _workflow_config(report_type: str, parallel: bool) -> Dict[str, Any]:
+    config = {"recursion_limit": workflow_recursion_limit(report_type, parallel)}
+    if parallel:
+        config["max_concurrency"] = MAX_SECTION_CONCURRENCY
+    return config
+
+def workflow_recursion_limit(report_type: str, parallel: bool) -> int:
+    """
+    Supersteps the workflow can legitimately need, plus headroom. Sequential:
+    supervisor and finalizer, 4 per section (generator, validator, retry
+    controller, save) and 3 per retry the budget allows. Parallel: supervisor,
+    workers, merge, finalizer.
+    """
+    if parallel:
+        return 4 + 6
+    sections = len(get_report_sections(report_type))
+    retries = min(REPORT_RETRY_BUDGET, sections * SECTION_MAX_RETRIES)
+    return 2 + 4 * sections + 3 * retries + 6
+
+def finalize_partial_report(state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Assembles whatever finished before the graph hit its recursion limit,
+    with placeholders for missing sections, instead of losing the whole run.
+    """
+    if state.get('section_results') and not state['generated_sections']:
+        state = merge_section_results(state)
+    
+    done = {section['name'] for section in state['generated_sections']}
+    missing = [name for name in state['sections_to_generate'] if name not in done]
+    print(f"[WORKFLOW] ⚠ Recursion limit reached - returning partial report "
+          f"({len(done)}/{len(state['sections_to_generate'])} sections)")
+    
+    order = {name: idx for idx, name in enumerate(state['sections_to_generate'])}
+    state['generated_sections'] = sorted(
+        state['generated_sections'] + [{'name': name, 'content': f"{name}\n\nContent generation did not complete."}
+                                       for name in missing],
+        key=lambda section: order.get(section['name'], len(order)),
     )
+    state['error'] = f"Recursion limit reached; incomplete sections: {', '.join(missing)}"
+    return finalize_report(state)
 
-    base_prompt = (
-        "Based on the following student profile information, you will write ONLY ONE "
-        "of the requested sections of the report each time. "
-        "Do not repeat the input data in the output.\n\n"
-        "INPUT DATA:\n"
-        f"- Standard / Year: {inputs.get('standard', 'NA')}\n"
-        f"- Board: {inputs.get('board', 'NA')}\n"
-        f"- Highest Skills with Percentages: {format_skills_with_percentages(inputs.get('highest_skills', []), inputs.get('skillpercentages', {}))}\n"
-        f"- Thinking Pattern: {inputs.get('thinking_pattern', 'NA')}\n"
-        f"- Achievement Style with Percentages: {format_skills_with_percentages(inputs.get('achievement_style', []), inputs.get('achievementpercentages', {}))}\n"
-        f"- Learning Communication Style with Percentages: {format_skills_with_percentages(inputs.get('learning_communication_style', []), inputs.get('learningpercentages', {}))}\n"
-        f"- Quotients with Percentages: {format_skills_with_percentages(inputs.get('quotients', []), inputs.get('quotientpercentages', {}))}\n"
-        f"- Personality Type: {inputs.get('personality_type', 'NA')}\n"
-        f"- Suggested Career Roles: {inputs.get('career_roles', 'NA')}\n\n"
-        "CRITICAL AGE/LEVEL ADAPTATION RULE:\n"
-        "You MUST adapt all advice to the student's Standard/Year.\n"
-        "- If the student is in school (e.g., 6th-12th): focus on school-level actions, subject foundations, study routines, age-appropriate internships/projects (mini-projects), and parent/teacher support.\n"
-        "- If the student is in college (e.g., FY/SY/TY/1st-4th year): focus on industry readiness, internships, projects, networking, resume/portfolio, and placement preparation.\n"
-        "Do NOT give college-level internship/placement advice to an 8th/9th student.\n"
-        "Do NOT give school timetable advice to a final-year college student.\n\n"
-        "CRITICAL INSTRUCTION - CAREER ROLE FOCUS:\n"
-        f"YOU MUST USE THE EXACT CAREER ROLES ENTERED BY THE STUDENT: {inputs.get('career_roles', 'NA')}\n"
-        "DO NOT CHANGE OR SUGGEST DIFFERENT ROLES.\n"
-        "The ENTIRE report must be centered around THESE EXACT ROLES ONLY.\n"
-        "If multiple roles are mentioned (e.g., Software Engineer, Data Scientist, Event Manager), you MUST:\n"
-        "  - Address ALL roles mentioned by the student\n"
-        "  - Create separate subsections for each role where appropriate\n"
-        "Every recommendation must be DIRECTLY relevant to the entered roles.\n"
-        "Do NOT provide generic career advice. Do NOT suggest alternative roles.\n\n"
-        f"{skill_guidance}\n\n"
-        "BOARD CONTEXT RULE:\n"
-        "You MUST adapt learning methods, practice strategies, and execution “commands” (how skills are practiced, reinforced, and assessed) according to the student’s academic Board and study environment.\n"
-        "CBSE (Central Board of Secondary Education): emphasize NCERT-based conceptual clarity, structured syllabus progression, exam-oriented practice, problem-solving aligned with national competitive exams, and strong fundamentals with time-bound revision.\n"
-        "ICSE (Indian Certificate of Secondary Education): emphasize detailed conceptual understanding, strong language and writing skills, descriptive answer structuring, curriculum depth, and analytical explanation alongside exam preparedness.\n"
-        "State Board (e.g., Gujarat Board, UP Board, etc.): emphasize board-pattern questions, language-medium sensitivity where applicable, strengthening core fundamentals, confidence-building through guided practice, and deliberate bridging of gaps toward national-level competitive and industry standards.\n"
-        "IB / Cambridge: emphasize inquiry-based learning, conceptual depth, project and research work, independent thinking, report writing, interdisciplinary understanding, and application-oriented assessments.\n"
-        "Learning activities, practice intensity, expectations, and support mechanisms MUST be realistically aligned with the academic exposure, assessment style, and learning culture of the student’s Board.\n"
-        "Keep recommendations practical and appropriate to the board.\n\n"
-        "NON-NEGOTIABLE OUTPUT RULES:\n"
-        "- BE CONCISE AND DIRECT. NO lengthy explanations or verbose paragraphs.\n"
-        "- Use BULLET POINTS for all lists and action items.\n"
-        "- Each bullet should be 1-2 lines maximum.\n"
-        "- NO introductory or concluding paragraphs.\n"
-        "- Get straight to the actionable information.\n"
-        "- TOTAL section length: 200-350 words maximum (not 500-700).\n"
-        "- Do NOT use emojis or decorative symbols like * or #.\n"
-        "- Format with clear subheadings for each role if multiple roles exist.\n\n"
-        "FORMAT REQUIREMENTS:\n"
-        "- First line must be the exact section heading.\n"
-        "- Organize content with concise subheadings.\n"
-        "- Use bullet points starting with '- ' for all lists.\n"
-        "- Keep explanations minimal - focus on facts and action items.\n\n"
+# =============================================================================
+# PROMPT CONSTRUCTION
+# =============================================================================
+
+CAREER_SECTIONS = [
+    "1. Detailed Career Role Breakdown",
+    "2. Industry Specific Requirements",
+    "3. Emerging Trends and Future Job Prospects",
+    "4. Recommended Internships",
+    "5. Professional Networking and Industry Associations",
+    "6. Guidelines for Progress Monitoring & Support",
+]
+
+DEVELOPMENT_SECTIONS = [
+    "1. Academic Interventions",
+    "2. Non-Academic Interventions",
+    "3. Habit Reengineering",
+    "4. Physical Grooming",
+    "5. Psychological Grooming",
+    "6. Suggested Reading",
+    "7. Health Discipline",
+]
+
+def get_report_sections(report_type):
+    """Ordered section headings for a report type"""
+    return list(CAREER_SECTIONS if report_type == "career" else DEVELOPMENT_SECTIONS)
+
+# Prompt text lives in prompts/: system message, shared rules, the student
+# profile template, board/level guidance fragments and one blueprint per
+# section (file name = heading without its number, e.g. sections/health_discipline.txt).
+# Files are compiled once, hashed into a prompt version and reloaded when they change.
+PROMPT_DIR = os.getenv("PROMPT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompts"))
+PROMPT_RELOAD_INTERVAL = float(os.getenv("PROMPT_RELOAD_INTERVAL", "2"))
+
+# Bump when prompt text built in code changes (section heading line, batch, year split, repair wording)
+PROMPT_CODE_REVISION = 7
+
+PROFILE_FIELDS = (
+    'standard', 'board', 'highest_skills', 'thinking_pattern', 'achievement_style',
+    'learning_communication_style', 'quotients', 'personality_type', 'career_roles',
+    'level_guidance', 'board_guidance', 'skill_guidance',
+)
+
+def prompt_template_slug(section):
+    """Blueprint file stem for a heading: "7. Health Discipline" -> "health_discipline" """
+    return re.sub(r'[^a-z0-9]+', '_', re.sub(r'^\d+\.\s*', '', section).lower()).strip('_')
+
+def section_blueprint(templates, section, variant=None):
+    """Blueprint text of a heading in a snapshot: the named variant, the base file, or the default"""
+    slug = prompt_template_slug(section)
+    if variant in templates.variants.get(slug, {}):
+        return templates.variants[slug][variant]
+    return templates.blueprints.get(slug, templates.default_blueprint)
+
+class PromptTemplates:
+    """
+    Compiled prompt files. current() returns an immutable snapshot; at most every
+    PROMPT_RELOAD_INTERVAL seconds it checks file mtimes and recompiles on a
+    change, so every worker picks up edited prompts without a restart.
+    """
+
+    def __init__(self, root, reload_interval):
+        self.root = root
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._signature = self._file_signature()
+        self._snapshot = self._compile()
+
+    def _files(self):
+        paths = []
+        for directory, _, names in os.walk(self.root):
+            paths += [os.path.join(directory, name) for name in names if name.endswith(".txt")]
+        return sorted(os.path.relpath(path, self.root).replace(os.sep, "/") for path in paths)
+
+    def _file_signature(self):
+        signature = []
+        for rel in self._files():
+            stat = os.stat(os.path.join(self.root, rel))
+            signature.append((rel, stat.st_mtime_ns, stat.st_size))
+        return tuple(signature)
+
+    def _read(self, rel):
+        with open(os.path.join(self.root, rel), encoding="utf-8") as f:
+            text = f.read()
+        # Files end with one newline by convention; it is not part of the prompt
+        return text[:-1] if text.endswith("\n") else text
+
+    def _compile(self):
+        files = {rel: self._read(rel) for rel in self._files()}
+        for required in ("system.txt", "shared_rules.txt", "student_profile.txt", "sections/_default.txt"):
+            if required not in files:
+                raise FileNotFoundError(f"Prompt file missing: {os.path.join(self.root, required)}")
+
+        def group(prefix):
+            return {rel[len(prefix):-len(".txt")]: text for rel, text in files.items() if rel.startswith(prefix)}
+
+        profile = Template(files["student_profile.txt"])
+        # Fails on unknown or malformed placeholders before the snapshot goes live
+        profile.substitute({field: '' for field in PROFILE_FIELDS})
+
+        # sections/<slug>@<variant>.txt registers an alternate blueprint for a prompt experiment
+        blueprints, variants = {}, {}
+        for name, text in group("sections/").items():
+            slug, _, variant = name.partition("@")
+            if variant:
+                variants.setdefault(slug, {})[variant] = text
+            else:
+                blueprints[slug] = text
+
+        return SimpleNamespace(
+            version=content_hash({'code_revision': PROMPT_CODE_REVISION, 'files': files})[:12],
+            system=files["system.txt"],
+            rules=files["shared_rules.txt"],
+            profile=profile,
+            board=group("board/"),
+            level=group("level/"),
+            blueprints=blueprints,
+            variants=variants,
+            default_blueprint=files["sections/_default.txt"],
+            files=len(files),
+        )
+
+    def current(self):
+        now = time.monotonic()
+        if now - self._checked_at >= self.reload_interval:
+            with self._lock:
+                if now - self._checked_at >= self.reload_interval:
+                    self._checked_at = now
+                    self._reload_if_changed()
+        return self._snapshot
+
+    def _reload_if_changed(self):
+        try:
+            signature = self._file_signature()
+            if signature == self._signature:
+                return
+            previous = self._snapshot.version
+            self._snapshot = self._compile()
+            self._signature = signature
+            if self._snapshot.version != previous:
+                print(f"[PROMPTS] ✓ Reloaded {self._snapshot.files} prompt files: version {previous} → {self._snapshot.version}")
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[PROMPTS] ✗ Reload failed, keeping version {self._snapshot.version}: {e}")
+
+    @property
+    def version(self):
+        """Version of the live snapshot (no reload check)"""
+        return self._snapshot.version
+
+    def blueprint(self, section, variant=None):
+        return section_blueprint(self.current(), section, variant)
+
+prompt_templates = PromptTemplates(PROMPT_DIR, PROMPT_RELOAD_INTERVAL)
+
+# Only the board and level guidance matching the student is sent (all of it when
+# the input cannot be classified)
+PROMPT_PRUNING_ENABLED = os.getenv("PROMPT_PRUNING_ENABLED", "1") == "1"
+
+# Input fields that reach the prompts (anything else, e.g. the student's name, must not split the cache)
+PROMPT_INPUT_FIELDS = (
+    'standard', 'board', 'highest_skills', 'skillpercentages', 'thinking_pattern',
+    'achievement_style', 'achievementpercentages', 'learning_communication_style',
+    'learningpercentages', 'quotients', 'quotientpercentages', 'personality_type', 'career_roles',
+)
+
+def normalize_inputs(inputs):
+    """Trims and collapses whitespace in every string value of the student inputs"""
+    def normalize(value):
+        if isinstance(value, str):
+            return " ".join(value.split())
+        if isinstance(value, list):
+            return [normalize(v) for v in value]
+        if isinstance(value, dict):
+            return {normalize(k): normalize(v) for k, v in value.items()}
+        return value
+
+    return {key: normalize(value) for key, value in (inputs or {}).items()}
+
+def classify_board(board):
+    """Board guidance key (prompts/board/<key>.txt) for a board input, None when unrecognised"""
+    text = (board or '').casefold()
+    if 'cbse' in text:
+        return 'cbse'
+    if re.search(r'\b(icse|isc)\b', text):
+        return 'icse'
+    if re.search(r'\b(ib|igcse|cambridge|international baccalaureate)\b', text):
+        return 'ib_cambridge'
+    if re.search(r'\b(state|ssc|hsc|gseb|msbshse|up board|bihar board)\b', text):
+        return 'state'
+    return None
+
+def classify_level(standard):
+    """Level guidance key (prompts/level/<key>.txt) for a Standard / Year input, None when unrecognised"""
+    text = (standard or '').casefold()
+    if re.search(r'\b(fy|sy|ty|year|yr|sem|semester|college|university|degree|diploma|ug|pg|graduate|'
+                 r'b\.?\s?tech|b\.?\s?e|b\.?\s?sc|b\.?\s?com|b\.?\s?a|bba|bca|mba|m\.?\s?tech|m\.?\s?sc)\b', text):
+        return 'college'
+    if re.search(r'\b([1-9]|1[0-2])(st|nd|rd|th)?\b|\b(class|grade|std|standard|school)\b', text):
+        return 'school'
+    return None
+
+def select_prompt_guidance(templates, inputs, pruned=True):
+    """(board guidance, level guidance) text for the profile: the matching fragment, or all of them"""
+    board = classify_board(inputs.get('board')) if pruned else None
+    level = classify_level(inputs.get('standard')) if pruned else None
+    board_text = templates.board[board] if board in templates.board else "\n".join(templates.board.values())
+    level_text = templates.level[level] if level in templates.level else "\n".join(templates.level.values())
+    return board_text, level_text
+
+def build_student_profile(inputs, pruned=None, templates=None):
+    """
+    Student-specific tail shared by every section prompt of one report
+    (prompts/student_profile.txt). With pruning only the board and level
+    guidance matching the inputs is included.
+    """
+    templates = templates or prompt_templates.current()
+    board_guidance, level_guidance = select_prompt_guidance(
+        templates, inputs, PROMPT_PRUNING_ENABLED if pruned is None else pruned)
+
+    return templates.profile.substitute(
+        standard=inputs.get('standard', 'NA'),
+        board=inputs.get('board', 'NA'),
+        highest_skills=format_skills_with_percentages(inputs.get('highest_skills', []), inputs.get('skillpercentages', {})),
+        thinking_pattern=inputs.get('thinking_pattern', 'NA'),
+        achievement_style=format_skills_with_percentages(inputs.get('achievement_style', []), inputs.get('achievementpercentages', {})),
+        learning_communication_style=format_skills_with_percentages(inputs.get('learning_communication_style', []), inputs.get('learningpercentages', {})),
+        quotients=format_skills_with_percentages(inputs.get('quotients', []), inputs.get('quotientpercentages', {})),
+        personality_type=inputs.get('personality_type', 'NA'),
+        career_roles=inputs.get('career_roles', 'NA'),
+        level_guidance=level_guidance,
+        board_guidance=board_guidance,
+        skill_guidance=build_skill_action_guidance(inputs.get("highest_skills", []), inputs.get("skillpercentages", {})),
     )
 
-    if report_type == "career":
-        sections = [
-            "1. Detailed Career Role Breakdown",
-            "2. Industry Specific Requirements",
-            "3. Emerging Trends and Future Job Prospects",
-            "4. Recommended Internships",
-            "5. Professional Networking and Industry Associations",
-            "6. Guidelines for Progress Monitoring & Support",
-        ]
+def plan_granularity_instruction(periods):
+    """Prompt text that folds the month blocks of a year-plan blueprint into coarser periods"""
+    return (
+        "PLAN GRANULARITY (overrides the month counts above; all other rules still apply):\n"
+        f"Write one '- Month:' block per period instead of per month, {len(periods)} per year, "
+        f"with exactly these Month values: {', '.join(periods)}.\n"
+        "Each block covers all the months of its period and the periods progress through the year.\n"
+    )
 
-    else:  # development
-        sections = [
-            "1. Academic Interventions",
-            "2. Non-Academic Interventions",
-            "3. Habit Reengineering",
-            "4. Physical Grooming",
-            "5. Psychological Grooming",
-            "6. Suggested Reading",
-            "7. Health Discipline",
-        ]
+def build_section_prompt(student_profile, section, templates=None, variant=None, periods=PLAN_MONTHS):
+    """
+    Full prompt for one section, invariant text first: shared rules + section
+    blueprint (or the given variant of it) + plan granularity and compact row
+    format for month plans, then the student profile and the heading to write.
+    """
+    templates = templates or prompt_templates.current()
+    blueprint = section_blueprint(templates, section, variant)
+    if uses_compact_plan(section):
+        blueprint = compact_blueprint(blueprint)
+    granularity = plan_granularity_instruction(periods) if section in YEAR_PLAN_COLUMNS and periods != PLAN_MONTHS else ""
+    compact = compact_plan_instruction(section, periods) if uses_compact_plan(section) else ""
+
+    return (
+        templates.rules +
+        f"{blueprint}\n"
+        f"{granularity}"
+        f"{compact}"
+        f"{student_profile}"
+        "WRITE ONLY THE FOLLOWING SECTION, using the exact heading text as the first line:\n"
+        f"{section}\n"
+    )
 
-    # Section-specific blueprints for more targeted outputs
-    section_blueprints = {
-        "1. Detailed Career Role Breakdown": (
-            "SECTION-SPECIFIC REQUIREMENTS - OUTPUT STRUCTURED FORMAT (NOT MARKDOWN TABLE):\n"
-            "\n"
-            "For EACH entered career role, output in this EXACT format (one role per block):\n"
-            "\n"
-            "Career Role: [Role Name]\n"
-            "Technical Skills: [comma-separated list]\n"
-            "Soft Skills: [comma-separated list]\n"
-            "Undergraduate Education: [degree name]\n"
-            "Postgraduate Education: [degree name]\n"
-            "Micro-degrees: [comma-separated certifications]\n"
-            "Certifications: [comma-separated list]\n"
-            "Career Progression: [progression path with arrows]\n"
-            "Salary Range: [amount and currency]\n"
-            "Day-to-Day Responsibilities: [comma-separated list]\n"
-            "\n"
-            "[Leave blank line between roles]\n"
-            "\n"
-            "DO NOT CREATE MARKDOWN TABLES. DO NOT USE PIPES |\n"
-            "Each field on its own line with label: value format.\n"
-        ),
-        "2. Industry Specific Requirements": (
-            "SECTION-SPECIFIC REQUIREMENTS:\n"
-            "- For EACH career role, organize requirements in BEGINNER → ADVANCED progression\n"
-            "- Create a TABLE with columns: Level | Certification Name | Application Process | Duration | Assistance Resources\n"
-            "- Structure for each role:\n"
-            "  **For [Career Role Name]:**\n"
-            "  \n"
-            "  Beginner Level:\n"
-            "  - Certification Name: [Name]\n"
-            "  - Application Process: Step-by-step how to apply (registration website, prerequisites, exam format)\n"
-            "  - Duration: Time to complete (e.g., 3 months, 6 weeks)\n"
-            "  - Assistance Resources: Where to get help (official courses, study materials, forums, coaching)\n"
-            "  \n"
-            "  Intermediate Level:\n"
-            "  [same format]\n"
-            "  \n"
-            "  Advanced Level:\n"
-            "  [same format]\n"
-            "- Include ALL important details: registration links, prerequisites, exam format, study resources, cost (if applicable)\n"
-            "- Be SPECIFIC and ACTIONABLE - students should be able to act on this information immediately\n"
-        ),
-        "3. Emerging Trends and Future Job Prospects": (
-            "SECTION-SPECIFIC REQUIREMENTS:\n"
-            "- Determine the CURRENT YEAR dynamically at the time of report generation.\n"
-            "- Define time ranges as follows:\n"
-            "  * Past Trend: Previous 3 completed years (Current Year - 3 to Current Year - 1)\n"
-            "  * Present Trend: Current Year\n"
-            "  * Future Prediction: Next 3 years (Current Year + 1 to Current Year + 3)\n"
-            "\n"
-            "- For EACH career role, create a separate subsection with clear heading:\n"
-            "  **[Career Role Name]**\n"
-            "- Then provide a TABLE with columns:\n"
-            "  Past Trend (Previous 3 Years) | Present Trend (Current Year) | Future Prediction (Next 3 Years)\n"
-            "\n"
-            "- Include STATISTICAL DATA based on real industry trends such as:\n"
-            "  market size, job growth %, salary trends, technology adoption rates\n"
-            "\n"
-            "- Rows should cover:\n"
-            "  * Job Demand Growth\n"
-            "  * Average Salary Trends\n"
-            "  * Key Technologies / Skills\n"
-            "  * Industry Adoption Rate\n"
-            "  * Geographic Demand\n"
-            "\n"
-            "- IMPORTANT:\n"
-            "  * Use realistic, conservative estimates aligned with reputable industry reports.\n"
-            "  * If exact figures are unavailable, provide clearly stated approximate ranges.\n"
-            "  * DO NOT fabricate precise statistics or cite fake reports.\n"
-        ),
-        "4. Recommended Internships": (
-            "SECTION-SPECIFIC REQUIREMENTS:\n"
-            "- Organize by CAREER ROLE with clear role headings\n"
-            "- For each role, provide a TABLE with columns: Internship Type | Industries (Small/Medium/Large) | Expected Outcomes\n"
-            "- Structure:\n"
-            "  **For [Career Role Name]:**\n"
-            "  \n"
-            "  Table with:\n"
-            "  - Internship Type: Specific internship position (e.g., 'Data Analysis Intern', 'ML Engineering Intern')\n"
-            "  - Industries: List industries across different scales:\n"
-            "    * Small: Startups, boutique firms (mention 2-3 types)\n"
-            "    * Medium: Mid-sized companies, regional firms (mention 2-3 types)\n"
-            "    * Large: Fortune 500, multinational corporations (mention 2-3 types)\n"
-            "  - Expected Outcomes: 3-4 key learning outcomes from that internship type\n"
-            "- DO NOT use 'Point 1', 'Point 2' - use meaningful internship type names\n"
-            "- Provide 5-8 internship types per role\n"
-            "- Include application pipeline advice at the end (application strategy, platforms, timing)\n"
-        ),
-        "5. Professional Networking and Industry Associations": (
-            "SECTION-SPECIFIC REQUIREMENTS - OUTPUT STRUCTURED FORMAT (NOT MARKDOWN TABLE):\n"
-            "\n"
-            "For EACH entered career role, output in this EXACT format:\n"
-            "\n"
-            "For [Career Role Name]:\n"
-            "\n"
-            "Professional Associations:\n"
-            "- [Association 1]\n"
-            "- [Association 2]\n"
-            "- [Association 3]\n"
-            "- [Association 4]\n"
-            "- [Association 5]\n"
-            "\n"
-            "Industry Events:\n"
-            "- [Event/Conference 1]\n"
-            "- [Event/Conference 2]\n"
-            "- [Event/Conference 3]\n"
-            "- [Event/Conference 4]\n"
-            "- [Event/Conference 5]\n"
-            "\n"
-            "Networking Strategy:\n"
-            "- [Strategy 1]\n"
-            "- [Strategy 2]\n"
-            "- [Strategy 3]\n"
-            "- [Strategy 4]\n"
-            "- [Strategy 5]\n"
-            "\n"
-            "[Leave blank line between roles]\n"
-            "\n"
-            "DO NOT CREATE MARKDOWN TABLES. DO NOT USE PIPES |\n"
-            "Use bullet points (- ) for each item.\n"
-        ),
-        "6. Guidelines for Progress Monitoring & Support": (
-            "SECTION-SPECIFIC REQUIREMENTS:\n"
-            "- Create a HORIZONTAL comparison table with this structure:\n"
-            "  | Aspect | [Career Role 1] | [Career Role 2] | [Career Role 3] |\n"
-            "- Rows (Aspects) should include:\n"
-            "  * Strategy (how to develop strategic skills for this role)\n"
-            "  * Observation (practice exercises for observation skills)\n"
-            "  * Balance (work-life balance techniques)\n"
-            "  * Intellect (learning and problem-solving approaches)\n"
-            "  * Expression (communication skill development)\n"
-            "  * Execution (project delivery methods)\n"
-            "  * KPIs (key performance indicators to track)\n"
-            "  * Mentorship (how to find mentors)\n"
-            "  * Self-Assessment (monthly review checklist)\n"
-            "  * Feedback Loops (peer review, mock interviews, portfolio reviews)\n"
-            "- This format allows EASY COMPARISON across all career roles\n"
-            "- Keep each cell concise but actionable (2-3 sentences max)\n"
-        ),
-        # Development report sections remain the same
-        "1. Academic Interventions": (
-            "SECTION-SPECIFIC REQUIREMENTS - OUTPUT STRUCTURED FORMAT (NOT MARKDOWN TABLE):\\n"
-            "\\n"
-            "Create a 3-year academic intervention plan WITH CONTENT FOR EVERY SINGLE MONTH (all 12 months each year).\\n"
-            "You MUST output in this EXACT structure so it can be converted to Word tables:\\n"
-            "\\n"
-            "Year 1:\\n"
-            "- Month: January\\n"
-            " Activity: [what needs to be done]\\n"
-            " Technical Skills: [comma-separated skills]\\n"
-            " Soft Skills: [comma-separated skills]\\n"
-            " Learning Material: [courses, books, platforms]\\n"
-            " Objective: [1–2 line objective]\\n"
-            "\\n"
-            "- Month: February\\n"
-            " Activity: [...]\\n"
-            " Technical Skills: [...]\\n"
-            " Soft Skills: [...]\\n"
-            " Learning Material: [...]\\n"
-            " Objective: [...]\\n"
-            "\\n"
-            "- Month: March\\n"
-            "- Month: April\\n"
-            "- Month: May\\n"
-            "- Month: June\\n"
-            "- Month: July\\n"
-            "- Month: August\\n"
-            "- Month: September\\n"
-            "- Month: October\\n"
-            "- Month: November\\n"
-            "- Month: December\\n"
-            "\\n"
-
-            "[For each month: Activity, Technical Skills, Soft Skills, Learning Material, Objective]\\n"
-            "\\n"
-            "Year 2:\\n"
-            "[Repeat EXACT same month-by-month structure for ALL 12 months (January-December) with different content]\\n"
-            "\\n"
-            "Year 3:\\n"
-            "[Repeat EXACT same month-by-month structure for ALL 12 months (January-December) with different content]\\n"
-            "\\n"
-
-            "CRITICAL RULES:\\n"
-            "- MUST include ALL 12 months for each year (January through December).\\n"
-            "- Each month MUST have: Activity, Technical Skills, Soft Skills, Learning Material, Objective.\\n"
-            "- DO NOT use markdown tables.\\n"
-            "- DO NOT use pipes |.\\n"
-            "- Use only the labels: Month, Activity, Technical Skills, Soft Skills, Learning Material, Objective.\\n"
-            "- Ensure indentation exactly as shown (- Month, then 2-space indented fields).\\n"
-            "- Make each month's content UNIQUE and PROGRESSIVE through the year.\\n"
-        ),
+def build_prompt_plan(report_type, inputs, pruned=None, variants=None):
+    """
+    Compiles every section prompt of a report once, so the generator only
+    looks prompts up instead of rebuilding all of them on each step.
+    variants maps headings to the blueprint variant drawn for this report.
+    Returns (plan, build_ms) where plan maps section heading -> prompt.
+    """
+    variants = variants or {}
+    started = time.perf_counter()
+
+    # One snapshot for the whole plan, so a reload cannot mix prompt versions within a report
+    templates = prompt_templates.current()
+    student_profile = build_student_profile(inputs, pruned, templates)
+    periods = plan_periods(inputs)
+    plan = {
+        section: build_section_prompt(student_profile, section, templates, variants.get(section), periods)
+        for section in get_report_sections(report_type)
+    }
 
-        "2. Non-Academic Interventions": (
-            "SECTION-SPECIFIC REQUIREMENTS – OUTPUT STRUCTURED FORMAT (NOT MARKDOWN TABLE):\n"
-            "\n"
-            "Create a COMPREHENSIVE 3-YEAR NON-ACADEMIC INTERVENTION PLAN focused on PERSONALITY DEVELOPMENT, LIFE SKILLS, SOCIAL INTELLIGENCE, EMOTIONAL MATURITY, DISCIPLINE, ETHICS, HEALTH, AND REAL-WORLD ADAPTABILITY.\n"
-            "\n"
-            "These interventions MUST NOT be academic courses, degrees, or syllabus-based learning. They must focus on experiential learning, behavioral conditioning, exposure-based growth, habit formation, emotional regulation, leadership readiness, and practical life competence.\n"
-            "\n"
-            "The plan must show CLEAR PROGRESSION across 3 years:\n"
-            "- Year 1: Foundation building, self-awareness, discipline, exposure, basic social and life skills\n"
-            "- Year 2: Skill strengthening, responsibility, leadership exposure, stress handling, independence\n"
-            "- Year 3: Maturity, strategic thinking, resilience, ethical grounding, real-world readiness\n"
-            "\n"
-            "You MUST output in the EXACT structure below so it can be directly converted into Word tables. DO NOT change labels, order, or wording of fields.\n"
-            "\n"
-
-            "Year 1:\\n"
-            "- Month: January\\n"
-            " Activity: [clearly defined non-academic activity focused on behavior, exposure, or life skill development]\\n"
-            " Technical Skills: [practical real-world skills such as organization, planning, observation, coordination, basic tools, systems thinking – comma-separated]\\n"
-            " Soft Skills: [behavioral and psychological skills such as discipline, confidence, empathy, adaptability, communication – comma-separated]\\n"
-            " Learning Outcome: [specific capability, behavior change, or internal skill the student will develop]\\n"
-            " Objective: [1–2 lines explaining WHY this activity is included and what developmental gap it addresses]\\n"
-            "\\n"
-            "- Month: February\\n"
-            "- Month: March\\n"
-            "- Month: April\\n"
-            "- Month: May\\n"
-            "- Month: June\\n"
-            "- Month: July\\n"
-            "- Month: August\\n"
-            "- Month: September\\n"
-            "- Month: October\\n"
-            "- Month: November\\n"
-            "- Month: December\\n"
-            "\\n"
-            "[For EVERY month, you MUST provide ALL of the following: Activity, Technical Skills, Soft Skills, Learning Outcome, Objective. No field can be skipped.]\\n"
-            "\\n"
-
-            "Year 2:\\n"
-            "Repeat the EXACT SAME STRUCTURE as Year 1 with ALL 12 months (January–December).\\n"
-            "Year 2 activities must be MORE DEMANDING than Year 1 and focus on responsibility, leadership exposure, social confidence, stress tolerance, decision-making, and independence.\\n"
-            "\\n"
-
-            "Year 3:\\n"
-            "Repeat the EXACT SAME STRUCTURE as Year 1 with ALL 12 months (January–December).\\n"
-            "Year 3 activities must reflect MATURITY and REAL-WORLD READINESS, including leadership ownership, ethical judgment, resilience under pressure, strategic thinking, and long-term self-management.\\n"
-            "\\n"
-
-            "CRITICAL RULES (NON-NEGOTIABLE):\\n"
-            "- ALL 3 years MUST include ALL 12 months from January to December.\\n"
-            "- EACH MONTH MUST include ALL FIVE fields: Activity, Technical Skills, Soft Skills, Learning Outcome, Objective.\\n"
-            "- Use the field name EXACTLY as 'Learning Outcome' (do NOT use learning material, resources, or books).\\n"
-            "- NO academic subjects, exams, degrees, certifications, or classroom-style learning.\\n"
-            "- Content must be NON-REPETITIVE, LOGICALLY PROGRESSIVE, and DEVELOPMENTALLY COHERENT across months and years.\\n"
-            "- Activities must clearly contribute to emotional maturity, discipline, social competence, self-awareness, resilience, leadership, health, ethics, and life preparedness.\\n"
-            "- Output must be plain text only, no markdown tables, no symbols, no pipes.\\n"
-        ),
+    build_ms = (time.perf_counter() - started) * 1000
+    return plan, build_ms
 
-        "3. Habit Reengineering": (
-            "SECTION-SPECIFIC REQUIREMENTS - OUTPUT STRUCTURED FORMAT (NOT MARKDOWN TABLE):\n"
-            "\n"
-            "Design a structured 3-year habit reengineering plan focused on long-term student development.\n"
-            "The plan should gradually build consistency, discipline, self-regulation, learning habits, and responsibility using small, repeatable actions rather than motivation.\n"
-            "Each year must show clear progression from basic routine formation to advanced self-management and independent execution.\n"
-            "\n"
-            "You MUST output content for AT LEAST 6-7 months per year, spread across the year (not consecutive months).\n"
-            "Suggested months to include: January, March, June, September, November, December (+ one additional month of your choice).\n"
-            "\n"
-            "Each month must include ONE primary habit-building focus aligned with academic discipline, personal responsibility, emotional regulation, or learning efficiency.\n"
-            "Activities should be realistic, age-appropriate, and designed to create sustainable daily or weekly habits.\n"
-            "\n"
-            "You MUST output in this EXACT structure:\n"
-            "\n"
-
-            "Year 1:\n"
-            "- Month: January\n"
-            " Activity: [specific habit-building activity or routine]\n"
-            " Action plan: [provide detailed steps to perform the activity]"
-            " Objective: [clear purpose of this habit in 1–2 lines]\n"
-            " Habits to Develop: [comma-separated daily or weekly habits]\n"
-            " Soft Skills: [comma-separated behavioral or personal skills]\n"
-            " Learning Outcomes: [observable outcomes or behavioral improvements]\n"
-            "\n"
-            "- Month: March\n"
-            "- Month: June\n"
-            "- Month: September\n"
-            "- Month: November\n"
-            "- Month: December\n"
-            "\n"
-            "Year 2:\n"
-            "Repeat the same structure with AT LEAST 6-7 months spread across the year.\n"
-            "Content must reflect higher responsibility, improved consistency, better time management, and increased self-awareness compared to Year 1.\n"
-            "\n"
-            "Year 3:\n"
-            "Repeat the same structure with AT LEAST 6-7 months spread across the year.\n"
-            "Content must focus on autonomy, long-term planning, self-discipline without supervision, and preparation for academic or career transitions.\n"
-            "\n"
-
-            "RULES:\n"
-            "- Include at least 6-7 months per year (NOT all 12), spread throughout the year.\n"
-            "- Use EXACT field names: Month, Activity, Action Plan, Objective, Habits to Develop, Soft Skills, Learning Outcomes.\n"
-            "- No markdown tables, no pipes, no bullet nesting.\n"
-            "- Each month's content must be UNIQUE, practical, and PROGRESSIVE across years.\n"
-        ),
+def generate_section_prompts(report_type, inputs):
+    """List of section prompts in heading order (kept for existing callers)"""
+    plan, _ = build_prompt_plan(report_type, inputs)
+    return list(plan.values())
 
-        "4. Physical Grooming": (
-            "SECTION-SPECIFIC REQUIREMENTS - OUTPUT STRUCTURED FORMAT (NOT MARKDOWN TABLE):\n"
-            "\n"
-            "Create a 3-year PHYSICAL GROOMING PLAN focused on HEALTH, DISCIPLINE, ENERGY MANAGEMENT, POSTURE, PROFESSIONAL PRESENCE, AND STRESS REGULATION.\n"
-            "\n"
-            "Physical Grooming must be treated as a DEVELOPMENTAL FOUNDATION that supports mental clarity, confidence, consistency, and long-term career readiness — not as fitness training or fashion alone.\n"
-            "\n"
-            "Activities should address: daily physical discipline, posture and body awareness, hygiene and self-care routines, nutrition and sleep regulation, physical confidence, stress reduction, and professional appearance readiness.\n"
-            "\n"
-            "You MUST output content for AT LEAST 6-7 months per year, spread across the year (NOT consecutive months), to reflect phased and sustainable physical development.\n"
-            "Suggested months to include: January, April, June, September, October, December.\n"
-            "\n"
-            "You MUST output in this EXACT structure:\n"
-            "\n"
-            "Year 1:\n"
-            "- Month: January\n"
-            " Activity: [physical grooming activity focused on body awareness, routine formation, or basic health discipline]\n"
-            " Objective: [1–2 lines explaining how this activity builds physical discipline, energy, confidence, or readiness]\n"
-            " Physical & Mental Skills Developed: [comma-separated skills such as stamina, posture, focus, balance, stress control]\n"
-            " Soft Skills: [comma-separated skills such as self-discipline, confidence, consistency, self-awareness]\n"
-            " Learning Outcomes: [clear outcomes related to physical stability, mental clarity, and personal presentation]\n"
-            "\n"
-            "- Month: April\n"
-            "- Month: June\n"
-            "- Month: September\n"
-            "- Month: October\n"
-            "- Month: December\n"
-            "\n"
-            "Year 2:\n"
-            "Repeat the SAME structure with AT LEAST 6-7 months spread throughout the year.\n"
-            "Year 2 activities must show PROGRESSION toward improved stamina, posture, stress tolerance, hygiene discipline, and professional appearance.\n"
-            "\n"
-            "Year 3:\n"
-            "Repeat the SAME structure with AT LEAST 6-7 months spread throughout the year.\n"
-            "Year 3 activities must reflect MATURITY, SELF-MANAGEMENT, LEADERSHIP PRESENCE, AND LONG-TERM PHYSICAL SUSTAINABILITY.\n"
-            "\n"
-            "RULES:\n"
-            "- Include at least 6-7 months per year, spread across the year (NOT all 12 months).\n"
-            "- Use EXACT field names: Month, Activity, Objective, Physical & Mental Skills Developed, Soft Skills, Learning Outcomes.\n"
-            "- No markdown tables, no pipes.\n"
-            "- Each month's content must be UNIQUE, PURPOSEFUL, and DEVELOPMENTALLY PROGRESSIVE across the 3 years.\n"
-            ),
-
-        "5. Psychological Grooming": (
-            "SECTION-SPECIFIC REQUIREMENTS - OUTPUT STRUCTURED FORMAT (NOT MARKDOWN TABLE):\n"
-            "\n"
-            "Create a 3-year PSYCHOLOGICAL GROOMING PLAN focused on EMOTIONAL REGULATION, MENTAL CLARITY, STRESS MANAGEMENT, RESILIENCE, DECISION-MAKING, AND SELF-DISCIPLINE.\n"
-            "\n"
-            "Psychological Grooming must support sustained academic and career performance by strengthening emotional stability, pressure tolerance, motivation continuity, self-awareness, and reflective thinking.\n"
-            "\n"
-            "Activities should address: emotional awareness and control, stress response management, cognitive clarity, failure handling, motivation sustainability, confidence stabilization, and self-reflection.\n"
-            "\n"
-            "You MUST output content for AT LEAST 6-7 months per year, spread across the year (NOT consecutive months), to allow gradual and sustainable psychological development.\n"
-            "Suggested months to include: January, February, June, August, November, December.\n"
-            "\n"
-            "You MUST output in this EXACT structure:\n"
-            "\n"
-
-            "Year 1:\\n"
-            "- Month: January\\n"
-            " Activity: [psychological grooming activity focused on self-awareness, emotional regulation, or mental discipline]\\n"
-            " Objective: [1–2 lines explaining how this activity improves mental stability, focus, or emotional control]\\n"
-            " Psychological Skills Developed: [comma-separated skills such as emotional regulation, focus, resilience, stress tolerance]\\n"
-            " Soft Skills: [comma-separated skills such as self-discipline, confidence, adaptability, responsibility]\\n"
-            " Learning Outcomes: [clear outcomes related to emotional stability, mental clarity, and behavioral control]\\n"
-            "\\n"
-            "- Month: February\\n"
-            "- Month: June\\n"
-            "- Month: August\\n"
-            "- Month: November\\n"
-            "- Month: December\\n"
-            "\\n"
-            "Year 2:\\n"
-            "Repeat the SAME structure with AT LEAST 6-7 months spread throughout the year.\\n"
-            "Year 2 activities must show PROGRESSION toward stress resilience, decision-making maturity, motivation stability, and pressure handling.\\n"
-            "\\n"
-
-            "Year 3:\\n"
-            "Repeat the SAME structure with AT LEAST 6-7 months spread throughout the year.\\n"
-            "Year 3 activities must reflect PSYCHOLOGICAL MATURITY, SELF-REGULATION, RESPONSIBILITY OWNERSHIP, AND LONG-TERM MENTAL ENDURANCE.\\n"
-            "\\n"
-
-            "RULES:\\n"
-            "- Include at least 6-7 months per year, spread across the year (NOT all 12 months).\\n"
-            "- Use EXACT field names: Month, Activity, Objective, Psychological Skills Developed, Soft Skills, Learning Outcomes.\\n"
-            "- No markdown tables, no pipes.\\n"
-            "- Each month's content must be UNIQUE, PURPOSEFUL, and PROGRESSIVELY BUILD psychological strength across the 3 years.\\n"
-        ),
+# =============================================================================
+# PROMPT VARIANT EXPERIMENTS
+# =============================================================================
 
-        "6. Suggested Reading": (
-            "SECTION-SPECIFIC REQUIREMENTS - OUTPUT STRUCTURED FORMAT (NOT MARKDOWN TABLE):\\n"
-            "\\n"
-            "You MUST output AT LEAST 15 books (minimum 15, preferably 18-20).\\n"
-            "\\n"
-            "CRITICAL BOOK SELECTION RULES:\\n"
-            "- ALL books MUST be AVAILABLE IN INDIA (physically or as e-books on Amazon India, Flipkart, or popular Indian bookstores).\\n"
-            "- DO NOT suggest books that are out of print, region-locked, or unavailable in India.\\n"
-            "- DO NOT HALLUCINATE or make up book titles. ONLY suggest REAL, VERIFIED, FAMOUS books.\\n"
-            "- Books should be a BALANCED MIX of:\\n"
-            "  * TECHNICAL/DOMAIN BOOKS (50-60%): Directly related to the career role (e.g., finance, programming, data science, management).\\n"
-            "  * SOFT SKILLS BOOKS (40-50%): Communication, leadership, emotional intelligence, productivity, mindset, time management, professional development.\\n"
-            "\\n"
-            "OUTPUT FORMAT (row-wise blocks with these EXACT fields):\\n"
-            "\\n"
-            "- Book Name: [title]\\n"
-            "  Author: [author name]\\n"
-            "  Publication: [publisher or edition]\\n"
-            "  Availability in India: [Mention 'Available on Amazon India/Flipkart/Meesho' or specific Indian publisher]\\n"
-            "  Why Should This Book Be Read?: [1–2 lines explaining relevance to their career AND skill development]\\n"
-            "\\n"
-            "[Repeat the above block for EACH BOOK - minimum 15 books, aim for 18-20]\\n"
-            "\\n"
-            "ORGANIZATION:\\n"
-            "- Organize books by categories:\\n"
-            "  **TECHNICAL/DOMAIN BOOKS** (8-10 books)\\n"
-            "  **SOFT SKILLS & PROFESSIONAL DEVELOPMENT BOOKS** (7-10 books)\\n"
-            "\\n"
-            "CRITICAL RULES:\\n"
-            "- MINIMUM 15 books. Aim for 18-20 books.\\n"
-            "- Each book MUST include all 5 fields: Book Name, Author, Publication, Availability in India, Why Should This Book Be Read?.\\n"
-            "- Make 'Why Should This Book Be Read?' specific to their career/skills (not generic).\\n"
-            "- VERIFY that books are famous, well-reviewed, and actually available in India.\\n"
-            "- Include ISBN or edition details if helpful for verification.\\n"
-            "- No markdown tables, no pipes.\\n"
-        ),
+# Alternate blueprints (prompts/sections/<slug>@<variant>.txt) receive the share of
+# reports given here, e.g. "health_discipline@lean=0.5,academic_interventions@short=0.2";
+# the rest keep the base blueprint. Each report draws once per section, so retries
+# and continuations stay on the same variant.
+PROMPT_VARIANT_TRAFFIC = os.getenv("PROMPT_VARIANT_TRAFFIC", "")
+PROMPT_VARIANT_DB = os.getenv("PROMPT_VARIANT_DB", os.path.join("cache", "prompt_variants.sqlite3"))
+BASE_PROMPT_VARIANT = "base"
+
+def parse_variant_traffic(spec):
+    """{slug: {variant: share}} from "slug@variant=share,..."; shares of one slug are scaled down to sum to 1"""
+    traffic = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        match = re.fullmatch(r'([a-z0-9_]+)@([\w-]+)\s*=\s*([0-9.]+)', entry)
+        if not match or match.group(2) == BASE_PROMPT_VARIANT:
+            print(f"[PROMPTS] ⚠ Ignoring prompt variant traffic entry '{entry}'")
+            continue
+        traffic.setdefault(match.group(1), {})[match.group(2)] = float(match.group(3))
+    for slug, shares in traffic.items():
+        total = sum(shares.values())
+        if total > 1:
+            print(f"[PROMPTS] ⚠ Variant shares for {slug} add up to {total:g}; scaling them to 1")
+            traffic[slug] = {variant: share / total for variant, share in shares.items()}
+    return traffic
 
-        "7. Health Discipline": (
-            "SECTION-SPECIFIC REQUIREMENTS - OUTPUT STRUCTURED FORMAT (NOT MARKDOWN TABLE):\\n"
-            "\\n"
-            "CRITICAL: You MUST provide recommendations for ALL FOUR categories in this EXACT order:\\n"
-            "1. FOOD (6-8 recommendations)\\n"
-            "2. SLEEPING DISCIPLINE (5-6 recommendations)\\n"
-            "3. HYDRATION (4-5 recommendations)\\n"
-            "4. LIFESTYLE (5-6 recommendations)\\n"
-            "\\n"
-            "Recommendations across ALL 4 categories. DO NOT skip any category.\\n"
-            "\\n"
-            "===== CATEGORY 1: FOOD =====\\n"
-            "Provide 6-8 specific food recommendations with these sub-categories:\\n"
-            "- Balanced Diet with Whole Foods\\n"
-            "- Morning: Warm Lemon Water & Soaked Nuts\\n"
-            "- Breakfast: Protein-Rich Meal (Besan Chilla, Paneer Paratha)\\n"
-            "- Mid-Morning Snack: Fruits (Banana, Apple, Orange, Papaya, Dry Fruits)\\n"
-            "- Lunch: Dal, Roti, Rice, Green Vegetables, Salad, Curd\\n"
-            "- Evening Snack: Herbal Tea & Roasted Makhana or Nuts\\n"
-            "- Dinner: Light Meal (Khichdi, Vegetable Soup, Multigrain Roti with Sabzi)\\n"
-            "- Bedtime: Warm Milk with Turmeric or Ashwagandha\\n"
-            "\\n"
-            "For each, output:\\n"
-            "- Category: Food\\n"
-            "  Recommendation: [specific food/meal]\\n"
-            "  Benefits for Mental Health: [1-2 lines]\\n"
-            "  Benefits for Physical Health: [1-2 lines]\\n"
-            "\\n"
-            "===== CATEGORY 2: SLEEPING DISCIPLINE =====\\n"
-            "Provide 5-6 specific sleep recommendations:\\n"
-            "- Maintaining a Fixed Sleep Schedule (10 PM - 6 AM)\\n"
-            "- Avoiding Screens 1 Hour Before Bed\\n"
-            "- Practicing Nighttime Meditation/Deep Breathing\\n"
-            "- Using Dim Lights Before Sleeping\\n"
-            "- Avoiding Heavy or Spicy Meals\\n"
-            "\\n"
-            "For each, output:\\n"
-            "- Category: Sleeping Discipline\\n"
-            "  Recommendation: [specific practice]\\n"
-            "  Benefits for Mental Health: [1-2 lines]\\n"
-            "  Benefits for Physical Health: [1-2 lines]\\n"
-            "\\n"
-            "===== CATEGORY 3: HYDRATION ===== (MANDATORY - DO NOT SKIP)\\n"
-            "Provide 4-5 specific hydration recommendations:\\n"
-            "- Daily water intake target: 8-10 glasses (2.5-3 liters)\\n"
-            "- Morning hydration: 2 glasses of water upon waking\\n"
-            "- Water intake before meals (20-30 minutes before)\\n"
-            "- Herbal teas: Ginger water, Jeera water, Green tea\\n"
-            "- Avoiding dehydrating beverages: Excessive caffeine, sugary drinks\\n"
-            "\\n"
-            "For each, output:\\n"
-            "- Category: Hydration\\n"
-            "  Recommendation: [specific hydration practice]\\n"
-            "  Benefits for Mental Health: [1-2 lines]\\n"
-            "  Benefits for Physical Health: [1-2 lines]\\n"
-            "\\n"
-            "===== CATEGORY 4: LIFESTYLE ===== (MANDATORY - DO NOT SKIP)\\n"
-            "Provide 5-6 specific lifestyle recommendations:\\n"
-            "- Daily physical activity: 30 minutes of yoga, walking, or exercise\\n"
-            "- Screen time management: Limit your screen time\\n"
-            "- Stress management: 10-minute meditation, journaling\\n"
-            "- Social connections: Quality time with family/friends weekly\\n"
-            "- Time with nature: Outdoor walks, sunlight exposure\\n"
-            "- Digital detox: Tech-free hours, weekend detox\\n"
-            "\\n"
-            "For each, output:\\n"
-            "- Category: Lifestyle\\n"
-            "  Recommendation: [specific lifestyle practice]\\n"
-            "  Benefits for Mental Health: [1-2 lines]\\n"
-            "  Benefits for Physical Health: [1-2 lines]\\n"
-            "\\n"
-            "FINAL CHECK BEFORE SUBMISSION:\\n"
-            "- Have you included FOOD category? (6-8 items)\\n"
-            "- Have you included SLEEPING DISCIPLINE category? (5-6 items)\\n"
-            "- Have you included HYDRATION category? (4-5 items)\\n"
-            "- Have you included LIFESTYLE category? (5-6 items)\\n"
-            "\\n"
-            "CRITICAL RULES:\\n"
-            "- ALL 4 categories are MANDATORY. Do not skip any.\\n"
-            "- Each recommendation MUST have all 4 fields: Category, Recommendation, Benefits for Mental Health, Benefits for Physical Health.\\n"
-            "- Be SPECIFIC with examples (not generic).\\n"
-            "- Include Indian food context where relevant.\\n"
-            "- No markdown tables, no pipes.\\n"
-        ),
-    }
+prompt_variant_traffic = parse_variant_traffic(PROMPT_VARIANT_TRAFFIC)
 
-    prompts = []
+def assign_prompt_variants(sections, seed, templates=None):
+    """
+    {section: variant} for the sections with a registered variant that gets traffic
+    (BASE_PROMPT_VARIANT when the draw lands outside every variant's share).
+    The draw is a hash of seed and heading, so one report always gets the same answer.
+    """
+    templates = templates or prompt_templates.current()
+    assigned = {}
     for section in sections:
-        blueprint = section_blueprints.get(section, "Include section-specific actionable steps aligned to the heading.")
-        
-        prompts.append(
-            base_prompt +
-            f"{blueprint}\n"
-            "WRITE ONLY THE FOLLOWING SECTION, using the exact heading text as the first line:\n"
-            f"{section}\n"
+        slug = prompt_template_slug(section)
+        arms = [(variant, share) for variant, share in prompt_variant_traffic.get(slug, {}).items()
+                if variant in templates.variants.get(slug, {})]
+        if not arms:
+            continue
+        point = int(hashlib.sha256(f"{seed}:{slug}".encode()).hexdigest()[:8], 16) / 0x100000000
+        assigned[section] = BASE_PROMPT_VARIANT
+        for variant, share in arms:
+            if point < share:
+                assigned[section] = variant
+                break
+            point -= share
+    return assigned
+
+def begin_variant_attempt(state, section_name):
+    """Starts metering one generation attempt when the section is under a prompt experiment"""
+    if section_name not in (state.get('prompt_variants') or {}):
+        _variant_usage_meter.set(None)
+        return
+    meter = state.get('variant_meter') or {}
+    if meter.get('section') != section_name:
+        meter = {'section': section_name, 'attempts': 0, 'passed': 0,
+                 'prompt_tokens': 0, 'completion_tokens': 0, 'seconds': 0.0}
+    meter['started'] = time.perf_counter()
+    state['variant_meter'] = meter
+    _variant_usage_meter.set(meter)
+
+def end_variant_attempt(state, is_valid):
+    """Closes the metered attempt with its validation outcome (no-op for unmetered sections)"""
+    _variant_usage_meter.set(None)
+    meter = state.get('variant_meter') or {}
+    if meter.get('section') != state['current_section_name'] or 'started' not in meter:
+        return
+    meter['seconds'] += time.perf_counter() - meter.pop('started')
+    meter['attempts'] += 1
+    meter['passed'] += int(bool(is_valid))
+
+def table_parse_succeeds(report_type, section_name, content):
+    """Whether the section's create_*_table renderer builds its table from this text (None: not a table section)"""
+    body = content.split("\n", 1)[1] if content.startswith(section_name) and "\n" in content else content
+    try:
+        converted = parse_section_to_table(section_name, body, Document(), report_type)
+    except Exception:
+        return False
+    return None if converted is None else bool(converted)
+
+class PromptVariantStats:
+    """Per (heading, variant, blueprint revision) outcome totals in SQLite, shared by all workers"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS prompt_variant_stats ("
+                " section TEXT, variant TEXT, revision TEXT, sections INTEGER, attempts INTEGER,"
+                " passed INTEGER, retries INTEGER, parse_checked INTEGER, parsed INTEGER,"
+                " prompt_tokens INTEGER, completion_tokens INTEGER, seconds REAL, updated_at REAL,"
+                " PRIMARY KEY (section, variant, revision))"
+            )
+            conn.commit()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def record(self, section, variant, revision, meter, retries, parsed):
+        conn = self._connection()
+        conn.execute(
+            "INSERT INTO prompt_variant_stats (section, variant, revision, sections, attempts, passed, retries,"
+            " parse_checked, parsed, prompt_tokens, completion_tokens, seconds, updated_at)"
+            " VALUES (?, ?, ?, 1, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT (section, variant, revision) DO UPDATE SET"
+            " sections = sections + 1,"
+            " attempts = attempts + excluded.attempts,"
+            " passed = passed + excluded.passed,"
+            " retries = retries + excluded.retries,"
+            " parse_checked = parse_checked + excluded.parse_checked,"
+            " parsed = parsed + excluded.parsed,"
+            " prompt_tokens = prompt_tokens + excluded.prompt_tokens,"
+            " completion_tokens = completion_tokens + excluded.completion_tokens,"
+            " seconds = seconds + excluded.seconds,"
+            " updated_at = excluded.updated_at",
+            (section, variant, revision, meter['attempts'], meter['passed'], retries,
+             int(parsed is not None), int(bool(parsed)), meter['prompt_tokens'], meter['completion_tokens'],
+             meter['seconds'], time.time())
+        )
+        conn.commit()
+
+    def stats(self):
+        """Rows with per-section averages and rates, fastest first within each heading"""
+        rows = [dict(row) for row in self._connection().execute(
+            "SELECT * FROM prompt_variant_stats ORDER BY section, seconds / sections")]
+        for row in rows:
+            row['validation_pass_rate'] = round(row['passed'] / row['attempts'], 3) if row['attempts'] else 0.0
+            row['parse_success_rate'] = round(row['parsed'] / row['parse_checked'], 3) if row['parse_checked'] else None
+            row['avg_retries'] = round(row['retries'] / row['sections'], 2)
+            row['avg_prompt_tokens'] = round(row['prompt_tokens'] / row['sections'], 1)
+            row['avg_completion_tokens'] = round(row['completion_tokens'] / row['sections'], 1)
+            row['avg_seconds'] = round(row['seconds'] / row['sections'], 2)
+        return rows
+
+prompt_variant_stats = PromptVariantStats(PROMPT_VARIANT_DB)
+
+def record_variant_section(state):
+    """Adds a finished section under a prompt experiment to its variant's totals"""
+    section_name = state['current_section_name']
+    variant = (state.get('prompt_variants') or {}).get(section_name)
+    meter = state.get('variant_meter') or {}
+    if variant is None or meter.get('section') != section_name or not meter.get('attempts'):
+        return  # not under an experiment, or served from the cache
+    
+    parsed = table_parse_succeeds(state['report_type'], section_name, state['current_section_content'])
+    revision = content_hash(prompt_templates.blueprint(section_name, variant))[:12]
+    try:
+        prompt_variant_stats.record(section_name, variant, revision, meter, state['retry_count'], parsed)
+    except sqlite3.Error as e:
+        agent_log(f"[PROMPTS] ⚠ Could not record prompt variant stats: {e}")
+        return
+    agent_log(f"[PROMPTS] {section_name} [{variant}]: {meter['attempts']} attempt(s), "
+              f"{meter['prompt_tokens']}+{meter['completion_tokens']} tokens, {meter['seconds']:.1f}s, "
+              f"parse {'n/a' if parsed is None else ('ok' if parsed else 'failed')}")
+
+# =============================================================================
+# REPORT JOB QUEUE
+# =============================================================================
+
+JOB_DB = os.getenv("JOB_DB", os.path.join("cache", "jobs.sqlite3"))
+JOB_WORKERS = max(1, int(os.getenv("JOB_WORKERS", "4")))
+JOB_MAX_PENDING = max(1, int(os.getenv("JOB_MAX_PENDING", "100")))
+JOB_DRAIN_TIMEOUT = float(os.getenv("JOB_DRAIN_TIMEOUT", "300"))
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", str(7 * 24 * 3600)))
+JOB_RECOVERY_SECONDS = float(os.getenv("JOB_RECOVERY_SECONDS", "30"))
+
+JOB_FINISHED_STATES = ('succeeded', 'failed')
+
+class JobQueueFull(Exception):
+    """Raised when the pending-job bound is reached or the queue is draining"""
+
+def _pid_alive(pid):
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+class ReportJobStore:
+    """
+    Job rows in SQLite, shared by every worker process. owner_pid records which
+    process holds a queued or running job so orphans can be recovered.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS report_jobs ("
+                " id TEXT PRIMARY KEY, status TEXT, report_type TEXT, payload TEXT,"
+                " owner_pid INTEGER, sections_total INTEGER DEFAULT 0, sections_done INTEGER DEFAULT 0,"
+                " filename TEXT, content TEXT, error TEXT,"
+                " created_at REAL, started_at REAL, finished_at REAL)"
+            )
+            columns = {row['name'] for row in conn.execute("PRAGMA table_info(report_jobs)")}
+            if 'batch_id' not in columns:
+                conn.execute("ALTER TABLE report_jobs ADD COLUMN batch_id TEXT")
+                conn.execute("ALTER TABLE report_jobs ADD COLUMN batch_row INTEGER")
+            conn.execute("CREATE INDEX IF NOT EXISTS report_jobs_status ON report_jobs(status)")
+            conn.execute("CREATE INDEX IF NOT EXISTS report_jobs_batch ON report_jobs(batch_id, batch_row)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS report_batches ("
+                " id TEXT PRIMARY KEY, status TEXT, report_type TEXT, total INTEGER,"
+                " archive TEXT, created_at REAL, finished_at REAL)"
+            )
+            if 'error' not in {row['name'] for row in conn.execute("PRAGMA table_info(report_batches)")}:
+                conn.execute("ALTER TABLE report_batches ADD COLUMN error TEXT")
+            conn.commit()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def create(self, job_id, report_type, inputs, parallel):
+        conn = self._connection()
+        conn.execute(
+            "INSERT INTO report_jobs (id, status, report_type, payload, owner_pid, created_at)"
+            " VALUES (?, 'queued', ?, ?, ?, ?)",
+            (job_id, report_type, json.dumps({'inputs': inputs, 'parallel': parallel}), os.getpid(), time.time()),
+        )
+        conn.commit()
+
+    def create_batch(self, batch_id, report_type, rows, parallel):
+        """Inserts the batch and one queued job per roster row in a single transaction"""
+        conn = self._connection()
+        now = time.time()
+        job_ids = [uuid.uuid4().hex for _ in rows]
+        with conn:
+            conn.execute(
+                "INSERT INTO report_batches (id, status, report_type, total, created_at) VALUES (?, 'running', ?, ?, ?)",
+                (batch_id, report_type, len(rows), now),
+            )
+            conn.executemany(
+                "INSERT INTO report_jobs (id, status, report_type, payload, owner_pid, created_at, batch_id, batch_row)"
+                " VALUES (?, 'queued', ?, ?, ?, ?, ?, ?)",
+                [
+                    (job_id, report_type, json.dumps({'inputs': inputs, 'parallel': parallel}), os.getpid(), now, batch_id, row)
+                    for row, (job_id, inputs) in enumerate(zip(job_ids, rows), start=1)
+                ],
+            )
+        return job_ids
+
+    def get(self, job_id):
+        row = self._connection().execute("SELECT * FROM report_jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def get_batch(self, batch_id):
+        row = self._connection().execute("SELECT * FROM report_batches WHERE id = ?", (batch_id,)).fetchone()
+        return dict(row) if row else None
+
+    def batch_jobs(self, batch_id):
+        """Job rows of a batch in roster order, without the report bodies"""
+        return [dict(row) for row in self._connection().execute(
+            "SELECT id, status, batch_row, payload, sections_done, sections_total, filename, error,"
+            " started_at, finished_at FROM report_jobs WHERE batch_id = ? ORDER BY batch_row",
+            (batch_id,),
+        )]
+
+    def claim_batch_packaging(self, batch_id):
+        """True for exactly one caller once every job of a running batch has finished"""
+        conn = self._connection()
+        claimed = conn.execute(
+            "UPDATE report_batches SET status = 'packaging' WHERE id = ? AND status = 'running'"
+            " AND NOT EXISTS (SELECT 1 FROM report_jobs WHERE batch_id = ? AND status IN ('queued', 'running'))",
+            (batch_id, batch_id),
+        ).rowcount
+        conn.commit()
+        return bool(claimed)
+
+    def finish_batch(self, batch_id, archive):
+        conn = self._connection()
+        conn.execute(
+            "UPDATE report_batches SET status = 'complete', archive = ?, finished_at = ? WHERE id = ?",
+            (archive, time.time(), batch_id),
+        )
+        conn.commit()
+
+    def fail_batch(self, batch_id, error):
+        conn = self._connection()
+        conn.execute(
+            "UPDATE report_batches SET status = 'failed', error = ?, finished_at = ? WHERE id = ?",
+            (error, time.time(), batch_id),
+        )
+        conn.commit()
+
+    def update(self, job_id, **fields):
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        conn = self._connection()
+        conn.execute(f"UPDATE report_jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+        conn.commit()
+
+    def advance(self, job_id):
+        conn = self._connection()
+        conn.execute("UPDATE report_jobs SET sections_done = sections_done + 1 WHERE id = ?", (job_id,))
+        conn.commit()
+
+    def release(self, job_ids):
+        """Hands queued jobs back to whichever process recovers them next"""
+        conn = self._connection()
+        conn.executemany(
+            "UPDATE report_jobs SET owner_pid = NULL WHERE id = ? AND status = 'queued'",
+            [(job_id,) for job_id in job_ids],
         )
+        conn.commit()
+
+    def claim_orphans(self):
+        """
+        Takes over queued jobs whose owner is gone and fails running ones that
+        died mid-generation. Returns the claimed job ids.
+        """
+        conn = self._connection()
+        pid = os.getpid()
+        claimed = []
+        for row in conn.execute(
+            "SELECT id, status, owner_pid FROM report_jobs WHERE status IN ('queued', 'running')"
+        ).fetchall():
+            if row['owner_pid'] == pid or _pid_alive(row['owner_pid']):
+                continue
+            if row['status'] == 'running':
+                conn.execute(
+                    "UPDATE report_jobs SET status = 'failed', error = ?, finished_at = ?"
+                    " WHERE id = ? AND status = 'running' AND owner_pid IS ?",
+                    ("Worker exited before the report finished", time.time(), row['id'], row['owner_pid']),
+                )
+                continue
+            taken = conn.execute(
+                "UPDATE report_jobs SET owner_pid = ? WHERE id = ? AND status = 'queued' AND owner_pid IS ?",
+                (pid, row['id'], row['owner_pid']),
+            ).rowcount
+            if taken:
+                claimed.append(row['id'])
+        conn.commit()
+        return claimed
+
+    def prune(self, retention_seconds):
+        conn = self._connection()
+        removed = conn.execute(
+            "DELETE FROM report_jobs WHERE status IN ('succeeded', 'failed') AND finished_at <= ?",
+            (time.time() - retention_seconds,),
+        ).rowcount
+        conn.commit()
+        return removed
+
+class ReportJobQueue:
+    """
+    Bounded pool of daemon threads running report jobs off the request path.
+    Threads start on first use and are recreated after a fork; drain() stops
+    intake, lets running jobs finish and releases queued ones for recovery.
+    Idle workers look for orphaned jobs every JOB_RECOVERY_SECONDS.
+    """
+
+    def __init__(self, store, workers, max_pending):
+        self.store = store
+        self.workers = workers
+        self.max_pending = max_pending
+        self._queue = queue.Queue()
+        self._threads = []
+        self._pid = None
+        self._lock = threading.Lock()
+        self._accepting = True
+        self._running = set()
+        self._recovered_at = None
+
+    def start(self):
+        """Starts the workers in this process (once) and recovers orphaned jobs"""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._running = set()
+                self._accepting = True
+                self._recovered_at = None
+                self._threads = [
+                    threading.Thread(target=self._work, name=f"report-job-{i}", daemon=True)
+                    for i in range(self.workers)
+                ]
+                for thread in self._threads:
+                    thread.start()
+                self._pid = os.getpid()
+                print(f"[JOB QUEUE] ✓ {self.workers} workers started (pid {self._pid})")
+        
+        self.recover_orphans()
+
+    def recover_orphans(self):
+        """
+        Queues jobs released by a draining process or left by a dead one, at
+        most once per JOB_RECOVERY_SECONDS; returns the recovered job ids.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if not self._accepting or (self._recovered_at is not None
+                                       and now - self._recovered_at < JOB_RECOVERY_SECONDS):
+                return []
+            self._recovered_at = now
+        
+        recovered = self.store.claim_orphans()
+        for job_id in recovered:
+            print(f"[JOB QUEUE] Recovered orphaned job {job_id}")
+            self._queue.put(job_id)
+        self.store.prune(JOB_RETENTION_SECONDS)
+        return recovered
+
+    def submit(self, report_type, inputs, parallel=None):
+        self.start()
+        if not self._accepting:
+            raise JobQueueFull("Job queue is shutting down")
+        if self._queue.qsize() >= self.max_pending:
+            raise JobQueueFull(f"Too many pending jobs (limit {self.max_pending})")
+        
+        job_id = uuid.uuid4().hex
+        self.store.create(job_id, report_type, inputs, parallel)
+        self._queue.put(job_id)
+        print(f"[JOB QUEUE] Job {job_id} queued ({self._queue.qsize()} pending)")
+        return job_id
+
+    def submit_batch(self, report_type, rows, parallel=None):
+        """Queues one job per roster row under a shared batch id"""
+        self.start()
+        if not self._accepting:
+            raise JobQueueFull("Job queue is shutting down")
+        
+        # The whole roster counts against the pending bound, up front
+        if self._queue.qsize() + len(rows) > self.max_pending:
+            raise JobQueueFull(f"Batch of {len(rows)} would exceed the pending-job limit "
+                               f"({self._queue.qsize()} pending, limit {self.max_pending})")
+        
+        batch_id = uuid.uuid4().hex
+        job_ids = self.store.create_batch(batch_id, report_type, rows, parallel)
+        for job_id in job_ids:
+            self._queue.put(job_id)
+        print(f"[JOB QUEUE] Batch {batch_id} queued: {len(job_ids)} students ({self._queue.qsize()} pending)")
+        return batch_id
+
+    def _work(self):
+        while True:
+            try:
+                job_id = self._queue.get(timeout=JOB_RECOVERY_SECONDS)
+            except queue.Empty:
+                try:
+                    self.recover_orphans()
+                except Exception as e:
+                    print(f"[JOB QUEUE] ⚠ Orphan recovery failed: {str(e)}")
+                continue
+            if job_id is None:
+                return
+            # A worker must outlive any one job, or the pool silently shrinks
+            try:
+                with self._lock:
+                    draining = not self._accepting
+                    if not draining:
+                        self._running.add(job_id)
+                if draining:
+                    # Leave the job for another process to pick up
+                    self.store.release([job_id])
+                    continue
+                try:
+                    self._run(job_id)
+                finally:
+                    with self._lock:
+                        self._running.discard(job_id)
+            except Exception as e:
+                self._fail(job_id, e)
+
+    def _fail(self, job_id, error):
+        """Marks an unfinished job failed; never raises, so the calling worker keeps looping"""
+        print(f"[JOB QUEUE] ✗ Job {job_id} failed: {str(error)}")
+        traceback.print_exc()
+        try:
+            job = self.store.get(job_id)
+            if job is not None and job['status'] in ('queued', 'running'):
+                self.store.update(job_id, status='failed', error=str(error), finished_at=time.time())
+        except Exception as e:
+            print(f"[JOB QUEUE] ✗ Could not mark job {job_id} failed: {str(e)}")
+
+    def _run(self, job_id):
+        job = self.store.get(job_id)
+        if job is None or job['status'] != 'queued':
+            return
+        
+        def track_progress(event, data):
+            if event == 'plan':
+                self.store.update(job_id, sections_total=len(data['sections']))
+            elif event == 'section_saved':
+                self.store.advance(job_id)
+        
+        register_progress_listener(job_id, track_progress)
+        try:
+            payload = json.loads(job['payload'])
+            self.store.update(job_id, status='running', owner_pid=os.getpid(), started_at=time.time())
+            print(f"[JOB QUEUE] ▶ Job {job_id} started ({job['report_type']})")
+            report_content = generate_report_with_agents(
+                job['report_type'], payload['inputs'], parallel=payload.get('parallel'), run_id=job_id
+            )
+            if job['batch_id']:
+                # Roster row prefix keeps two students with the same name apart
+                filename = generate_word_document(
+                    report_content, job['report_type'], payload['inputs'],
+                    output_dir=batch_output_dir(job['batch_id']),
+                    filename=f"{job['batch_row']:04d}_{report_filename(job['report_type'], payload['inputs'])}",
+                )
+            else:
+                filename = generate_word_document(report_content, job['report_type'], payload['inputs'])
+            self.store.update(job_id, status='succeeded', content=report_content, filename=filename,
+                              finished_at=time.time())
+            print(f"[JOB QUEUE] ✓ Job {job_id} finished: {filename}")
+        except Exception as e:
+            self._fail(job_id, e)
+        finally:
+            unregister_progress_listener(job_id)
+        
+        if job['batch_id']:
+            package_batch_if_complete(job['batch_id'])
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def drain(self, timeout=JOB_DRAIN_TIMEOUT):
+        """Stops intake, waits up to timeout for running jobs and releases the rest"""
+        with self._lock:
+            if self._pid != os.getpid() or not self._accepting:
+                return
+            self._accepting = False
+            running = len(self._running)
+        print(f"[JOB QUEUE] Draining: {running} running, {self._queue.qsize()} queued")
+        
+        released = []
+        while True:
+            try:
+                job_id = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if job_id is not None:
+                released.append(job_id)
+        if released:
+            self.store.release(released)
+        
+        for _ in self._threads:
+            self._queue.put(None)
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        
+        still_running = sum(thread.is_alive() for thread in self._threads)
+        if still_running:
+            print(f"[JOB QUEUE] ⚠ {still_running} jobs still running after {timeout:.0f}s drain timeout")
+        else:
+            print(f"[JOB QUEUE] ✓ Drained ({len(released)} queued jobs released)")
+
+report_job_queue = ReportJobQueue(ReportJobStore(JOB_DB), JOB_WORKERS, JOB_MAX_PENDING)
+atexit.register(report_job_queue.drain)
+
+def describe_job(job):
+    """Public view of a job row (the report body is served by the result endpoint)"""
+    return {
+        'job_id': job['id'],
+        'status': job['status'],
+        'report_type': job['report_type'],
+        'batch_id': job.get('batch_id'),
+        'progress': {'sections_done': job['sections_done'], 'sections_total': job['sections_total']},
+        'error': job['error'],
+        'created_at': job['created_at'],
+        'started_at': job['started_at'],
+        'finished_at': job['finished_at'],
+    }
+
+# =============================================================================
+# CLASS ROSTER BATCHES
+# =============================================================================
+
+BULK_MAX_STUDENTS = int(os.getenv("BULK_MAX_STUDENTS", "1000"))
+BATCH_OUTPUT_DIR = os.path.join('generated_reports', 'batches')
+
+# CSV columns holding lists ("Strategy:14;Observation:10") and the inputs key for their percentages
+ROSTER_LIST_FIELDS = {
+    'highest_skills': 'skillpercentages',
+    'achievement_style': 'achievementpercentages',
+    'learning_communication_style': 'learningpercentages',
+    'quotients': 'quotientpercentages',
+}
+
+class RosterError(ValueError):
+    """Raised when an uploaded roster cannot be turned into report inputs"""
+
+def _roster_row_from_csv(record):
+    """One CSV record -> inputs dict; list cells use ';' and optional ':percentage'"""
+    inputs = {}
+    for column, value in record.items():
+        if column is None:
+            continue
+        column = column.strip()
+        value = (value or '').strip()
+        if value[:1] in ('[', '{'):
+            inputs[column] = json.loads(value)
+        elif column in ROSTER_LIST_FIELDS:
+            items, percentages = [], {}
+            for entry in filter(None, (part.strip() for part in value.split(';'))):
+                name, _, percentage = entry.partition(':')
+                items.append(name.strip())
+                if percentage.strip():
+                    percentages[name.strip()] = float(percentage)
+            inputs[column] = items
+            inputs.setdefault(ROSTER_LIST_FIELDS[column], percentages)
+        else:
+            inputs[column] = value
+    return inputs
+
+def parse_roster(text, fmt=None):
+    """
+    Parses a CSV (header row of inputs keys) or JSONL (one inputs object, or
+    {"inputs": {...}}, per line) roster. fmt is "csv"/"jsonl" or sniffed from
+    the first character. Raises RosterError listing every bad row.
+    """
+    text = text.lstrip('\ufeff')  # Excel saves CSV with a byte order mark
+    fmt = (fmt or ('jsonl' if text.lstrip()[:1] == '{' else 'csv')).lower()
+    rows, errors = [], []
+    
+    if fmt == 'jsonl':
+        for line_number, line in enumerate(text.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                errors.append(f"line {line_number}: {e.msg}")
+                continue
+            rows.append((line_number, record.get('inputs', record) if isinstance(record, dict) else record))
+    elif fmt == 'csv':
+        for line_number, record in enumerate(csv.DictReader(io.StringIO(text)), start=2):
+            try:
+                rows.append((line_number, _roster_row_from_csv(record)))
+            except ValueError as e:
+                errors.append(f"line {line_number}: {str(e)}")
+    else:
+        raise RosterError(f"Unsupported roster format: {fmt}")
+    
+    students = []
+    for line_number, inputs in rows:
+        if not isinstance(inputs, dict):
+            errors.append(f"line {line_number}: expected an object")
+        elif not str(inputs.get('sname', '')).strip():
+            errors.append(f"line {line_number}: missing sname")
+        else:
+            students.append(inputs)
+    
+    if errors:
+        raise RosterError("; ".join(errors[:20]))
+    if not students:
+        raise RosterError("Roster is empty")
+    if len(students) > BULK_MAX_STUDENTS:
+        raise RosterError(f"Roster has {len(students)} students (limit {BULK_MAX_STUDENTS})")
+    return students
+
+def batch_output_dir(batch_id):
+    return os.path.join(BATCH_OUTPUT_DIR, batch_id)
+
+def build_batch_manifest(batch_id):
+    """Per-student status, progress and file for a batch, in roster order"""
+    students = []
+    for job in report_job_queue.store.batch_jobs(batch_id):
+        inputs = json.loads(job['payload'])['inputs']
+        students.append({
+            'row': job['batch_row'],
+            'job_id': job['id'],
+            'sname': inputs.get('sname'),
+            'status': job['status'],
+            'progress': {'sections_done': job['sections_done'], 'sections_total': job['sections_total']},
+            'filename': job['filename'],
+            'error': job['error'],
+            'seconds': round(job['finished_at'] - job['started_at'], 1) if job['finished_at'] and job['started_at'] else None,
+        })
+    return students
+
+def package_batch_if_complete(batch_id):
+    """Once every job has finished, writes manifest.json and a zip of all documents (one caller wins)"""
+    store = report_job_queue.store
+    if not store.claim_batch_packaging(batch_id):
+        return
+    
+    try:
+        archive, manifest = _package_batch(batch_id)
+    except Exception as e:
+        # Otherwise the batch would sit in 'packaging' for good
+        print(f"[BATCH] ✗ Batch {batch_id} packaging failed: {str(e)}")
+        traceback.print_exc()
+        store.fail_batch(batch_id, str(e))
+        return
+    
+    store.finish_batch(batch_id, archive)
+    print(f"[BATCH] ✓ Batch {batch_id} packaged: {manifest['succeeded']}/{manifest['total']} reports")
+
+def _package_batch(batch_id):
+    """Writes manifest.json and the zip; returns (archive path, manifest)"""
+    batch = report_job_queue.store.get_batch(batch_id)
+    students = build_batch_manifest(batch_id)
+    manifest = {
+        'batch_id': batch_id,
+        'report_type': batch['report_type'],
+        'total': batch['total'],
+        'succeeded': sum(student['status'] == 'succeeded' for student in students),
+        'failed': sum(student['status'] == 'failed' for student in students),
+        'students': students,
+    }
+    
+    directory = batch_output_dir(batch_id)
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
     
-    return prompts
+    archive = os.path.abspath(os.path.join(BATCH_OUTPUT_DIR, f"{batch_id}.zip"))
+    with zipfile.ZipFile(archive + '.tmp', 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.write(os.path.join(directory, 'manifest.json'), 'manifest.json')
+        for student in students:
+            if student['filename']:
+                zf.write(os.path.join(directory, student['filename']), student['filename'])
+    os.replace(archive + '.tmp', archive)
+    return archive, manifest
 
 @app.route("/generate-report", methods=["POST"])
 def generate_report():
@@ -1079,24 +4508,28 @@ def generate_report():
         data = request.json
         report_type = data.get("report_type")
         inputs = data.get("inputs")
+        parallel = data.get("parallel")
+        executor = data.get("executor")
         
         if not inputs:
             return jsonify({"error": "No inputs provided"}), 400
+        if executor is not None and executor not in REPORT_EXECUTORS:
+            return jsonify({"error": f"executor must be one of {list(REPORT_EXECUTORS)}"}), 400
         
         print(f"\n{'#'*70}")
-        print(f"# FLASK ENDPOINT: Report Generation Request Received")
+        print("# FLASK ENDPOINT: Report Generation Request Received")
         print(f"# Report Type: {report_type}")
         print(f"# Student: {inputs.get('student_name', 'Unknown')}")
         print(f"{'#'*70}\n")
         
         # Use multi-agent system to generate report
-        report_content = generate_report_with_agents(report_type, inputs)
+        report_content = generate_report_with_agents(report_type, inputs, parallel=parallel, executor=executor)
         
         # Generate Word document (UNCHANGED - preserves exact format)
         filename = generate_word_document(report_content, report_type, inputs)
         
         print(f"\n{'#'*70}")
-        print(f"# FLASK ENDPOINT: Report Generation Complete")
+        print("# FLASK ENDPOINT: Report Generation Complete")
         print(f"# File: {filename}")
         print(f"{'#'*70}\n")
         
@@ -1108,10 +4541,266 @@ def generate_report():
         
     except Exception as e:
         print(f"\n[ERROR] Report generation failed: {str(e)}")
-        import traceback
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
 
+SSE_HEARTBEAT_SECONDS = 15
+
+def format_sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route("/generate-report/stream", methods=["POST"])
+def generate_report_stream():
+    """
+    Server-Sent Events variant of /generate-report. Streams the supervisor plan,
+    section starts, token deltas, validation results, retries and saved
+    sections while the workflow runs, then a final document_ready event.
+    """
+    data = request.json or {}
+    report_type = data.get("report_type")
+    inputs = data.get("inputs")
+    parallel = data.get("parallel")
+    executor = data.get("executor")
+    
+    if not inputs:
+        return jsonify({"error": "No inputs provided"}), 400
+    if executor is not None and executor not in REPORT_EXECUTORS:
+        return jsonify({"error": f"executor must be one of {list(REPORT_EXECUTORS)}"}), 400
+    
+    run_id = uuid.uuid4().hex
+    events = queue.Queue()
+    register_progress_listener(run_id, lambda event, payload: events.put((event, payload)))
+    
+    def run_workflow():
+        try:
+            report_content = generate_report_with_agents(report_type, inputs, parallel=parallel, executor=executor, run_id=run_id)
+            filename = generate_word_document(report_content, report_type, inputs)
+            events.put(("document_ready", {"filename": filename, "content": report_content}))
+        except ReportCancelled as e:
+            print(f"\n[STREAM] ✗ {str(e)}")
+        except Exception as e:
+            print(f"\n[ERROR] Streaming report generation failed: {str(e)}")
+            traceback.print_exc()
+            events.put(("error", {"error": str(e)}))
+        finally:
+            unregister_progress_listener(run_id)
+            events.put(None)
+    
+    print(f"\n{'#'*70}")
+    print("# FLASK ENDPOINT (STREAM): Report Generation Request Received")
+    print(f"# Report Type: {report_type}")
+    print(f"# Run: {run_id}")
+    print(f"{'#'*70}\n")
+    
+    threading.Thread(target=run_workflow, name=f"report-{run_id[:8]}", daemon=True).start()
+    
+    def event_stream():
+        finished = False
+        try:
+            yield format_sse("started", {"run_id": run_id})
+            while True:
+                try:
+                    item = events.get(timeout=SSE_HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"  # comment frame keeps proxies from timing out
+                    continue
+                if item is None:
+                    finished = True
+                    return
+                yield format_sse(*item)
+        finally:
+            if not finished:
+                # The server closes the generator when a write to a disconnected client fails
+                print(f"[STREAM] Client disconnected - cancelling run {run_id}")
+                cancel_run(run_id)
+    
+    return Response(
+        stream_with_context(event_stream()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.route("/generate-report-async", methods=["POST"])
+def generate_report_async():
+    """
+    Async variant of /generate-report. The workflow runs on the shared LLM
+    event loop (one AsyncOpenAI pool per process); this request thread waits
+    for it, so under a sync WSGI server the worker stays busy until it is done.
+    """
+    try:
+        data = request.json
+        report_type = data.get("report_type")
+        inputs = data.get("inputs")
+        parallel = data.get("parallel")
+        executor = data.get("executor")
+        
+        if not inputs:
+            return jsonify({"error": "No inputs provided"}), 400
+        if executor is not None and executor not in REPORT_EXECUTORS:
+            return jsonify({"error": f"executor must be one of {list(REPORT_EXECUTORS)}"}), 400
+        
+        print(f"\n{'#'*70}")
+        print("# FLASK ENDPOINT (ASYNC): Report Generation Request Received")
+        print(f"# Report Type: {report_type}")
+        print(f"# Student: {inputs.get('student_name', 'Unknown')}")
+        print(f"{'#'*70}\n")
+        
+        report_content = run_on_llm_loop(generate_report_with_agents_async(report_type, inputs, parallel=parallel, executor=executor))
+        filename = generate_word_document(report_content, report_type, inputs)
+        
+        print(f"\n{'#'*70}")
+        print("# FLASK ENDPOINT (ASYNC): Report Generation Complete")
+        print(f"# File: {filename}")
+        print(f"{'#'*70}\n")
+        
+        return jsonify({
+            "success": True,
+            "content": report_content,
+            "filename": filename
+        })
+        
+    except Exception as e:
+        print(f"\n[ERROR] Async report generation failed: {str(e)}")
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/jobs', methods=['POST'])
+def submit_report_job():
+    """Queues a report (same payload as /generate-report) and returns its job id immediately"""
+    data = request.json or {}
+    inputs = data.get("inputs")
+    
+    if not inputs:
+        return jsonify({"error": "No inputs provided"}), 400
+    if data.get("report_type") not in REPORT_TYPES:
+        return jsonify({"error": f"report_type must be one of {list(REPORT_TYPES)}"}), 400
+    
+    try:
+        job_id = report_job_queue.submit(data.get("report_type"), inputs, parallel=data.get("parallel"))
+    except JobQueueFull as e:
+        return jsonify({"error": str(e)}), 503
+    
+    return jsonify({
+        "job_id": job_id,
+        "status": "queued",
+        "status_url": f"/jobs/{job_id}",
+        "result_url": f"/jobs/{job_id}/result",
+    }), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def report_job_status(job_id):
+    report_job_queue.start()  # polling also runs orphan recovery in a process that has not queued anything yet
+    job = report_job_queue.store.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(describe_job(job))
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def report_job_result(job_id):
+    """Report content and download link once the job has succeeded (409 until then, the error once it failed)"""
+    job = report_job_queue.store.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    if job['status'] == 'failed':
+        return jsonify({"success": False, "status": "failed", "error": job['error']})
+    if job['status'] != 'succeeded':
+        return jsonify({"error": "Job not finished", "status": job['status']}), 409
+    
+    return jsonify({
+        "success": True,
+        "content": job['content'],
+        "filename": job['filename'],
+        "download_url": (f"/batches/{job['batch_id']}/files/{job['filename']}" if job['batch_id']
+                         else f"/download/{job['filename']}"),
+    })
+
+@app.route('/batches', methods=['POST'])
+def submit_roster_batch():
+    """
+    Queues one report per student from a roster. Accepts a multipart upload
+    (file field "roster", form fields "report_type" and "parallel") or JSON
+    {"report_type", "roster": "<csv or jsonl text>", "format"} or
+    {"report_type", "students": [inputs, ...]}.
+    """
+    try:
+        if request.files.get('roster'):
+            upload = request.files['roster']
+            report_type = request.form.get('report_type')
+            parallel = request.form.get('parallel')
+            parallel = None if parallel is None else parallel.lower() in ('1', 'true', 'yes')
+            fmt = request.form.get('format') or ('jsonl' if upload.filename.lower().endswith(('.jsonl', '.ndjson')) else None)
+            students = parse_roster(upload.read().decode('utf-8'), fmt)
+        else:
+            data = request.json or {}
+            report_type = data.get('report_type')
+            parallel = data.get('parallel')
+            if data.get('students') is not None:
+                students = parse_roster("\n".join(json.dumps(student) for student in data['students']), 'jsonl')
+            else:
+                students = parse_roster(data.get('roster') or '', data.get('format'))
+    except (RosterError, UnicodeDecodeError) as e:
+        return jsonify({"error": str(e)}), 400
+    
+    if report_type not in REPORT_TYPES:
+        return jsonify({"error": f"report_type must be one of {list(REPORT_TYPES)}"}), 400
+    
+    try:
+        batch_id = report_job_queue.submit_batch(report_type, students, parallel=parallel)
+    except JobQueueFull as e:
+        return jsonify({"error": str(e)}), 503
+    
+    return jsonify({
+        "batch_id": batch_id,
+        "total": len(students),
+        "status_url": f"/batches/{batch_id}",
+        "download_url": f"/batches/{batch_id}/download",
+    }), 202
+
+@app.route('/batches/<batch_id>', methods=['GET'])
+def roster_batch_status(batch_id):
+    """Batch totals plus per-student progress (the manifest)"""
+    report_job_queue.start()
+    batch = report_job_queue.store.get_batch(batch_id)
+    if batch is None:
+        return jsonify({"error": "Batch not found"}), 404
+    
+    students = build_batch_manifest(batch_id)
+    if batch['status'] == 'running' and all(student['status'] in JOB_FINISHED_STATES for student in students):
+        package_batch_if_complete(batch_id)  # e.g. the last job was failed by orphan recovery
+        batch = report_job_queue.store.get_batch(batch_id)
+    
+    counts = {}
+    for student in students:
+        counts[student['status']] = counts.get(student['status'], 0) + 1
+    
+    return jsonify({
+        'batch_id': batch_id,
+        'status': batch['status'],
+        'report_type': batch['report_type'],
+        'total': batch['total'],
+        'counts': counts,
+        'download_url': f"/batches/{batch_id}/download" if batch['status'] == 'complete' else None,
+        'error': batch.get('error'),
+        'students': students,
+    })
+
+@app.route('/batches/<batch_id>/download', methods=['GET'])
+def roster_batch_download(batch_id):
+    """Zip of every generated document plus manifest.json (409 until the batch completes)"""
+    batch = report_job_queue.store.get_batch(batch_id)
+    if batch is None:
+        return jsonify({"error": "Batch not found"}), 404
+    if batch['status'] != 'complete':
+        return jsonify({"error": "Batch not finished", "status": batch['status']}), 409
+    return send_file(batch['archive'], as_attachment=True, download_name=f"reports_{batch_id}.zip")
+
+@app.route('/batches/<batch_id>/files/<filename>', methods=['GET'])
+def roster_batch_file(batch_id, filename):
+    """One student's document from a batch, available as soon as that job finishes"""
+    if not re.fullmatch(r'[0-9a-f]{32}', batch_id):
+        return jsonify({'error': 'File not found'}), 404
+    return send_from_directory(os.path.abspath(batch_output_dir(batch_id)), filename, as_attachment=True)
+
 @app.route('/download/<filename>')
 def download_file(filename):
     try:
@@ -1123,6 +4812,93 @@ def download_file(filename):
         print(f"Error in download_file: {str(e)}")
         return jsonify({'error': str(e)}), 404
 
+def admin_request_denied():
+    """Returns an error response unless the request carries the admin token"""
+    if not ADMIN_TOKEN:
+        return jsonify({'error': 'Admin endpoints are disabled (ADMIN_TOKEN not set)'}), 403
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), ADMIN_TOKEN):
+        return jsonify({'error': 'Invalid admin token'}), 403
+    return None
+
+@app.route('/admin/llm-cache', methods=['GET'])
+def llm_cache_status():
+    """Cache counters plus the most recently used entries (?limit=, ?section=)"""
+    denied = admin_request_denied()
+    if denied:
+        return denied
+    
+    limit = request.args.get('limit', default=50, type=int)
+    section = request.args.get('section')
+    
+    return jsonify({
+        'enabled': LLM_CACHE_ENABLED,
+        'prompt_version': prompt_templates.version,
+        'ttl_seconds': LLM_CACHE_TTL,
+        'stats': llm_response_cache.stats(),
+        'provider_prompt_cache': get_provider_prompt_cache_totals(),
+        'entries': llm_response_cache.entries(limit=limit, section=section),
+    })
+
+@app.route('/admin/llm-limiter', methods=['GET'])
+def llm_limiter_status():
+    """Shared rate-limit buckets, AIMD window and this process's wait counters"""
+    denied = admin_request_denied()
+    if denied:
+        return denied
+    return jsonify(llm_rate_limiter.stats())
+
+@app.route('/admin/prompts', methods=['GET'])
+def prompt_templates_status():
+    """Live prompt version and token usage per version (reloads changed prompt files first)"""
+    denied = admin_request_denied()
+    if denied:
+        return denied
+    snapshot = prompt_templates.current()
+    return jsonify({
+        'version': snapshot.version,
+        'directory': prompt_templates.root,
+        'files': snapshot.files,
+        'reload_interval_seconds': prompt_templates.reload_interval,
+        'usage': get_prompt_usage_stats(),
+    })
+
+@app.route('/admin/prompt-variants', methods=['GET'])
+def prompt_variants_status():
+    """Registered blueprint variants, their traffic shares and outcome totals"""
+    denied = admin_request_denied()
+    if denied:
+        return denied
+    snapshot = prompt_templates.current()
+    return jsonify({
+        'registered': {slug: sorted(variants) for slug, variants in snapshot.variants.items()},
+        'traffic': prompt_variant_traffic,
+        'variants': prompt_variant_stats.stats(),
+    })
+
+@app.route('/admin/section-history', methods=['GET'])
+def section_history_status():
+    """Per-heading output size and worker time averages the scheduler predicts from"""
+    denied = admin_request_denied()
+    if denied:
+        return denied
+    return jsonify({'slots': MAX_SECTION_CONCURRENCY, 'sections': section_history.stats()})
+
+@app.route('/admin/llm-cache', methods=['DELETE'])
+def llm_cache_purge():
+    """Purges cache entries: ?key=, ?section=, ?expired=1, or everything without filters"""
+    denied = admin_request_denied()
+    if denied:
+        return denied
+    
+    removed = llm_response_cache.purge(
+        key=request.args.get('key'),
+        section=request.args.get('section'),
+        expired_only=request.args.get('expired') == '1',
+    )
+    print(f"[LLM CACHE] Purged {removed} entries")
+    
+    return jsonify({'success': True, 'removed': removed})
+
 # def create_career_report_prompt(inputs):
 #     """Create comprehensive prompt for Career Report (Output Fields 1)"""
     
@@ -1807,6 +5583,9 @@ def _parse_year_block(lines):
 
         # Detect year headers: "Year 1:", "Year 2:", etc.
         if stripped.startswith("Year ") and stripped.endswith(":"):
+            # Close the previous year's last month before switching years
+            if current_year and current_row:
+                year_data[current_year].append(current_row)
             current_year = stripped.rstrip(":")
             if current_year not in year_data:
                 year_data[current_year] = []
@@ -1874,6 +5653,12 @@ def _parse_year_block(lines):
 
     return year_data
 
+def _year_plan_header(column, rows):
+    """Header text of a year-plan table column ("Months" when the rows are month ranges)"""
+    if column == "Month" and any("-" in _plan_month(row.get("Month", "")) for row in rows):
+        return "Months"
+    return column
+
 def create_academic_interventions_tables(section_content, doc):
     """
     Section 1 - Academic Interventions
@@ -1885,7 +5670,7 @@ def create_academic_interventions_tables(section_content, doc):
     if not year_data:
         return False
 
-    columns = ["Month", "Activity", "Technical Skills", "Soft Skills", "Learning Material", "Objective"]
+    columns = ["Month"] + YEAR_PLAN_COLUMNS["1. Academic Interventions"]
 
     for year in ["Year 1", "Year 2", "Year 3"]:
         if year not in year_data or not year_data[year]:
@@ -1898,7 +5683,7 @@ def create_academic_interventions_tables(section_content, doc):
         # Header
         header_cells = table.rows[0].cells
         for idx, col in enumerate(columns):
-            header_cells[idx].text = col
+            header_cells[idx].text = _year_plan_header(col, year_data[year])
             set_cell_background(header_cells[idx], "4472C4")
             for p in header_cells[idx].paragraphs:
                 for r in p.runs:
@@ -1935,7 +5720,7 @@ def create_non_academic_interventions_tables(section_content, doc):
     if not year_data:
         return False
 
-    columns = ["Month", "Activity", "Technical Skills", "Soft Skills", "Learning Outcome", "Objective"]
+    columns = ["Month"] + YEAR_PLAN_COLUMNS["2. Non-Academic Interventions"]
 
     for year in ["Year 1", "Year 2", "Year 3"]:
         if year not in year_data or not year_data[year]:
@@ -1947,7 +5732,7 @@ def create_non_academic_interventions_tables(section_content, doc):
 
         header_cells = table.rows[0].cells
         for idx, col in enumerate(columns):
-            header_cells[idx].text = col
+            header_cells[idx].text = _year_plan_header(col, year_data[year])
             set_cell_background(header_cells[idx], "4472C4")
             for p in header_cells[idx].paragraphs:
                 for r in p.runs:
@@ -1987,7 +5772,7 @@ def create_habit_reengineering_tables(section_content, doc):
         return False
     
     # UPDATED: Added "Action Plan" column after "Activity"
-    columns = ["Month", "Activity", "Action Plan", "Objective", "Habits to Develop", "Soft Skills", "Learning Outcomes"]
+    columns = ["Month"] + YEAR_PLAN_COLUMNS["3. Habit Reengineering"]
     
     for year in ["Year 1", "Year 2", "Year 3"]:
         if year not in year_data or not year_data[year]:
@@ -2001,7 +5786,7 @@ def create_habit_reengineering_tables(section_content, doc):
         # Header row
         header_cells = table.rows[0].cells
         for idx, col in enumerate(columns):
-            header_cells[idx].text = col
+            header_cells[idx].text = _year_plan_header(col, year_data[year])
             set_cell_background(header_cells[idx], "4472C4")
             
             for p in header_cells[idx].paragraphs:
@@ -2043,7 +5828,7 @@ def create_physical_grooming_tables(section_content, doc):
     if not year_data:
         return False
 
-    columns = ["Month", "Activity", "Objective", "Physical & Mental Skills Developed", "Soft Skills", "Learning Outcomes"]
+    columns = ["Month"] + YEAR_PLAN_COLUMNS["4. Physical Grooming"]
 
     for year in ["Year 1", "Year 2", "Year 3"]:
         if year not in year_data or not year_data[year]:
@@ -2055,7 +5840,7 @@ def create_physical_grooming_tables(section_content, doc):
 
         header_cells = table.rows[0].cells
         for idx, col in enumerate(columns):
-            header_cells[idx].text = col
+            header_cells[idx].text = _year_plan_header(col, year_data[year])
             set_cell_background(header_cells[idx], "4472C4")
             for p in header_cells[idx].paragraphs:
                 for r in p.runs:
@@ -2092,7 +5877,7 @@ def create_psychological_grooming_tables(section_content, doc):
     if not year_data:
         return False
 
-    columns = ["Month", "Activity", "Objective", "Psychological Skills Developed", "Soft Skills", "Learning Outcomes"]
+    columns = ["Month"] + YEAR_PLAN_COLUMNS["5. Psychological Grooming"]
 
     for year in ["Year 1", "Year 2", "Year 3"]:
         if year not in year_data or not year_data[year]:
@@ -2104,7 +5889,7 @@ def create_psychological_grooming_tables(section_content, doc):
 
         header_cells = table.rows[0].cells
         for idx, col in enumerate(columns):
-            header_cells[idx].text = col
+            header_cells[idx].text = _year_plan_header(col, year_data[year])
             set_cell_background(header_cells[idx], "4472C4")
             for p in header_cells[idx].paragraphs:
                 for r in p.runs:
@@ -2234,24 +6019,8 @@ def parse_section_to_table(section_heading, section_content, doc, report_type):
     """
     
     # Define which sections should be converted to tables
-    career_table_sections = [
-        "1. Detailed Career Role Breakdown",
-        "2. Industry Specific Requirements",
-        "3. Emerging Trends and Future Job Prospects",
-        "4. Recommended Internships",
-        "5. Professional Networking and Industry Associations",
-        "6. Guidelines for Progress Monitoring & Support"
-    ]
-    
-    development_table_sections = [
-        "1. Academic Interventions",
-        "2. Non-Academic Interventions",
-        "3. Habit Reengineering",
-        "4. Physical Grooming",
-        "5. Psychological Grooming",
-        "6. Suggested Reading",
-        "7. Health Discipline"
-    ]
+    career_table_sections = CAREER_SECTIONS
+    development_table_sections = DEVELOPMENT_SECTIONS
     
     # Check if this section should be converted to table
     sections_to_convert = career_table_sections if report_type == 'career' else development_table_sections
@@ -2425,11 +6194,23 @@ def parse_section_to_table(section_heading, section_content, doc, report_type):
     doc.add_paragraph()  # Spacing
     return True
 
-def generate_word_document(content, report_type, inputs):
+def report_filename(report_type, inputs):
+    """Default .docx name: report kind, student name and career roles"""
+    # timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    student_name = inputs.get('sname', 'N/A')
+    student_name_clean = sanitize_filename(str(student_name))
+
+    # Career roles
+    career_roles = inputs.get('career_roles', 'N/A')
+    career_roles_clean = sanitize_filename(str(career_roles))
+    report_name = 'Career_Report' if report_type == 'career' else 'Development_Report'
+    return f"{report_name}_{student_name_clean}_{career_roles_clean}.docx"
+
+def generate_word_document(content, report_type, inputs, output_dir='generated_reports', filename=None):
     """Generate a formatted Word document from the report content"""
     
     # Create reports directory if it doesn't exist
-    os.makedirs('generated_reports', exist_ok=True)
+    os.makedirs(output_dir, exist_ok=True)
     
     # Create a new Document
     doc = Document()
@@ -2576,21 +6357,15 @@ def generate_word_document(content, report_type, inputs):
             doc.add_paragraph()
     
     # Generate filename
-    # timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    student_name = inputs.get('sname', 'N/A')
-    student_name_clean = sanitize_filename(str(student_name))
-
-    # Career roles
-    career_roles = inputs.get('career_roles', 'N/A')
-    career_roles_clean = sanitize_filename(str(career_roles))
-    report_name = 'Career_Report' if report_type == 'career' else 'Development_Report'
-    filename = f"{report_name}_{student_name_clean}_{career_roles_clean}.docx"
-    filepath = os.path.join('generated_reports', filename)
+    filename = filename or report_filename(report_type, inputs)
+    filepath = os.path.join(output_dir, filename)
     
     # Save document
     doc.save(filepath)
     
     return filename
 
+warm_workflow_cache()
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,153 @@
+"""
+Orchestration overhead benchmark.
+
+Compares the compiled LangGraph workflow with the direct in-process executor
+(and with recompiling the graph on every request, as the app used to do).
+The OpenAI call is replaced by an instant canned completion, so the timings
+measure only the per-node cost of the orchestration itself.
+
+Usage:
+    python benchmark.py [--runs 50] [--report-type development]
+"""
+import argparse
+import os
+import time
+from types import SimpleNamespace
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+os.environ.setdefault("AGENT_VERBOSE", "0")
+os.environ.setdefault("LLM_CACHE_ENABLED", "0")
+os.environ.setdefault("LLM_RATE_LIMIT_ENABLED", "0")
+os.environ.setdefault("YEAR_SPLIT_ENABLED", "0")
+os.environ.setdefault("SECTION_BATCHING_ENABLED", "0")
+
+import app  # noqa: E402
+
+def _canned_section():
+    """One text that passes every section validator (length, categories, schemas), so no retries happen"""
+    lines = ["- benchmark content line for the validator length check"] * 5
+    for section, schema in app.RECORD_SCHEMAS.items():
+        keys = app.HEALTH_CATEGORIES if section == "7. Health Discipline" else (
+            ["Software Engineer", "Data Scientist"] + [f"Record {i}" for i in range(schema.get('min_records', 0))])
+        for key in keys:
+            lines.append(f"{schema['marker']} {key}")
+            lines += [f"  {field}: benchmark" for field in schema['fields']]
+    plan_fields = list(dict.fromkeys(f for fields in app.YEAR_PLAN_COLUMNS.values() for f in fields))
+    for year in app.PLAN_YEARS:
+        lines.append(f"{year}:")
+        for month in app.PLAN_MONTHS:
+            lines.append(f"- Month: {month}")
+            lines += [f"  {field}: benchmark" for field in plan_fields]
+    return "\n".join(lines)
+
+CANNED_SECTION = _canned_section()
+
+class _InstantCompletions:
+    def create(self, **kwargs):
+        message = SimpleNamespace(content=CANNED_SECTION)
+        choice = SimpleNamespace(message=message, finish_reason="stop")
+        usage = SimpleNamespace(prompt_tokens=0, completion_tokens=0, total_tokens=0, prompt_tokens_details=None)
+        return SimpleNamespace(choices=[choice], usage=usage)
+
+class _InstantClient:
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=_InstantCompletions())
+
+def _sample_inputs():
+    return {
+        "sname": "Benchmark Student",
+        "standard": "10th",
+        "board": "CBSE",
+        "highest_skills": ["Strategy", "Observation"],
+        "skillpercentages": {"Strategy": 14, "Observation": 10},
+        "thinking_pattern": "Analytical",
+        "career_roles": "Software Engineer, Data Scientist",
+    }
+
+def _node_count(report_type):
+    sections = len(app.get_report_sections(report_type))
+    # supervisor + (generator, validator, retry_controller, save_and_continue) per section + finalizer
+    return 2 + 4 * sections
+
+def _time_runs(label, runs, run_once, nodes):
+    run_once()  # warm-up
+    started = time.perf_counter()
+    for _ in range(runs):
+        run_once()
+    elapsed = time.perf_counter() - started
+    per_report_ms = elapsed / runs * 1000
+    per_node_us = elapsed / (runs * nodes) * 1_000_000
+    print(f"{label:<28} {per_report_ms:>10.2f} ms/report {per_node_us:>10.1f} us/node")
+    return per_node_us
+
+def _report_prompt_pruning(report_type, inputs):
+    """Prompt size per section with all board/level guidance vs only the matching fragments"""
+    full, _ = app.build_prompt_plan(report_type, inputs, pruned=False)
+    pruned, _ = app.build_prompt_plan(report_type, inputs, pruned=True)
+    print(f"\nPrompt pruning (board={inputs['board']}, standard={inputs['standard']}, ~tokens = chars / 4)")
+    for section in full:
+        before, after = len(full[section]) // 4, len(pruned[section]) // 4
+        print(f"  {section:<52} {before:>6} -> {after:>6} ({before - after} saved, {(before - after) / before:.1%})")
+
+def _report_compact_plan():
+    """Output size of the month-by-month sections in the labelled layout vs compact rows"""
+    value = "practise two past-paper problems daily, review mistakes weekly"  # typical field length
+    rate = app.SCHEDULER_TOKENS_PER_SECOND
+    print(f"\nCompact plan format (36 months per section, ~tokens = chars / 4, generation at {rate:g} tokens/s)")
+    totals = [0, 0]
+    for section, columns in app.YEAR_PLAN_COLUMNS.items():
+        plan = {year: {month: {c: value for c in columns} for month in app.PLAN_MONTHS} for year in app.PLAN_YEARS}
+        verbose = len(app.render_year_plan(section, [section], plan)) // 4
+        compact = len(app.encode_compact_plan(section, app.render_year_plan(section, [section], plan))) // 4
+        totals[0] += verbose
+        totals[1] += compact
+        print(f"  {section:<52} {verbose:>6} -> {compact:>6} tokens ({(verbose - compact) / verbose:.1%} fewer, "
+              f"~{(verbose - compact) / rate:.0f}s less generation)")
+    print(f"  {'all five sections':<52} {totals[0]:>6} -> {totals[1]:>6} tokens "
+          f"(~{(totals[0] - totals[1]) / rate:.0f}s less sequential generation)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--report-type", choices=app.REPORT_TYPES, default="development")
+    args = parser.parse_args()
+
+    instant_client = _InstantClient()
+    app.get_openai_client = lambda: instant_client
+    app.AGENT_VERBOSE = False
+
+    inputs = _sample_inputs()
+    nodes = _node_count(args.report_type)
+
+    def graph_recompiled():
+        workflow = app.create_multi_agent_workflow()
+        workflow.invoke(app._build_initial_state(args.report_type, inputs, False),
+                        config=app._workflow_config(args.report_type, False))
+
+    def graph_cached():
+        app.generate_report_with_agents(args.report_type, inputs, parallel=False, executor="graph")
+
+    def direct():
+        app.generate_report_with_agents(args.report_type, inputs, parallel=False, executor="direct")
+
+    print(f"Report type: {args.report_type} | runs: {args.runs} | nodes per report: {nodes} "
+          f"| prompt version: {app.prompt_templates.version}\n")
+    recompiled = _time_runs("graph (compile per request)", args.runs, graph_recompiled, nodes)
+    cached = _time_runs("graph (compiled once)", args.runs, graph_cached, nodes)
+    direct_us = _time_runs("direct executor", args.runs, direct, nodes)
+
+    plan_runs = max(args.runs, 100)
+    started = time.perf_counter()
+    for _ in range(plan_runs):
+        app.build_prompt_plan(args.report_type, inputs)
+    plan_ms = (time.perf_counter() - started) / plan_runs * 1000
+    print(f"{'prompt plan (all sections)':<28} {plan_ms:>10.3f} ms/report")
+    _report_prompt_pruning(args.report_type, app.normalize_inputs(inputs))
+    if args.report_type == "development":
+        _report_compact_plan()
+
+    print(f"\nCompiled-once graph saves {recompiled - cached:.1f} us/node over recompiling.")
+    print(f"Direct executor saves {cached - direct_us:.1f} us/node over the compiled graph.")
+
+if __name__ == "__main__":
+    main()
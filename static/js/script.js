@@ -45,6 +45,21 @@ function generateReport(reportType) {
         return;
     }
 
+    // Prepare request data
+    const requestData = {
+        report_type: reportType,
+        inputs: formData
+    };
+
+    // Stream sections as they are generated when the browser supports it
+    if (window.ReadableStream && window.TextDecoder) {
+        generateReportStreaming(requestData);
+    } else {
+        generateReportBlocking(requestData);
+    }
+}
+
+function generateReportBlocking(requestData) {
     // Show loading spinner
     document.getElementById('loadingSpinner').style.display = 'block';
     document.getElementById('reportSection').style.display = 'none';
@@ -52,12 +67,6 @@ function generateReport(reportType) {
     // Scroll to loading spinner
     document.getElementById('loadingSpinner').scrollIntoView({ behavior: 'smooth' });
 
-    // Prepare request data
-    const requestData = {
-        report_type: reportType,
-        inputs: formData
-    };
-
     // Make API call
     fetch('/generate-report', {
         method: 'POST',
@@ -86,6 +95,159 @@ function generateReport(reportType) {
     });
 }
 
+function generateReportStreaming(requestData) {
+    const reportSection = document.getElementById('reportSection');
+    const reportContent = document.getElementById('reportContent');
+    const progress = document.getElementById('reportProgress');
+    const downloadBtn = document.getElementById('downloadBtn');
+
+    // Show the report card straight away and fill it in as sections arrive
+    document.getElementById('loadingSpinner').style.display = 'none';
+    reportContent.innerHTML = '';
+    progress.innerHTML = '<div class="progress-status"><i class="fas fa-spinner fa-spin"></i><span>Planning report...</span></div>';
+    progress.style.display = 'block';
+    downloadBtn.style.display = 'none';
+    reportSection.style.display = 'block';
+    reportSection.scrollIntoView({ behavior: 'smooth' });
+
+    const sectionBlocks = {};
+    let total = 0;
+    let saved = 0;
+    let finished = false;
+
+    function setStatus(text) {
+        progress.querySelector('.progress-status span').textContent = text;
+    }
+
+    function sectionBlock(name) {
+        if (!sectionBlocks[name]) {
+            const block = document.createElement('div');
+            block.className = 'report-section-block pending';
+            block.innerHTML = '<h3></h3><pre class="section-stream"></pre>';
+            block.querySelector('h3').textContent = name;
+            reportContent.appendChild(block);
+            sectionBlocks[name] = block;
+        }
+        return sectionBlocks[name];
+    }
+
+    // Concurrent parts of a section (the years of a split plan) stream side by side
+    function streamTarget(data) {
+        const block = sectionBlock(data.section);
+        if (!data.part) {
+            return block.querySelector('.section-stream');
+        }
+        const part = String(data.part);
+        const streams = Array.from(block.querySelectorAll('.section-part'));
+        let target = streams.find(stream => stream.dataset.part === part);
+        if (!target) {
+            target = document.createElement('pre');
+            target.className = 'section-stream section-part';
+            target.dataset.part = part;
+            block.insertBefore(target, streams.find(stream => stream.dataset.part > part) || null);
+        }
+        return target;
+    }
+
+    function handleEvent(event, data) {
+        switch (event) {
+            case 'plan':
+                total = data.sections.length;
+                data.sections.forEach(sectionBlock);
+                setStatus(`Generating ${total} sections...`);
+                break;
+            case 'section_started': {
+                const block = sectionBlock(data.section);
+                block.querySelector('.section-stream').textContent = '';
+                block.querySelectorAll('.section-part').forEach(stream => stream.remove());
+                setStatus(data.attempt > 1
+                    ? `Retrying ${data.section} (attempt ${data.attempt})...`
+                    : `Writing ${data.section}...`);
+                break;
+            }
+            case 'token':
+                streamTarget(data).textContent += data.delta;
+                break;
+            case 'continuation':
+                // Truncated output: the cut-off tail is regenerated by the continuation
+                streamTarget(data).textContent = data.content + '\n';
+                break;
+            case 'section_saved': {
+                const block = sectionBlock(data.section);
+                block.classList.remove('pending');
+                block.innerHTML = formatReportContent(data.content);
+                saved += 1;
+                setStatus(`${saved}/${total} sections complete`);
+                break;
+            }
+            case 'document_ready':
+                finished = true;
+                progress.style.display = 'none';
+                displayReport(data.content, data.filename);
+                downloadBtn.style.display = '';
+                break;
+            case 'error':
+                finished = true;
+                progress.style.display = 'none';
+                alert('Error: ' + data.error);
+                break;
+        }
+    }
+
+    fetch('/generate-report/stream', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify(requestData)
+    })
+    .then(response => {
+        if (!response.ok || !response.body) {
+            return response.json().then(data => {
+                throw new Error(data.error || response.statusText);
+            });
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        function read() {
+            return reader.read().then(({ done, value }) => {
+                if (done) {
+                    if (!finished) {
+                        throw new Error('Connection closed before the report was ready');
+                    }
+                    return;
+                }
+                buffer += decoder.decode(value, { stream: true });
+
+                // SSE frames are separated by a blank line
+                let boundary;
+                while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                    const frame = buffer.slice(0, boundary);
+                    buffer = buffer.slice(boundary + 2);
+                    let event = 'message';
+                    let data = '';
+                    frame.split('\n').forEach(line => {
+                        if (line.startsWith('event: ')) event = line.slice(7);
+                        else if (line.startsWith('data: ')) data += line.slice(6);
+                    });
+                    if (data) handleEvent(event, JSON.parse(data));
+                }
+                return read();
+            });
+        }
+        return read();
+    })
+    .catch(error => {
+        progress.style.display = 'none';
+        downloadBtn.style.display = '';
+        alert('Error generating report: ' + error.message);
+        console.error('Error:', error);
+    });
+}
+
 // Toggle percentage input visibility when checkbox is selected
 // Toggle percentage input visibility when checkbox is selected
 function togglePercentageInput(checkbox, category) {
@@ -201,6 +363,9 @@ function collectFormData() {
     // Collect career roles
     formData.career_roles = document.getElementById('careerRoles').value.trim();
     
+    // Collect plan granularity (rows per development plan year)
+    formData.plan_granularity = document.getElementById('planGranularity').value;
+    
     return formData;
 }
 
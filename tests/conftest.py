@@ -0,0 +1,88 @@
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+import pytest
+
+# Every SQLite store points at a throwaway directory before app is imported
+_DB_DIR = tempfile.mkdtemp(prefix="report-tests-")
+for _name in ("LLM_CACHE_DB", "LLM_RATE_LIMIT_DB", "SCHEDULER_DB", "PROMPT_VARIANT_DB", "JOB_DB"):
+    os.environ[_name] = os.path.join(_DB_DIR, f"{_name.lower()}.sqlite3")
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+os.environ.setdefault("AGENT_VERBOSE", "0")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+
+def canned_section():
+    """Section text that passes every validator (length, categories, record and month schemas)"""
+    lines = ["- canned content line long enough for the validator length check"] * 5
+    for section, schema in app.RECORD_SCHEMAS.items():
+        keys = app.HEALTH_CATEGORIES if section == "7. Health Discipline" else (
+            ["Software Engineer", "Data Scientist"] + [f"Record {i}" for i in range(schema.get('min_records', 0))])
+        for key in keys:
+            lines.append(f"{schema['marker']} {key}")
+            lines += [f"  {field}: canned" for field in schema['fields']]
+    plan_fields = list(dict.fromkeys(f for fields in app.YEAR_PLAN_COLUMNS.values() for f in fields))
+    for year in app.PLAN_YEARS:
+        lines.append(f"{year}:")
+        for month in app.PLAN_MONTHS:
+            lines.append(f"- Month: {month}")
+            lines += [f"  {field}: canned" for field in plan_fields]
+    return "\n".join(lines)
+
+
+class FakeCompletions:
+    """chat.completions stand-in: respond(params) returns (content, finish_reason)"""
+
+    def __init__(self, respond):
+        self.respond = respond
+        self.calls = []
+
+    def _answer(self, params):
+        self.calls.append(params)
+        content, finish_reason = self.respond(params)
+        usage = SimpleNamespace(prompt_tokens=100, completion_tokens=len(content) // 4, total_tokens=0,
+                                prompt_tokens_details=None)
+        if not params.get('stream'):
+            choice = SimpleNamespace(message=SimpleNamespace(content=content), finish_reason=finish_reason)
+            return SimpleNamespace(choices=[choice], usage=usage)
+        chunks = [SimpleNamespace(usage=None, choices=[SimpleNamespace(
+            delta=SimpleNamespace(content=content[i:i + 200]), finish_reason=None)]) for i in range(0, len(content), 200)]
+        chunks.append(SimpleNamespace(usage=None, choices=[SimpleNamespace(
+            delta=SimpleNamespace(content=None), finish_reason=finish_reason)]))
+        chunks.append(SimpleNamespace(usage=usage, choices=[]))
+        return chunks
+
+    def create(self, **params):
+        return self._answer(params)
+
+
+class FakeAsyncCompletions(FakeCompletions):
+    async def create(self, **params):
+        answer = self._answer(params)
+        if not params.get('stream'):
+            return answer
+
+        async def stream():
+            for chunk in answer:
+                yield chunk
+        return stream()
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """Replaces the OpenAI clients with an instant canned completion; set .respond to change the answers"""
+    completions = FakeCompletions(lambda params: (canned_section(), "stop"))
+    async_completions = FakeAsyncCompletions(lambda params: completions.respond(params))
+    async_completions.calls = completions.calls
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    async_client = SimpleNamespace(chat=SimpleNamespace(completions=async_completions))
+    monkeypatch.setattr(app, "get_openai_client", lambda: client)
+    monkeypatch.setattr(app, "get_async_openai_client", lambda: async_client)
+    monkeypatch.setattr(app, "LLM_CACHE_ENABLED", False)
+    monkeypatch.setattr(app, "LLM_RATE_LIMIT_ENABLED", False)
+    return completions
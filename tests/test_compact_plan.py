@@ -0,0 +1,69 @@
+import pytest
+
+import app
+
+ACADEMIC = "1. Academic Interventions"
+COLUMNS = app.YEAR_PLAN_COLUMNS[ACADEMIC]
+
+
+@pytest.fixture
+def compact(monkeypatch):
+    monkeypatch.setattr(app, "COMPACT_PLAN_ENABLED", True)
+    monkeypatch.setattr(app, "STRUCTURED_OUTPUT_ENABLED", False)
+
+
+def test_expand_compact_plan(compact):
+    text = f"{ACADEMIC}\n\nYear 1:\nJan | Robotics club | Python | Teamwork | Docs | Build a robot\nFeb | Quiz | Maths | Focus | Notes | Win"
+    _, plan = app.parse_year_plan(app.expand_compact_plan(ACADEMIC, text))
+    assert list(plan["Year 1"]) == ["January", "February"]
+    assert plan["Year 1"]["January"] == dict(zip(COLUMNS, ["Robotics club", "Python", "Teamwork", "Docs", "Build a robot"]))
+
+
+def test_expand_compact_plan_folds_extra_separators_into_last_field(compact):
+    expanded = app.expand_compact_plan(ACADEMIC, "Year 1:\nMar | a | b | c | d | e | f")
+    assert app.parse_year_plan(expanded)[1]["Year 1"]["March"]["Objective"] == "e / f"
+
+
+def test_expand_compact_plan_ranged_rows(compact):
+    expanded = app.expand_compact_plan(ACADEMIC, "Year 2:\nJan-Mar | a | b | c | d | e")
+    assert list(app.parse_year_plan(expanded)[1]["Year 2"]) == ["January-March"]
+
+
+def test_expand_compact_plan_keeps_block_layout(compact):
+    text = "Year 1:\n- Month: January\n Activity: a"
+    assert app.expand_compact_plan(ACADEMIC, text) == text
+
+
+def test_expand_compact_plan_off_by_default():
+    assert not app.COMPACT_PLAN_ENABLED
+    text = "Year 1:\nJan | a | b | c | d | e"
+    assert app.expand_compact_plan(ACADEMIC, text) == text
+
+
+def test_encode_compact_plan_round_trip(compact):
+    text = f"{ACADEMIC}\n\nYear 1:\nJan | a | b | c | d | e\n\nYear 2:\nJan | f | g | h | i | j"
+    expanded = app.expand_compact_plan(ACADEMIC, text)
+    assert app.encode_compact_plan(ACADEMIC, expanded) == text
+
+
+def test_compact_blueprint_drops_layout_rules():
+    blueprint = "\n".join([
+        "You MUST output in the EXACT structure below. DO NOT change labels, order, or wording of fields.",
+        "- Activity: <one concrete activity>",
+        "- DO NOT use pipes |.",
+        "- Use only the labels: Month, Activity, Objective.",
+        "- Ensure indentation exactly as shown (- Month, then 2-space indented fields).",
+        "- Output must be plain text only, no markdown tables, no symbols, no pipes.",
+    ])
+    assert app.compact_blueprint(blueprint).split("\n") == [
+        "You MUST output in the EXACT structure below.",
+        "- Activity: <one concrete activity>",
+        "- Output must be plain text only, no markdown tables, no symbols.",
+    ]
+
+
+def test_compact_plan_instruction_periods():
+    quarterly = app.plan_periods({'plan_granularity': 'quarterly'})
+    instruction = app.compact_plan_instruction(ACADEMIC, quarterly)
+    assert "Jan-Mar, Apr-Jun, Jul-Sep, Oct-Dec" in instruction
+    assert "one line per period" in instruction
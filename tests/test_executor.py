@@ -0,0 +1,19 @@
+import pytest
+
+import app
+
+
+def test_resolve_executor():
+    assert app.resolve_executor("direct") == "direct"
+    assert app.resolve_executor(None) == app.REPORT_EXECUTOR
+    with pytest.raises(ValueError, match="executor must be one of"):
+        app.resolve_executor("graf")
+
+
+@pytest.mark.parametrize("path", ["/generate-report", "/generate-report/stream", "/generate-report-async"])
+def test_unknown_executor_is_rejected(path, monkeypatch):
+    monkeypatch.setattr(app, "generate_report_with_agents", lambda *args, **kwargs: pytest.fail("report generated"))
+    response = app.app.test_client().post(path, json={
+        "report_type": "career", "inputs": {"student_name": "A"}, "executor": "graf"})
+    assert response.status_code == 400
+    assert "executor must be one of" in response.get_json()["error"]
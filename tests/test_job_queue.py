@@ -0,0 +1,92 @@
+import time
+
+import pytest
+
+import app
+
+INPUTS = {"student_name": "Test Student"}
+
+
+def wait_for(store, job_id, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = store.get(job_id)
+        if job['status'] in app.JOB_FINISHED_STATES:
+            return job
+        time.sleep(0.01)
+    pytest.fail(f"job {job_id} still {store.get(job_id)['status']}")
+
+
+@pytest.fixture
+def reports(monkeypatch):
+    """Instant report generation; a student named "boom" fails"""
+    def generate(report_type, inputs, parallel=None, run_id=''):
+        if inputs.get('student_name') == "boom":
+            raise RuntimeError("generation failed")
+        return f"report for {inputs['student_name']}"
+
+    monkeypatch.setattr(app, "generate_report_with_agents", generate)
+    monkeypatch.setattr(app, "generate_word_document", lambda content, report_type, inputs, **kwargs: "report.docx")
+
+
+@pytest.fixture
+def job_queue(tmp_path, reports):
+    job_queue = app.ReportJobQueue(app.ReportJobStore(str(tmp_path / "jobs.sqlite3")), workers=1, max_pending=3)
+    yield job_queue
+    job_queue.drain(timeout=5)
+
+
+def test_job_runs_to_completion(job_queue):
+    job = wait_for(job_queue.store, job_queue.submit("career", INPUTS))
+    assert (job['status'], job['content'], job['filename']) == ("succeeded", "report for Test Student", "report.docx")
+
+
+def test_failed_job_does_not_stop_the_worker(job_queue):
+    failed = job_queue.submit("career", {"student_name": "boom"})
+    succeeded = job_queue.submit("career", INPUTS)
+    assert wait_for(job_queue.store, failed)['error'] == "generation failed"
+    assert wait_for(job_queue.store, succeeded)['status'] == "succeeded"
+
+
+def test_pending_limit(job_queue, monkeypatch):
+    monkeypatch.setattr(job_queue, "_work", lambda: None)  # nothing drains the queue
+    job_queue._pid = None
+    for _ in range(3):
+        job_queue.submit("career", INPUTS)
+    with pytest.raises(app.JobQueueFull):
+        job_queue.submit("career", INPUTS)
+
+
+def test_idle_workers_recover_released_jobs(job_queue, monkeypatch):
+    monkeypatch.setattr(app, "JOB_RECOVERY_SECONDS", 0.05)
+    job_queue.start()
+    # A queued job handed back by a draining process
+    job_queue.store.create("released", "career", INPUTS, None)
+    job_queue.store.release(["released"])
+    assert wait_for(job_queue.store, "released")['status'] == "succeeded"
+
+
+def test_orphaned_running_job_is_failed(job_queue):
+    job_queue.store.create("orphan", "career", INPUTS, None)
+    job_queue.store.update("orphan", status="running", owner_pid=2 ** 22 + 1)
+    assert job_queue.store.claim_orphans() == []
+    assert job_queue.store.get("orphan")['status'] == "failed"
+
+
+def test_job_routes(reports, monkeypatch, tmp_path):
+    job_queue = app.ReportJobQueue(app.ReportJobStore(str(tmp_path / "jobs.sqlite3")), workers=1, max_pending=3)
+    monkeypatch.setattr(app, "report_job_queue", job_queue)
+    client = app.app.test_client()
+    try:
+        assert client.post("/jobs", json={"report_type": "résumé", "inputs": INPUTS}).status_code == 400
+
+        response = client.post("/jobs", json={"report_type": "career", "inputs": {"student_name": "boom"}})
+        assert response.status_code == 202
+        job_id = response.get_json()['job_id']
+        wait_for(job_queue.store, job_id)
+
+        result = client.get(f"/jobs/{job_id}/result")
+        assert result.status_code == 200
+        assert result.get_json() == {"success": False, "status": "failed", "error": "generation failed"}
+    finally:
+        job_queue.drain(timeout=5)
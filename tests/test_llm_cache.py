@@ -0,0 +1,78 @@
+import pytest
+
+import app
+
+FRAGMENT_SECTION = "2. Industry Specific Requirements"
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return app.LLMResponseCache(str(tmp_path / "llm_cache.sqlite3"), ttl_seconds=60, memory_items=2, max_entries=3)
+
+
+@pytest.fixture
+def shared_cache(cache, monkeypatch):
+    monkeypatch.setattr(app, "llm_response_cache", cache)
+    return cache
+
+
+def test_memory_and_disk_tiers(cache):
+    cache.set("a", "alpha", section="s")
+    assert cache.get("a") == "alpha"
+    cache._memory.clear()
+    assert cache.get("a") == "alpha"
+    assert cache.get("missing") is None
+    assert (cache.counters['memory_hits'], cache.counters['disk_hits'], cache.counters['misses']) == (1, 1, 1)
+
+
+def test_expired_entry_is_a_miss(cache):
+    cache.set("a", "alpha", ttl_seconds=-1)
+    assert cache.get("a") is None
+
+
+def test_prune_evicts_least_recently_used(cache):
+    for n in range(5):
+        cache.set(f"k{n}", str(n))
+    assert cache.prune() == 2
+    assert cache.stats()['disk_entries'] == 3
+
+
+def test_purge_reaches_other_processes_memory_tier(cache, monkeypatch):
+    monkeypatch.setattr(app.LLMResponseCache, "PURGE_CHECK_SECONDS", 0)
+    other = app.LLMResponseCache(cache.db_path, ttl_seconds=60, memory_items=2, max_entries=3)
+    cache.set("a", "alpha", section="s")
+    assert other.get("a") == "alpha"
+    cache.purge(section="s")
+    assert other.get("a") is None
+
+
+def test_role_fragments_skip_cache_when_disabled(shared_cache, monkeypatch):
+    state = {'inputs': {'career_roles': "Data Scientist"}, 'retry_count': 0}
+    key = app.role_fragment_cache_key(FRAGMENT_SECTION, "Data Scientist")
+    shared_cache.set(key, "cached fragment")
+
+    monkeypatch.setattr(app, "LLM_CACHE_ENABLED", True)
+    assert [f['content'] for f in app._plan_role_fragments(state, FRAGMENT_SECTION)] == ["cached fragment"]
+
+    monkeypatch.setattr(app, "LLM_CACHE_ENABLED", False)
+    fragments = app._plan_role_fragments(state, FRAGMENT_SECTION)
+    assert [f['content'] for f in fragments] == [None]
+
+    fragments[0]['content'] = "fresh fragment"
+    app._store_role_fragments(state, FRAGMENT_SECTION, fragments, fragments)
+    assert state['pending_cache_writes'] == []
+
+
+def test_commit_section_cache_respects_flag(shared_cache, monkeypatch):
+    def state():
+        return {'current_section_name': "x", 'validation_result': {'is_valid': True},
+                'pending_cache_writes': [{'key': "k", 'section': "x", 'content': "body"}]}
+
+    monkeypatch.setattr(app, "LLM_CACHE_ENABLED", False)
+    app.commit_section_cache(state())
+    assert shared_cache.get("k") is None
+
+    monkeypatch.setattr(app, "LLM_CACHE_ENABLED", True)
+    app.commit_section_cache(state())
+    assert shared_cache.get("k") == "body"
+
@@ -0,0 +1,24 @@
+import httpx
+import pytest
+from openai import APIConnectionError, APIStatusError, APITimeoutError, RateLimitError
+
+import app
+
+REQUEST = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+
+
+def status_error(cls, status_code):
+    return cls("error", response=httpx.Response(status_code, request=REQUEST), body=None)
+
+
+@pytest.mark.parametrize("error, kind", [
+    (status_error(RateLimitError, 429), 'rate_limit'),
+    (APITimeoutError(request=REQUEST), 'timeout'),
+    (APIConnectionError(request=REQUEST), 'connection'),
+    (status_error(APIStatusError, 503), 'server'),
+    (status_error(APIStatusError, 409), 'server'),
+    (status_error(APIStatusError, 400), 'fatal'),
+    (ValueError("bug"), 'unknown'),
+])
+def test_classify_llm_error(error, kind):
+    assert app.classify_llm_error(error) == kind
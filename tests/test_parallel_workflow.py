@@ -0,0 +1,24 @@
+import pytest
+
+import app
+
+INPUTS = {"sname": "Test Student", "standard": "10th", "board": "CBSE",
+          "career_roles": "Software Engineer, Data Scientist"}
+
+
+@pytest.mark.parametrize("report_type", app.REPORT_TYPES)
+def test_parallel_workflow_merges_each_section_once(report_type, fake_llm):
+    workflow = app.create_parallel_workflow()
+    state = app._build_initial_state(report_type, INPUTS, True)
+    for state in workflow.stream(state, config=app._workflow_config(report_type, True), stream_mode="values"):
+        pass
+
+    sections = app.get_report_sections(report_type)
+    assert len(state['section_results']) == len(sections)
+    assert [s['name'] for s in state['generated_sections']] == sections
+    assert state['final_report'] == "\n\n".join(s['content'] for s in state['generated_sections'])
+
+
+def test_direct_parallel_run_matches_the_graph(fake_llm):
+    state = app.run_workflow_direct(app._build_initial_state("development", INPUTS, True), parallel=True)
+    assert [s['name'] for s in state['generated_sections']] == app.get_report_sections("development")
@@ -0,0 +1,129 @@
+import pytest
+
+import app
+
+ACADEMIC = "1. Academic Interventions"
+READING = "6. Suggested Reading"
+
+
+def year_plan(section_name, periods=app.PLAN_MONTHS, years=app.PLAN_YEARS, skip=()):
+    lines = [section_name, ""]
+    for year in years:
+        lines.append(f"{year}:")
+        for period in periods:
+            if (year, period) in skip:
+                continue
+            lines.append(f"- Month: {period}")
+            lines += [f" {field}: {field.lower()} for {period}" for field in app.YEAR_PLAN_COLUMNS[section_name]]
+            lines.append("")
+    return "\n".join(lines)
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("March", "March"),
+    ("March 2025", "March"),
+    ("Jan", "January"),
+    ("Sept.", "September"),
+    ("Jan to Mar", "January-March"),
+    ("January-February", "January-February"),
+    ("Apr – Jun 2025", "April-June"),
+    ("January (review December)", "January"),
+    ("Revision: March, then May", "March"),
+    ("Marketing week", "Marketing week"),
+    ("Decision making", "Decision making"),
+])
+def test_plan_month(value, expected):
+    assert app._plan_month(value) == expected
+
+
+@pytest.mark.parametrize("value, periods", [
+    (None, 12),
+    ("Monthly", 12),
+    ("Bi Monthly", 6),
+    ("bimonthly", 6),
+    ("quarterly", 4),
+    ("fortnightly", 12),
+])
+def test_plan_periods(value, periods):
+    assert len(app.plan_periods({'plan_granularity': value})) == periods
+
+
+def test_plan_periods_quarterly_labels():
+    assert app.plan_periods({'plan_granularity': 'quarterly'}) == [
+        "January-March", "April-June", "July-September", "October-December"]
+
+
+def test_parse_and_render_year_plan_round_trip():
+    text = year_plan(ACADEMIC)
+    preamble, plan = app.parse_year_plan(text)
+    assert preamble == [ACADEMIC]
+    assert list(plan) == app.PLAN_YEARS
+    assert list(plan["Year 2"]) == app.PLAN_MONTHS
+    assert app.parse_year_plan(app.render_year_plan(ACADEMIC, preamble, plan))[1] == plan
+
+
+def test_find_section_gaps_complete_plan():
+    report = app.find_section_gaps(ACADEMIC, year_plan(ACADEMIC), {})
+    assert report == {'kind': 'year_plan', 'expected': 36, 'gaps': []}
+
+
+def test_find_section_gaps_missing_month():
+    report = app.find_section_gaps(ACADEMIC, year_plan(ACADEMIC, skip={("Year 3", "May")}), {})
+    assert report['gaps'] == [{'year': "Year 3", 'month': "May",
+                               'fields': app.YEAR_PLAN_COLUMNS[ACADEMIC], 'whole': True}]
+
+
+def test_find_section_gaps_uses_plan_granularity():
+    inputs = {'plan_granularity': 'quarterly'}
+    text = year_plan(ACADEMIC, periods=app.plan_periods(inputs))
+    report = app.find_section_gaps(ACADEMIC, text, inputs)
+    assert report['expected'] == 12
+    assert report['gaps'] == []
+
+
+def test_find_section_gaps_records():
+    text = "\n".join([READING, ""] + [
+        line
+        for n in range(14)
+        for line in (f"- Book Name: Book {n}", "  Author: A", "  Publication: P",
+                     "  Why Should This Book Be Read?: because" if n else "")
+    ])
+    report = app.find_section_gaps(READING, text, {})
+    assert report['kind'] == 'records'
+    assert {'index': 0, 'key': "Book 0", 'fields': ["Why Should This Book Be Read?"]} in report['gaps']
+    assert any(gap.get('more') == 1 for gap in report['gaps'])
+
+
+def test_find_section_gaps_free_text_section():
+    assert app.find_section_gaps("2. Career Roadmap", "anything", {}) is None
+
+
+def test_merge_section_repair_fills_missing_month():
+    content = year_plan(ACADEMIC, skip={("Year 1", "April")})
+    report = app.find_section_gaps(ACADEMIC, content, {})
+    patch = year_plan(ACADEMIC, periods=["April"], years=["Year 1"])
+    merged = app.merge_section_repair(ACADEMIC, content, patch, report)
+    assert app.find_section_gaps(ACADEMIC, merged, {})['gaps'] == []
+    assert list(app.parse_year_plan(merged)[1]["Year 1"]) == app.PLAN_MONTHS
+
+
+def test_merge_section_repair_keeps_existing_values():
+    content = year_plan(ACADEMIC)
+    report = {'kind': 'year_plan', 'expected': 36, 'gaps': []}
+    patch = "Year 1:\n- Month: January\n Activity: replaced"
+    merged = app.merge_section_repair(ACADEMIC, content, patch, report)
+    assert app.parse_year_plan(merged)[1]["Year 1"]["January"]["Activity"] == "activity for January"
+
+
+def test_merge_section_repair_replaces_incomplete_record():
+    content = "\n".join([READING, "", "- Book Name: Deep Work", "  Author: Cal Newport", "",
+                         "- Book Name: Atomic Habits", "  Author: James Clear", "  Publication: Avery",
+                         "  Why Should This Book Be Read?: habits"])
+    report = {'kind': 'records', 'expected': 2,
+              'gaps': [{'index': 0, 'key': "Deep Work", 'fields': ["Publication", "Why Should This Book Be Read?"]}]}
+    patch = "\n".join(["- Book Name: Deep Work", "  Author: Cal Newport", "  Publication: Grand Central",
+                       "  Why Should This Book Be Read?: focus"])
+    merged = app.merge_section_repair(READING, content, patch, report)
+    _, blocks = app.parse_record_blocks(merged, "- Book Name:")
+    assert [block['key'] for block in blocks] == ["Deep Work", "Atomic Habits"]
+    assert blocks[0]['fields']["Publication"] == "Grand Central"
@@ -0,0 +1,33 @@
+import os
+from types import SimpleNamespace
+
+import app
+
+FRAGMENT_SECTION = "2. Industry Specific Requirements"
+
+
+def test_role_fragment_prompts_differ_only_in_the_tail():
+    first = app.build_role_fragment_prompt(FRAGMENT_SECTION, "Software Engineer")
+    second = app.build_role_fragment_prompt(FRAGMENT_SECTION, "Data Scientist")
+    shared = os.path.commonprefix([first, second])
+    assert first[len(shared):] == "Software Engineer\nFor Software Engineer:\n"
+    assert app.prompt_templates.blueprint(FRAGMENT_SECTION) in shared
+
+
+def test_section_prompts_share_the_rules_and_end_with_the_profile():
+    inputs = {"sname": "Test Student", "standard": "10th", "board": "CBSE", "career_roles": "Data Scientist"}
+    plan, _ = app.build_prompt_plan("career", inputs)
+    prompts = list(plan.values())
+    assert os.path.commonprefix(prompts).startswith(app.prompt_templates.current().rules)
+    for section, prompt in plan.items():
+        assert prompt.endswith(f"{section}\n")
+        assert prompt.index(app.prompt_templates.blueprint(section)) < prompt.index("STUDENT PROFILE:")
+
+
+def test_provider_prompt_cache_totals(monkeypatch):
+    monkeypatch.setattr(app, "_prompt_usage_stats", {})
+    for cached in (0, 64):
+        app.record_prompt_usage(SimpleNamespace(prompt_tokens=100, completion_tokens=10,
+                                                prompt_tokens_details=SimpleNamespace(cached_tokens=cached)))
+    assert app.get_provider_prompt_cache_totals() == {
+        'requests': 2, 'prompt_tokens': 200, 'cached_tokens': 64, 'cached_ratio': 0.32}
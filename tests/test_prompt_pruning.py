@@ -0,0 +1,45 @@
+import pytest
+
+import app
+
+
+@pytest.mark.parametrize("board, key", [
+    ("CBSE", 'cbse'),
+    ("Central Board (cbse)", 'cbse'),
+    ("ICSE", 'icse'),
+    ("ISC Board", 'icse'),
+    ("IGCSE", 'ib_cambridge'),
+    ("International Baccalaureate", 'ib_cambridge'),
+    ("Maharashtra State Board", 'state'),
+    ("SSC", 'state'),
+    ("NIOS", None),
+    ("Basic", None),
+    (None, None),
+])
+def test_classify_board(board, key):
+    assert app.classify_board(board) == key
+
+
+@pytest.mark.parametrize("standard, key", [
+    ("10th", 'school'),
+    ("Class 8", 'school'),
+    ("Grade 12", 'school'),
+    ("FY B.Com", 'college'),
+    ("B.Tech 2nd Year", 'college'),
+    ("BE", 'college'),
+    ("MBA", 'college'),
+    ("Semester 3", 'college'),
+    ("Dropout", None),
+    ("", None),
+])
+def test_classify_level(standard, key):
+    assert app.classify_level(standard) == key
+
+
+def test_unclassified_inputs_get_all_guidance():
+    templates = app.prompt_templates.current()
+    board, level = app.select_prompt_guidance(templates, {'board': "CBSE", 'standard': "Dropout"})
+    assert board == templates.board['cbse']
+    assert level == "\n".join(templates.level.values())
+    assert app.select_prompt_guidance(templates, {'board': "CBSE"}, pruned=False)[0] == \
+        "\n".join(templates.board.values())
@@ -0,0 +1,56 @@
+import os
+import shutil
+
+import pytest
+
+import app
+
+
+@pytest.fixture
+def templates(tmp_path):
+    root = tmp_path / "prompts"
+    shutil.copytree(app.PROMPT_DIR, root)
+    return app.PromptTemplates(str(root), reload_interval=0)
+
+
+def edit(templates, rel, text):
+    with open(os.path.join(templates.root, rel), "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def test_matches_the_live_prompts(templates):
+    assert templates.current().rules == app.prompt_templates.current().rules
+    assert templates.version == app.prompt_templates.version
+
+
+def test_edited_file_is_reloaded_under_a_new_version(templates):
+    before = templates.current()
+    edit(templates, "shared_rules.txt", "NEW RULES\n")
+    after = templates.current()
+    assert after.rules == "NEW RULES"
+    assert after.version != before.version
+    assert before.rules != "NEW RULES"  # snapshots handed out earlier are not mutated
+
+
+def test_reload_interval_limits_the_checks(templates):
+    templates.reload_interval = 3600
+    templates.current()
+    edit(templates, "shared_rules.txt", "NEW RULES\n")
+    assert templates.current().rules != "NEW RULES"
+
+
+@pytest.mark.parametrize("break_prompts", [
+    lambda t: edit(t, "student_profile.txt", "Profile with a $mystery placeholder\n"),
+    lambda t: edit(t, "student_profile.txt", "Profile with a broken $ placeholder\n"),
+    lambda t: os.remove(os.path.join(t.root, "system.txt")),
+])
+def test_failed_reload_keeps_the_last_good_snapshot(templates, break_prompts):
+    good = templates.current()
+    break_prompts(templates)
+    assert templates.current() is good
+
+    shutil.copy(os.path.join(app.PROMPT_DIR, "student_profile.txt"), templates.root)
+    shutil.copy(os.path.join(app.PROMPT_DIR, "system.txt"), templates.root)
+    edit(templates, "shared_rules.txt", "NEW RULES\n")
+    assert templates.current().rules == "NEW RULES"  # a fixed tree is picked up again
+
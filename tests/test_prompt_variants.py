@@ -0,0 +1,50 @@
+import shutil
+from types import SimpleNamespace
+
+import pytest
+
+import app
+
+READING = "6. Suggested Reading"
+HEALTH = "7. Health Discipline"
+
+
+def test_parse_variant_traffic():
+    assert app.parse_variant_traffic(" suggested_reading@short = 0.25, health_discipline@v2=0.5 ,") == {
+        'suggested_reading': {'short': 0.25}, 'health_discipline': {'v2': 0.5}}
+
+
+def test_parse_variant_traffic_skips_bad_entries_and_scales_oversubscribed_shares():
+    traffic = app.parse_variant_traffic("suggested_reading@a=0.9,suggested_reading@b=0.6,"
+                                        "Bad Slug@x=0.1,suggested_reading@base=0.5,health_discipline@v2")
+    assert traffic == {'suggested_reading': {'a': pytest.approx(0.6), 'b': pytest.approx(0.4)}}
+
+
+@pytest.fixture
+def variants(monkeypatch):
+    templates = SimpleNamespace(variants={'suggested_reading': {'short': "Short list", 'long': "Long list"}})
+    monkeypatch.setattr(app, "prompt_variant_traffic", {'suggested_reading': {'short': 0.3, 'long': 0.3},
+                                                        'health_discipline': {'v2': 1.0}})
+    return templates
+
+
+def test_assignment_is_stable_per_seed_and_skips_unregistered_variants(variants):
+    first = app.assign_prompt_variants([READING, HEALTH], "report-1", variants)
+    assert first == app.assign_prompt_variants([READING, HEALTH], "report-1", variants)
+    assert list(first) == [READING]  # health_discipline@v2 has traffic but no file
+
+
+def test_assignment_follows_the_traffic_shares(variants):
+    drawn = [app.assign_prompt_variants([READING], f"report-{n}", variants)[READING] for n in range(3000)]
+    for variant, share in (('short', 0.3), ('long', 0.3), (app.BASE_PROMPT_VARIANT, 0.4)):
+        assert drawn.count(variant) / len(drawn) == pytest.approx(share, abs=0.04)
+
+
+def test_variant_files_register_prompt_experiments(tmp_path):
+    root = tmp_path / "prompts"
+    shutil.copytree(app.PROMPT_DIR, root)
+    (root / "sections" / "suggested_reading@short.txt").write_text("Short reading list\n", encoding="utf-8")
+    templates = app.PromptTemplates(str(root), reload_interval=0).current()
+    assert templates.variants["suggested_reading"] == {"short": "Short reading list"}
+    assert app.section_blueprint(templates, READING, "short") == "Short reading list"
+    assert app.section_blueprint(templates, READING, "missing") == templates.blueprints["suggested_reading"]
@@ -0,0 +1,48 @@
+import httpx
+import pytest
+from openai import RateLimitError
+
+import app
+
+
+@pytest.fixture
+def limiter(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "LLM_RATE_LIMIT_ENABLED", True)
+    return app.LLMRateLimiter(str(tmp_path / "limiter.sqlite3"), rpm=60, tpm=1000,
+                              min_concurrency=1, max_concurrency=4, lease_seconds=60)
+
+
+def test_token_bucket_waits_for_the_refill(limiter):
+    lease_id, wait = limiter._try_acquire(800)
+    assert lease_id and wait == 0
+    lease_id, wait = limiter._try_acquire(800)
+    assert lease_id is None
+    assert wait == 1.0  # 36s until 600 tokens refill, re-checked after at most a second
+
+
+def test_full_window_waits_until_a_release(limiter):
+    leases = [limiter._try_acquire(1)[0] for _ in range(2)]  # the window starts at max_concurrency // 2
+    assert all(leases)
+    assert limiter._try_acquire(1) == (None, 0.0)
+    limiter.release(leases[0], latency=1.0)
+    assert limiter._try_acquire(1)[0]
+
+
+def test_acquire_backs_off_while_the_window_is_full(limiter, monkeypatch):
+    sleeps = []
+    answers = iter([(None, 0.0)] * 6 + [(None, 0.3), ("lease", 0.0)])
+    monkeypatch.setattr(limiter, "_try_acquire", lambda cost: next(answers))
+    monkeypatch.setattr(app.time, "sleep", sleeps.append)
+    assert limiter.acquire(1) == "lease"
+    assert sleeps == [0.05, 0.1, 0.2, 0.4, 0.5, 0.5, 0.3]
+
+
+def test_rate_limit_halves_the_window_and_blocks(limiter):
+    lease_id = limiter._try_acquire(1)[0]
+    response = httpx.Response(429, headers={"retry-after": "3"},
+                              request=httpx.Request("POST", "https://api.openai.com/v1/chat/completions"))
+    limiter.release(lease_id, error=RateLimitError("slow down", response=response, body=None))
+    stats = limiter.stats()
+    assert stats['concurrency_window'] == 1
+    assert 2 < stats['blocked_for_seconds'] <= 3
+    assert limiter._try_acquire(1)[0] is None
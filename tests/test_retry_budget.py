@@ -0,0 +1,64 @@
+import pytest
+
+import app
+
+
+@pytest.fixture
+def budget():
+    app.open_retry_budget("run-1")
+    yield
+    app.close_retry_budget("run-1")
+
+
+def section_state(requires_retry=True, retry_count=0):
+    return {'run_id': "run-1", 'current_section_name': "6. Suggested Reading", 'retry_count': retry_count,
+            'retries_used': 0, 'retry_decision': '', 'validation_result': {'requires_retry': requires_retry}}
+
+
+def test_valid_section_is_accepted(budget):
+    state = app.retry_controller(section_state(requires_retry=False))
+    assert (state['retry_decision'], state['retry_count']) == ("accept", 0)
+
+
+def test_retry_spends_the_report_budget(budget):
+    state = app.retry_controller(section_state())
+    assert (state['retry_decision'], state['retry_count'], state['retries_used']) == ("retry", 1, 1)
+    assert app._retry_budgets["run-1"] == app.REPORT_RETRY_BUDGET - 1
+
+
+def test_section_cap_accepts_without_spending(budget):
+    state = app.retry_controller(section_state(retry_count=app.SECTION_MAX_RETRIES))
+    assert state['retry_decision'] == "accept"
+    assert app._retry_budgets["run-1"] == app.REPORT_RETRY_BUDGET
+
+
+def test_used_up_budget_accepts_the_current_version(budget):
+    for _ in range(app.REPORT_RETRY_BUDGET):
+        assert app.retry_controller(section_state())['retry_decision'] == "retry"
+    assert app.retry_controller(section_state())['retry_decision'] == "accept"
+
+
+def test_recursion_limit_covers_every_allowed_retry(monkeypatch):
+    monkeypatch.setattr(app, "REPORT_RETRY_BUDGET", 6)
+    sections = len(app.get_report_sections("development"))
+    assert app.workflow_recursion_limit("development", parallel=False) == 2 + 4 * sections + 3 * 6 + 6
+    assert app.workflow_recursion_limit("development", parallel=True) == 10
+
+
+def test_sequential_graph_fits_its_recursion_limit_when_every_section_retries(fake_llm):
+    # Too short for the validator, so every section uses its retries until the budget runs out
+    fake_llm.respond = lambda params: ("too short", "stop")
+    report = app.generate_report_with_agents("development", {"sname": "Test Student"}, parallel=False, executor="graph")
+    assert "Content generation did not complete." not in report
+    assert len(fake_llm.calls) > len(app.get_report_sections("development"))
+
+
+def test_partial_report_fills_missing_sections():
+    state = {'report_type': "development", 'sections_to_generate': ["A", "B", "C"], 'section_results': [],
+             'generated_sections': [{'name': "C", 'content': "C\n\ndone"}, {'name': "A", 'content': "A\n\ndone"}],
+             'final_report': '', 'error': ''}
+    state = app.finalize_partial_report(state)
+    assert state['final_report'] == app.finalize_report({**state, 'generated_sections': [
+        {'name': "A", 'content': "A\n\ndone"}, {'name': "B", 'content': "B\n\nContent generation did not complete."},
+        {'name': "C", 'content': "C\n\ndone"}]})['final_report']
+    assert state['error'] == "Recursion limit reached; incomplete sections: B"
@@ -0,0 +1,52 @@
+import pytest
+
+import app
+
+
+def test_csv_row_lists_percentages_and_json_cells():
+    row = app._roster_row_from_csv({
+        " sname ": " Asha ", "highest_skills": "Strategy:14; Observation:10;;Focus",
+        "career_roles": '["Data Scientist"]', None: ["stray cell"]})
+    assert row == {"sname": "Asha", "highest_skills": ["Strategy", "Observation", "Focus"],
+                   "skillpercentages": {"Strategy": 14.0, "Observation": 10.0},
+                   "career_roles": ["Data Scientist"]}
+
+
+def test_csv_row_keeps_an_explicit_percentage_column():
+    row = app._roster_row_from_csv({"skillpercentages": '{"Strategy": 20}', "highest_skills": "Strategy:14"})
+    assert row["skillpercentages"] == {"Strategy": 20}
+
+
+def test_parse_csv_roster_with_byte_order_mark():
+    students = app.parse_roster("﻿sname,standard\nAsha,10th\nRavi,9th\n")
+    assert students == [{"sname": "Asha", "standard": "10th"}, {"sname": "Ravi", "standard": "9th"}]
+
+
+def test_parse_jsonl_roster():
+    text = '{"sname": "Asha"}\n\n{"inputs": {"sname": "Ravi", "board": "CBSE"}}\n'
+    assert app.parse_roster(text) == [{"sname": "Asha"}, {"sname": "Ravi", "board": "CBSE"}]
+
+
+def test_every_bad_row_is_reported():
+    with pytest.raises(app.RosterError) as error:
+        app.parse_roster("sname,highest_skills\n,\nAsha,Strategy:lots\n")
+    assert set(str(error.value).split("; ")) == {
+        "line 2: missing sname", "line 3: could not convert string to float: 'lots'"}
+
+    with pytest.raises(app.RosterError, match=r"line 1: Expecting .*; line 2: expected an object"):
+        app.parse_roster('{"sname": \n[1]\n', fmt="jsonl")
+
+
+@pytest.mark.parametrize("text, fmt, message", [
+    ("sname\n", None, "Roster is empty"),
+    ("sname\nAsha\n", "xlsx", "Unsupported roster format: xlsx"),
+])
+def test_empty_or_unsupported_roster(text, fmt, message):
+    with pytest.raises(app.RosterError, match=message):
+        app.parse_roster(text, fmt)
+
+
+def test_roster_size_limit(monkeypatch):
+    monkeypatch.setattr(app, "BULK_MAX_STUDENTS", 1)
+    with pytest.raises(app.RosterError, match=r"2 students \(limit 1\)"):
+        app.parse_roster("sname\nAsha\nRavi\n")
@@ -0,0 +1,38 @@
+import pytest
+
+import app
+
+SECTIONS = ["1. Academic Interventions", "6. Suggested Reading", "7. Health Discipline", "8. Closing Notes"]
+
+
+@pytest.fixture
+def history(tmp_path, monkeypatch):
+    history = app.SectionHistory(str(tmp_path / "history.sqlite3"), weight=0.5)
+    monkeypatch.setattr(app, "section_history", history)
+    return history
+
+
+def order(report_type="development"):
+    return [[SECTIONS[i] for i in indices] for indices, _ in app.plan_section_schedule(report_type, SECTIONS)]
+
+
+def test_priors_put_plans_first_and_keep_batches_together(history, monkeypatch):
+    monkeypatch.setattr(app, "SECTION_BATCHING_ENABLED", True)
+    assert order() == [[SECTIONS[0]], SECTIONS[1:3], [SECTIONS[3]]]
+
+    monkeypatch.setattr(app, "SECTION_BATCHING_ENABLED", False)
+    assert order() == [[SECTIONS[0]], [SECTIONS[1]], [SECTIONS[2]], [SECTIONS[3]]]
+
+
+def test_history_overrides_the_priors(history, monkeypatch):
+    monkeypatch.setattr(app, "SECTION_BATCHING_ENABLED", False)
+    history.record("development", SECTIONS[3], output_tokens=9000, seconds=200)
+    history.record("development", SECTIONS[3], output_tokens=7000, seconds=100)
+    assert order()[0] == [SECTIONS[3]]
+    assert history.estimates("development", SECTIONS[3:])[SECTIONS[3]] == {'tokens': 8000, 'seconds': 150, 'samples': 2}
+    assert order("career")[0] == [SECTIONS[0]]  # history is kept per report type
+
+
+def test_simulate_schedule_takes_the_first_free_slot():
+    assert app.simulate_schedule([90, 30, 30, 30, 20], slots=2) == [90, 30, 60, 90, 110]
+    assert app.simulate_schedule([5, 5], slots=0) == [5, 10]
@@ -0,0 +1,40 @@
+import pytest
+
+import app
+
+INPUTS = {"sname": "Test Student", "standard": "10th", "board": "CBSE"}
+BATCH = ["6. Suggested Reading", "7. Health Discipline"]
+
+
+def delimiter(section):
+    return app.SECTION_BATCH_DELIMITER.format(section=section)
+
+
+def test_split_batch_response_adds_missing_headings():
+    text = f"{delimiter(BATCH[0])}\n{BATCH[0]}\n- a book\n\n  {delimiter(BATCH[1])}  \n- eat well\n"
+    assert app.split_batch_response(text, BATCH) == {
+        BATCH[0]: f"{BATCH[0]}\n- a book", BATCH[1]: f"{BATCH[1]}\n- eat well"}
+
+
+def test_split_batch_response_skips_empty_and_missing_parts():
+    assert app.split_batch_response(f"preamble\n{delimiter(BATCH[0])}\n\n", BATCH) == {}
+    assert app.split_batch_response("no delimiters at all", BATCH) == {}
+
+
+@pytest.fixture
+def state():
+    return {'report_type': "development", 'inputs': INPUTS, 'retry_count': 0, 'generated_sections': [],
+            'sections_to_generate': list(app.YEAR_PLAN_COLUMNS) + BATCH,
+            'prompt_plan': app.build_prompt_plan("development", INPUTS)[0]}
+
+
+def test_plan_section_batch_skips_cached_siblings_without_counting(state, tmp_path, monkeypatch):
+    cache = app.LLMResponseCache(str(tmp_path / "llm_cache.sqlite3"), ttl_seconds=60, memory_items=2, max_entries=3)
+    monkeypatch.setattr(app, "llm_response_cache", cache)
+    monkeypatch.setattr(app, "LLM_CACHE_ENABLED", True)
+
+    assert app.plan_section_batch(state, BATCH[0]) == BATCH
+    sibling_key = app.section_cache_key(state, BATCH[1], app.build_section_messages(state['prompt_plan'][BATCH[1]]))
+    cache.set(sibling_key, "cached sibling")
+    assert app.plan_section_batch(state, BATCH[0]) is None
+    assert cache.counters['misses'] == cache.counters['memory_hits'] == cache.counters['disk_hits'] == 0
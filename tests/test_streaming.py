@@ -0,0 +1,72 @@
+import time
+
+import pytest
+
+import app
+
+INPUTS = {"sname": "Test Student", "standard": "10th", "board": "CBSE"}
+BATCH = ["6. Suggested Reading", "7. Health Discipline"]
+
+
+@pytest.fixture
+def run(monkeypatch):
+    """A streaming run whose events are collected in a list"""
+    events = []
+    app.register_progress_listener("run-1", lambda event, data: events.append((event, data)))
+    yield {'run_id': "run-1", 'inputs': INPUTS, 'prompt_plan': app.build_prompt_plan("development", INPUTS)[0]}, events
+    app.unregister_progress_listener("run-1")
+
+
+def test_year_split_parts_stream_labelled_by_year(fake_llm, run):
+    state, events = run
+    fake_llm.respond = lambda params: ("- Month: January\n  Goal: canned\n", "stop")
+    app.generate_year_split_section(state, "1. Academic Interventions")
+    parts = {data['part'] for event, data in events if event == 'token'}
+    assert parts == set(app.PLAN_YEARS)
+    assert all(params['stream'] for params in fake_llm.calls)
+
+
+def test_batch_tokens_are_routed_to_their_sections(run):
+    state, events = run
+    router = app.BatchDeltaRouter(state, BATCH)
+    answer = "".join(f"{app.SECTION_BATCH_DELIMITER.format(section=s)}\n{s} body\n" for s in BATCH)
+    for i in range(0, len(answer), 7):
+        router(answer[i:i + 7])
+    router.flush()
+    streamed = {}
+    for event, data in events:
+        streamed[data['section']] = streamed.get(data['section'], "") + data['delta']
+    assert streamed == {s: f"{s} body\n" for s in BATCH}
+
+
+def test_cancelled_run_stops_at_the_next_token(fake_llm, run):
+    state, events = run
+    app.cancel_run("run-1")
+    with pytest.raises(app.ReportCancelled):
+        app.request_completion([{"role": "user", "content": "hi"}],
+                               on_delta=app.section_delta_listener(state, "1. Academic Interventions"))
+    assert events == []
+
+
+def test_stream_disconnect_cancels_the_run(monkeypatch):
+    stopped = []
+
+    def generate(report_type, inputs, parallel=None, executor=None, run_id=''):
+        while True:
+            try:
+                app.raise_if_cancelled({'run_id': run_id})
+            except app.ReportCancelled:
+                stopped.append(run_id)
+                raise
+            time.sleep(0.01)
+
+    monkeypatch.setattr(app, "generate_report_with_agents", generate)
+    monkeypatch.setattr(app, "generate_word_document", lambda *args, **kwargs: pytest.fail("document written"))
+    response = app.app.test_client().post("/generate-report/stream", json={"report_type": "career", "inputs": INPUTS},
+                                          buffered=False)
+    assert next(response.response).startswith(b"event: started")
+    response.close()
+    deadline = time.monotonic() + 5
+    while not stopped and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert stopped
@@ -0,0 +1,85 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import app
+
+ACADEMIC = "1. Academic Interventions"
+HEALTH = "7. Health Discipline"
+
+
+@pytest.fixture
+def structured(monkeypatch):
+    monkeypatch.setattr(app, "STRUCTURED_OUTPUT_ENABLED", True)
+
+
+def completion(content, finish_reason="stop"):
+    choice = SimpleNamespace(message=SimpleNamespace(content=content), finish_reason=finish_reason)
+    return SimpleNamespace(choices=[choice], usage=None)
+
+
+def health_answer(categories=app.HEALTH_CATEGORIES):
+    return {"records": [{"category": category, "recommendation": "r",
+                         "benefits_for_mental_health": "m", "benefits_for_physical_health": "p"}
+                        for category in categories]}
+
+
+def test_json_field_key():
+    assert app.json_field_key("Physical & Mental Skills Developed") == "physical_mental_skills_developed"
+
+
+def test_free_text_section_has_no_response_format(structured):
+    assert app.section_response_format(["2. Career Roadmap"]) is None
+
+
+def test_response_format_off_by_default():
+    assert app.section_response_format([HEALTH]) is None
+
+
+def test_render_structured_answer(structured):
+    text = app.render_structured_answer([HEALTH], completion(json.dumps(health_answer())))
+    _, blocks = app.parse_record_blocks(text, "- Category:")
+    assert [block['key'] for block in blocks] == app.HEALTH_CATEGORIES
+    assert app.find_section_gaps(HEALTH, text, {})['gaps'] == []
+
+
+def test_render_structured_year_plan_periods(structured):
+    periods = app.plan_periods({'plan_granularity': 'bi-monthly'})
+    months = [{"month": period, **{app.json_field_key(f): "x" for f in app.YEAR_PLAN_COLUMNS[ACADEMIC]}}
+              for period in periods]
+    answer = {"years": [{"year": year, "months": months} for year in app.PLAN_YEARS]}
+    text = app.render_structured_answer([ACADEMIC], completion(json.dumps(answer)), periods)
+    assert app.find_section_gaps(ACADEMIC, text, {'plan_granularity': 'bi-monthly'})['gaps'] == []
+
+
+@pytest.mark.parametrize("response, error", [
+    (completion(json.dumps(health_answer()), finish_reason="length"), "cut off"),
+    (completion('{"records": [{"category": "Food"'), "invalid JSON"),
+    (completion(json.dumps({"records": [{"category": "Food"}]})), "missing"),
+    (completion(json.dumps(health_answer(["Food", "Snacks"]))), "is not one of"),
+])
+def test_render_structured_answer_rejects(structured, response, error):
+    with pytest.raises(app.StructuredOutputError, match=error):
+        app.render_structured_answer([HEALTH], response)
+
+
+def test_request_structured_completion_falls_back_on_truncation(structured, monkeypatch):
+    calls = []
+    monkeypatch.setattr(app, "request_completion", lambda messages, max_tokens, **kwargs: (
+        calls.append(max_tokens) or completion(json.dumps(health_answer()), finish_reason="length")))
+    assert app.request_structured_completion([{"role": "user", "content": "x"}], [HEALTH], 1000) is None
+    assert calls == [int(1000 * app.STRUCTURED_OUTPUT_TOKEN_FACTOR)]
+
+
+def test_request_structured_completion_renders(structured, monkeypatch):
+    monkeypatch.setattr(app, "request_completion",
+                        lambda messages, max_tokens, **kwargs: completion(json.dumps(health_answer())))
+    response = app.request_structured_completion([{"role": "user", "content": "x"}], [HEALTH], 1000)
+    assert response.choices[0].message.content.startswith(HEALTH)
+
+
+def test_request_structured_completion_skips_json_over_the_cap(structured, monkeypatch):
+    monkeypatch.setattr(app, "STRUCTURED_OUTPUT_MAX_TOKENS", 4000)
+    monkeypatch.setattr(app, "request_completion", lambda *args, **kwargs: pytest.fail("JSON request sent"))
+    assert app.request_structured_completion([{"role": "user", "content": "x"}], [ACADEMIC], 5500) is None
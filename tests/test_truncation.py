@@ -0,0 +1,65 @@
+from types import SimpleNamespace
+
+import app
+
+PLAN = "1. Academic Interventions"
+FRAGMENT_SECTION = "2. Industry Specific Requirements"
+INPUTS = {"sname": "Test Student", "standard": "10th", "board": "CBSE", "career_roles": "Data Scientist"}
+
+
+def month(name):
+    return f"- Month: {name}\n  Activity: practice\n  Objective: progress"
+
+
+def test_trim_drops_the_cut_off_month_and_an_empty_year_header():
+    text = f"{PLAN}\nYear 1:\n{month('January')}\n{month('February')}\nYear 2:\n- Month: January\n  Activ"
+    assert app.trim_to_complete_block(PLAN, text) == f"{PLAN}\nYear 1:\n{month('January')}\n{month('February')}"
+
+
+def test_trim_without_markers_drops_the_last_line():
+    assert app.trim_to_complete_block(FRAGMENT_SECTION, "For Data Scientist:\n- Python\n- Statis") == \
+        "For Data Scientist:\n- Python"
+
+
+def test_continuation_resumes_at_the_first_missing_month(fake_llm):
+    state = {'inputs': INPUTS}
+    answers = iter([("- Month: February\n  Activity: more\n  Objective: done", "stop")])
+    fake_llm.respond = lambda params: next(answers)
+    cut = SimpleNamespace(usage=None, choices=[SimpleNamespace(
+        message=SimpleNamespace(content=f"Year 1:\n{month('January')}\n- Month: Feb"), finish_reason="length")])
+
+    response = app.continue_truncated_section(state, PLAN, [{"role": "user", "content": "plan"}], cut, years=["Year 1"])
+    assert response.choices[0].message.content == (
+        f"Year 1:\n{month('January')}\n- Month: February\n  Activity: more\n  Objective: done")
+    assert response.choices[0].finish_reason == "stop"
+    assert fake_llm.calls[0]['messages'][-2]['content'] == f"Year 1:\n{month('January')}"
+    assert "'- Month: February' block of Year 1" in fake_llm.calls[0]['messages'][-1]['content']
+
+
+def test_truncated_role_fragment_is_continued(fake_llm, monkeypatch):
+    monkeypatch.setattr(app, "STRUCTURED_OUTPUT_ENABLED", False)
+    answers = iter([("For Data Scientist:\n- Python\n- Statis", "length"), ("- Statistics", "stop")])
+    fake_llm.respond = lambda params: next(answers)
+    state = {'inputs': INPUTS, 'retry_count': 0}
+
+    app.generate_role_fragment_section(state, FRAGMENT_SECTION)
+    assert state['current_section_content'] == f"{FRAGMENT_SECTION}\n\nFor Data Scientist:\n- Python\n- Statistics"
+
+
+def test_truncated_repair_is_continued_from_the_next_block(fake_llm):
+    fields = app.YEAR_PLAN_COLUMNS[PLAN]
+    def block(name):
+        return "\n".join([f"- Month: {name}"] + [f"  {field}: canned" for field in fields])
+
+    state = app._build_initial_state("development", INPUTS, parallel=False)
+    app.supervisor_agent(state)
+    content = "\n".join([PLAN] + [line for year in app.PLAN_YEARS for line in [f"{year}:"] + [
+        block(m) for m in app.PLAN_MONTHS if (year, m) not in {("Year 1", "March"), ("Year 1", "June")}]])
+    state.update(current_section_name=PLAN, current_section_content=content, retry_count=1,
+                 validation_result={'gaps': app.find_section_gaps(PLAN, content, state['inputs'])})
+
+    answers = iter([(f"Year 1:\n{block('March')}\n- Month: Ju", "length"), (block("June"), "stop")])
+    fake_llm.respond = lambda params: next(answers)
+    app.section_generator_agent(state)
+    assert app.find_section_gaps(PLAN, state['current_section_content'], state['inputs'])['gaps'] == []
+    assert "Resume with the next '- Month:' record." in fake_llm.calls[1]['messages'][-1]['content']
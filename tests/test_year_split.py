@@ -0,0 +1,49 @@
+import threading
+import time
+
+import pytest
+
+import app
+
+PLAN = "1. Academic Interventions"
+INPUTS = {"sname": "Test Student", "standard": "10th", "board": "CBSE"}
+
+
+@pytest.fixture
+def slots(monkeypatch):
+    monkeypatch.setattr(app, "MAX_SECTION_CONCURRENCY", 4)
+    yield
+    app.close_section_slots("run-1")
+
+
+def test_parts_borrow_only_slots_no_section_holds(slots):
+    app.open_section_slots("run-1", 2)
+    assert app.borrow_section_slots("run-1", 2) == 2
+    assert app.borrow_section_slots("run-1", 2) == 0
+    app.finish_section_slot("run-1")
+    assert app.borrow_section_slots("run-1", 2) == 1
+    app.return_section_slots("run-1", 3)
+    assert app.borrow_section_slots("run-1", 5) == 3
+    assert app.borrow_section_slots(None, 5) == 3  # no fan-out: one section at a time
+
+
+@pytest.mark.parametrize("outstanding, expected", [(None, 3), (3, 2), (4, 1)])
+def test_year_parts_count_against_the_section_concurrency(fake_llm, slots, outstanding, expected):
+    if outstanding is not None:
+        app.open_section_slots("run-1", outstanding)
+    lock, in_flight, peak = threading.Lock(), [0], [0]
+
+    def respond(params):
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        time.sleep(0.05)
+        with lock:
+            in_flight[0] -= 1
+        return "- Month: January\n  Activity: canned", "stop"
+
+    fake_llm.respond = respond
+    state = {'run_id': "run-1", 'inputs': INPUTS, 'prompt_plan': app.build_prompt_plan("development", INPUTS)[0]}
+    app.generate_year_split_section(state, PLAN)
+    assert peak[0] == expected
+    assert len(fake_llm.calls) == len(app.PLAN_YEARS)